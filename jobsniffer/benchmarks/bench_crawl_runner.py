@@ -0,0 +1,85 @@
+# Benchmark: subprocess-per-crawl vs in-process CrawlService
+#
+# Run from the Scrapy project root (the folder containing scrapy.cfg):
+#
+#     python -m benchmarks.bench_crawl_runner --runs 5 --pages 3
+#
+# The subprocess path mirrors what spiders/main.py used to do: one
+# `python -m scrapy crawl` per search, with items read back from a JSON feed.
+# Its time-to-first-item equals its total latency since nothing is available
+# before the process exits.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.standin_server import StandInServer
+from jobsniffer.runner import CrawlService
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_subprocess(base_url, pages):
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "results.json")
+        start = time.perf_counter()
+        subprocess.run([
+            sys.executable, "-m", "scrapy", "crawl", "hellowork",
+            "-a", "job_title=Data Analyst",
+            "-a", "location=Paris",
+            "-a", f"max_pages={pages}",
+            "-a", f"base_url={base_url}",
+            "-o", output,
+            "-s", "SEEN_OFFERS_DB=",
+            "--loglevel", "WARNING",
+        ], cwd=PROJECT_ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with open(output, encoding="utf-8") as f:
+            items = json.load(f)
+        total = time.perf_counter() - start
+    return total, total, len(items)
+
+
+def run_in_process(service, base_url, pages):
+    job = service.submit("hellowork", "Data Analyst", "Paris", pages, base_url=base_url)
+    items = job.result()
+    return job.time_to_first_item, job.duration, len(items)
+
+
+def report(name, samples):
+    first = [s[0] for s in samples]
+    total = [s[1] for s in samples]
+    print(f"{name:<12} first item: median {statistics.median(first) * 1000:8.1f} ms"
+          f" | total: median {statistics.median(total) * 1000:8.1f} ms"
+          f" | items: {samples[0][2]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with StandInServer(pages=args.pages, latency=args.latency) as server:
+        subprocess_samples = [run_subprocess(server.base_url, args.pages) for _ in range(args.runs)]
+
+        service = CrawlService()
+        service.settings.set("LOG_LEVEL", "WARNING")
+        service.settings.set("SEEN_OFFERS_DB", None)
+        service.start()
+        # First crawl warms up the spider loader, like the first click in the UI
+        run_in_process(service, server.base_url, args.pages)
+        in_process_samples = [run_in_process(service, server.base_url, args.pages) for _ in range(args.runs)]
+        service.stop()
+
+    report("subprocess", subprocess_samples)
+    report("in-process", in_process_samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# Benchmark: cross-source duplicate detection, MinHash / LSH vs all pairs
+#
+#     python -m benchmarks.bench_dedup --rows 1000000
+#
+# Generates offers whose text is drawn from a shared vocabulary; about a
+# third are republished on a second source with a different company
+# spelling and one word changed. jobsniffer/dedup.py clusters growing
+# prefixes of the history (--rows / 8, / 4, / 2, all of it), in ingest
+# batches of --batch offers against the SQLite index: the time per offer
+# stays about flat, where comparing every pair grows with the history
+# (extrapolated from the measured cost of one comparison). Precision and
+# recall are measured against the generated duplicates, after a check of the
+# clusters given to a small batch of known duplicates.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.dedup import DuplicateIndex, add_duplicate_columns
+
+WORDS = 5000
+LENGTH = 60
+
+MISSIONS = ("Au sein de l'équipe plateforme, vous développez les API REST du back-office en Python et Django, "
+            "concevez les schémas PostgreSQL avec les équipes produit, écrivez les tests unitaires et "
+            "d'intégration, participez aux revues de code, automatisez les déploiements sur Kubernetes et "
+            "suivez la production avec les outils de supervision de l'équipe")
+# Small batch: the same offer scraped twice, republished by another spelling
+# of the company, posted by another company, and an unrelated offer
+CHECK = pd.DataFrame({
+    "company_name": ["Acme", "Acme", "ACME SAS", "Globex", "Acme", None],
+    "missions": [MISSIONS, MISSIONS, MISSIONS.replace("suivez", "surveillez"), MISSIONS,
+                 "Animer les ateliers de conception avec les équipes produit et les clients", None],
+})
+# (cluster, duplicate) expected for each row of CHECK; 0 for offers without text
+EXPECTED = [(1, False), (1, True), (1, True), (2, False), (3, False), (0, False)]
+
+
+def offers(rows, rng):
+    """Synthetic offers and the id of the original each one copies."""
+    originals = int(rows / 1.5)
+    vocabulary = np.array([f"mot{i}" for i in range(WORDS)], dtype=object)
+    texts = rng.integers(0, WORDS, size=(originals, LENGTH))
+    origin = np.r_[np.arange(originals), rng.integers(0, originals, rows - originals)]
+    origin = origin[np.argsort(rng.random(rows), kind="stable")]
+    text = texts[origin]
+    copy = pd.Series(origin).duplicated().to_numpy()
+    # Republished offers: one word changed, another spelling of the company
+    edits = rng.integers(0, LENGTH, size=rows)
+    changed = rng.integers(0, WORDS, size=rows)
+    text[copy, edits[copy]] = changed[copy]
+    company = np.array([f"Entreprise {i % 20000}" for i in origin], dtype=object)
+    company[copy] = [f"{name.upper()} SAS" for name in company[copy]]
+    return pd.DataFrame({
+        "company_name": company,
+        "missions": [" ".join(vocabulary[row]) for row in text],
+        "source": np.where(copy, "WTTJ", "HelloWork"),
+    }), origin
+
+
+def check_clustering():
+    """Exit with status 1 when the small batch is clustered wrong."""
+    assert CHECK["missions"][2] != MISSIONS, "the republished offer must differ by one word"
+    result = add_duplicate_columns(CHECK)
+    got = list(zip(result["dedup_cluster_id"].fillna(0).astype(int), result["duplicate"]))
+    failures = 0
+    for row, (found, expected) in enumerate(zip(got, EXPECTED)):
+        if found != expected:
+            print(f"  row {row}: cluster / duplicate {found}, {expected} expected")
+            failures += 1
+    if failures:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args()
+
+    check_clustering()
+    rng = np.random.default_rng(0)
+    history, origin = offers(args.rows, rng)
+
+    # Cost of one pairwise comparison of two signatures, for the extrapolation
+    signatures = rng.integers(0, 2**32, size=(2000, 64), dtype=np.uint32)
+    start = time.perf_counter()
+    for row in range(len(signatures)):
+        (signatures[row] == signatures).mean(axis=1)
+    pair_cost = (time.perf_counter() - start) / len(signatures) ** 2
+
+    for rows in (args.rows // 8, args.rows // 4, args.rows // 2, args.rows):
+        index = DuplicateIndex()
+        start = time.perf_counter()
+        batches = [add_duplicate_columns(history.iloc[lo:min(lo + args.batch, rows)], index)
+                   for lo in range(0, rows, args.batch)]
+        elapsed = time.perf_counter() - start
+        result = pd.concat(batches, ignore_index=True)
+
+        # Pairs of offers put in the same cluster, vs generated duplicates
+        truth = pd.Series(origin[:rows])
+        found = result["dedup_cluster_id"]
+        same_truth = truth.groupby(found.to_numpy()).nunique()
+        precision = (same_truth == 1).mean()
+        recall = found.groupby(truth.to_numpy()).nunique().eq(1).mean()
+        print(f"{rows:>8} offers | LSH {elapsed:7.1f} s ({elapsed / rows * 1e6:5.1f} µs/offer) | "
+              f"all pairs ~{pair_cost * rows * rows / 2:9.0f} s | "
+              f"{rows - int(result['duplicate'].sum())} unique ({len(set(origin[:rows]))} expected), "
+              f"precision {precision:.3f}, recall {recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
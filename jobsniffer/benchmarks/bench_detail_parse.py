@@ -0,0 +1,110 @@
+# Benchmark: parse_job_details field extraction, CSS selectors vs compiled XPath
+#
+#     python -m benchmarks.bench_detail_parse --pages 2000
+#     python -m benchmarks.bench_detail_parse --corpus path/to/saved/detail/pages
+#
+# Parse-only: pages are read from a corpus of saved HelloWork/WTTJ detail
+# pages (*.html) or generated from the stand-in server templates, padded
+# with page chrome to a realistic size. Reports pages/s and the
+# peak Python memory while extracting one page (tracemalloc, which does not
+# see the memory of the lxml tree itself).
+
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+
+from parsel import Selector
+
+from benchmarks.standin_server import hellowork_detail_html, wttj_detail_html
+from jobsniffer.extractors import hellowork
+
+CHROME = "".join(
+    f'<div class="tw-flex tw-p-{i % 8}"><a href="/fr-fr/page{i}.html">Lien {i}</a><span>Texte {i}</span></div>'
+    for i in range(400)
+)
+
+
+def load_corpus(args):
+    if args.corpus:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.corpus, "*.html"))):
+            with open(path, encoding="utf-8") as f:
+                pages.append(f.read())
+        return pages
+    pages = []
+    for n in range(args.pages):
+        html = hellowork_detail_html(n) if n % 2 else wttj_detail_html(f"offre-{n}")
+        pages.append(html.replace("<body>", f"<body><header>{CHROME}</header>").replace("</body>", f"<footer>{CHROME}</footer></body>"))
+    return pages
+
+
+def css_selectors(html):
+    return css_fields(Selector(text=html))
+
+
+def css_fields(response):
+    # Previous HelloWorkSpider.parse_job_details, selector work only
+    resume_de_loffre = response.css("section.tw-mb-8 div.tw-typo-xl::text").get().strip() if response.css("section.tw-mb-8 div.tw-typo-xl::text").get() else None
+    qualifications = response.css("ul.tw-flex-wrap li::text").getall()
+    mission_text = response.css("h2:contains('Les missions') ~ p::text").getall()
+    mission_text = '\n'.join([t.strip() for t in mission_text])
+    profil_recherche_text = response.css("h2:contains('Le profil') ~ p::text").getall()
+    profil_recherche_text = '\n'.join([t.strip() for t in profil_recherche_text])
+    return {
+        "resume_de_loffre": resume_de_loffre,
+        "qualifications": [q.strip() for q in qualifications],
+        "missions": mission_text,
+        "profil_recherche": profil_recherche_text,
+    }
+
+
+def compiled_on_parsel(html):
+    # What the spider does now: parsel/Scrapy parses, compiled XPath extracts
+    return hellowork.DETAIL.extract(Selector(text=html).root)
+
+
+def compiled_on_lxml(html):
+    return hellowork.DETAIL.extract_html(html)
+
+
+def measure(name, pages, extract):
+    start = time.perf_counter()
+    for html in pages:
+        extract(html)
+    elapsed = time.perf_counter() - start
+
+    sample = pages[:200]
+    tracemalloc.start()
+    peak = 0
+    for html in sample:
+        tracemalloc.reset_peak()
+        extract(html)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    print(f"{name:<22} {len(pages) / elapsed:9.1f} pages/s | peak Python memory per page {peak / 1024:7.1f} KiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--corpus", help="folder of saved detail pages (*.html)")
+    args = parser.parse_args()
+
+    pages = load_corpus(args)
+    mismatches = sum(css_selectors(html) != compiled_on_lxml(html) for html in pages)
+    print(f"{len(pages)} pages, {mismatches} pages where compiled XPath differs from the CSS selectors")
+    measure("css selectors", pages, css_selectors)
+    measure("compiled/parsel", pages, compiled_on_parsel)
+    measure("compiled/lxml", pages, compiled_on_lxml)
+    # Inside Scrapy the page is parsed once per response whatever the
+    # selectors, so the fields themselves are what the extractors change
+    parsed = [Selector(text=html) for html in pages]
+    print("on already parsed pages:")
+    measure("css selectors", parsed, css_fields)
+    measure("compiled", parsed, lambda sel: hellowork.DETAIL.extract(sel.root))
+
+
+if __name__ == "__main__":
+    main()
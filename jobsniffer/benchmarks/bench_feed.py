@@ -0,0 +1,74 @@
+# Benchmark: following a crawl through its feed file
+#
+#     python -m benchmarks.bench_feed --items 20000 --polls 100
+#
+# A writer adds --items offers in --polls batches; after each batch the reader
+# refreshes its table. The JSON array feed (`-o results.json`) has to be
+# rewritten and parsed whole every time; the JSON Lines feed is appended to
+# and JsonLinesTail only parses the new lines.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from jobsniffer.feed import JsonLinesTail
+
+
+def offer(i):
+    return {
+        "job_title": f"Data Analyst {i % 50} H/F",
+        "job_id": str(i),
+        "company_name": f"Société {i % 700}",
+        "location": "Paris - 75",
+        "contract_type": "CDI",
+        "salary": "45 000 - 55 000 € / an",
+        "job_url": f"https://www.hellowork.com/fr-fr/emplois/{i}.html",
+        "missions": "Analyser les données, construire des tableaux de bord. " * 6,
+        "qualifications": ["SQL", "Python", "Bac +5"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--polls", type=int, default=100)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="jobsniffer-feed-")
+    batch = args.items // args.polls
+    items = [offer(i) for i in range(batch * args.polls)]
+    try:
+        array_path = os.path.join(folder, "results.json")
+        elapsed = 0.0
+        for poll in range(1, args.polls + 1):
+            with open(array_path, "w", encoding="utf-8") as f:
+                json.dump(items[:poll * batch], f, ensure_ascii=False)
+            start = time.perf_counter()
+            table = pd.read_json(array_path)
+            elapsed += time.perf_counter() - start
+        print(f"JSON array, read whole : {elapsed:8.2f} s over {args.polls} polls | {len(table)} rows")
+
+        lines_path = os.path.join(folder, "results.jsonl")
+        tail = JsonLinesTail(lines_path)
+        elapsed = 0.0
+        with open(lines_path, "wb") as f:
+            for poll in range(args.polls):
+                for item in items[poll * batch:(poll + 1) * batch]:
+                    f.write(json.dumps(item, ensure_ascii=False).encode("utf-8") + b"\n")
+                f.flush()
+                start = time.perf_counter()
+                tail.poll()
+                table = tail.frame()
+                elapsed += time.perf_counter() - start
+        print(f"JSON Lines, tail       : {elapsed:8.2f} s over {args.polls} polls | {len(table)} rows")
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
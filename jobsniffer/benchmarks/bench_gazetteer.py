@@ -0,0 +1,55 @@
+# Benchmark: area filter of the comparison, substring scan vs gazetteer codes
+#
+#     python -m benchmarks.bench_gazetteer --rows 1000000
+#
+# The previous filter ran `location.str.contains(selection, case=False)` over
+# every offer of the history; it now compares the integer codes of the
+# departement / region categoricals added at ingest by
+# jobsniffer/gazetteer.py. Also reports the ingest cost of the lookup.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.gazetteer import add_location_columns
+
+LOCATIONS = ["Paris - 75", "Paris 15e - 75", "Paris 8e - 75", "Lyon - 69", "Lyon 7e - 69", "Villeurbanne - 69",
+             "Toulouse - 31", "Bordeaux - 33", "Nanterre", "Boulogne-Billancourt", "Île-de-France", "Nancy",
+             "Montpellier", "Marseille", "Lille", "Rennes", "Nantes - Paris", "Saint-Denis", "Grenoble", "France"]
+
+
+def timed(fn, runs=5):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    # Plus a long tail of other places, as in a real history
+    places = LOCATIONS + [f"Commune {i} - {i % 95 + 1:02d}" for i in range(3000)]
+    weights = np.r_[np.full(len(LOCATIONS), 20.0), np.ones(3000)]
+    raw = pd.DataFrame({"location": rng.choice(places, args.rows, p=weights / weights.sum())})
+
+    elapsed, history = timed(lambda: add_location_columns(raw), runs=1)
+    print(f"{args.rows} offers, city/departement/region added in {elapsed * 1000:.0f} ms")
+
+    scan_time, scan = timed(lambda: raw[raw["location"].str.contains("Paris", case=False)])
+    print(f"substring 'Paris'         {scan_time * 1000:8.1f} ms | {len(scan)} rows")
+    code_time, rows = timed(lambda: history[history["departement"] == "Paris"])
+    print(f"departement == 'Paris'    {code_time * 1000:8.1f} ms | {len(rows)} rows")
+    code_time, rows = timed(lambda: history[history["region"] == "Île-de-France"])
+    print(f"region == 'Île-de-France' {code_time * 1000:8.1f} ms | {len(rows)} rows")
+
+
+if __name__ == "__main__":
+    main()
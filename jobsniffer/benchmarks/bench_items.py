@@ -0,0 +1,132 @@
+# Benchmark: queued detail requests and item assembly, meta dicts vs JobListing
+#
+#     python -m benchmarks.bench_items --requests 50000
+#
+# The spiders used to send the listing fields to the detail callback in
+# request.meta and to build a dict-backed scrapy.Item (or yield response.meta
+# itself) there; they now send a slotted JobListing through cb_kwargs and
+# complete it in place (jobsniffer/items.py), its repeated listing values
+# interned. Each variant runs in its own
+# process: it queues --requests detail requests the way the in-memory
+# scheduler holds them and reports the RSS they add, then times the assembly
+# of the items from the downloaded detail pages.
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import scrapy
+from queuelib.queue import FifoMemoryQueue
+from scrapy.http import HtmlResponse
+
+from benchmarks.bench_load import current_rss
+from jobsniffer.items import JobListing
+
+
+class LegacyJobListingItem(scrapy.Item):
+    """The former dict-backed item, kept here for the comparison."""
+    job_title = scrapy.Field()
+    job_id = scrapy.Field()
+    contract_type = scrapy.Field()
+    contract_tag = scrapy.Field()
+    salary = scrapy.Field()
+    company_name = scrapy.Field()
+    location = scrapy.Field()
+    publication_date = scrapy.Field()
+    job_url = scrapy.Field()
+    resume_de_loffre = scrapy.Field()
+    qualifications = scrapy.Field()
+    missions = scrapy.Field()
+    profil_recherche = scrapy.Field()
+
+
+def callback(response, item=None):
+    pass
+
+
+def parsed(text):
+    """A new string object, as selectors return for every listing card."""
+    return text.encode().decode()
+
+
+def listing(i):
+    return {
+        "job_title": f"Data Analyst {i} H/F",
+        "job_id": str(60_000_000 + i),
+        "contract_type": parsed("CDI"),
+        "contract_tag": parsed("Télétravail partiel"),
+        "salary": f"{40 + i % 20} 000 € / an",
+        "company_name": f"Société {i % 5000}",
+        "location": parsed("Paris - 75"),
+        "publication_date": parsed("il y a 2 jours"),
+    }
+
+
+def detail_request(variant, i):
+    url = f"https://www.hellowork.com/fr-fr/emplois/{60_000_000 + i}.html"
+    fields = listing(i)
+    if variant == "meta":
+        # DepthMiddleware adds the depth to the meta of every followed request
+        return scrapy.Request(url, callback=callback, meta=dict(fields, depth=1))
+    return scrapy.Request(url, callback=callback, meta={"depth": 1},
+                          cb_kwargs={"item": JobListing(job_url=url, **fields)})
+
+
+def assemble(variant, request, detail):
+    response = HtmlResponse(request.url, body=b"", request=request)
+    if variant == "meta":
+        item = LegacyJobListingItem()
+        for name in ("job_title", "job_id", "contract_type", "contract_tag", "salary", "company_name",
+                     "location", "publication_date"):
+            item[name] = response.meta[name]
+        item["job_url"] = response.url
+        item.update(detail)
+        return item
+    item = request.cb_kwargs["item"]
+    item.job_url = response.url
+    item.update(detail)
+    return item
+
+
+def run_variant(variant, count):
+    detail = {
+        "resume_de_loffre": "Résumé de l'offre",
+        "qualifications": ["Bac +5", "SQL", "Python"],
+        "missions": "Analyser les données, construire des tableaux de bord.",
+        "profil_recherche": "Maîtrise de Python et SQL.",
+    }
+    queue = FifoMemoryQueue()
+    before = current_rss()
+    for i in range(count):
+        queue.push(detail_request(variant, i))
+    queued = current_rss() - before
+
+    requests = [queue.pop() for _ in range(len(queue))]
+    start = time.perf_counter()
+    items = [assemble(variant, request, detail) for request in requests]
+    elapsed = time.perf_counter() - start
+    return {"variant": variant, "queued_mb": queued / 1e6, "per_request": queued / count,
+            "assembly_us": elapsed / len(items) * 1e6}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--variant", choices=["meta", "cb_kwargs"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.requests)))
+        return
+    for variant in ("meta", "cb_kwargs"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_items", "--variant", variant,
+                                 "--requests", str(args.requests)], capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{variant:<10} {args.requests} queued detail requests: +{result['queued_mb']:6.1f} MB RSS "
+              f"({result['per_request']:5.0f} B/request) | item assembly {result['assembly_us']:5.1f} µs/item")
+
+
+if __name__ == "__main__":
+    main()
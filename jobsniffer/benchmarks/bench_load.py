@@ -0,0 +1,151 @@
+# Load test: the real spiders against the stand-in job board
+#
+#     python -m benchmarks.bench_load --pages 20 --latency 0.05 --jitter 0.05
+#     python -m benchmarks.bench_load --error-rate 0.05 --captcha-rate 0.02 --seed 1
+#     python -m benchmarks.bench_load --set CONCURRENT_REQUESTS=32 --json results.json
+#     python -m benchmarks.bench_load --max-inflight 6 --set ADAPTIVE_CONCURRENCY_ENABLED=False
+#
+# Runs fully offline. For each spider it reports items/s, requests/s, p50/p99
+# download latency per callback, the responses served by status and the peak
+# RSS of this process during the crawl (the stand-in server runs in the same
+# process but only holds a few pages at a time).
+
+import argparse
+import json
+import resource
+import time
+from collections import defaultdict
+
+from scrapy import signals
+
+from benchmarks.standin_server import StandInServer
+from jobsniffer.runner import CrawlService
+
+
+class CallbackLatency:
+    """Collects download latency of every response, by request callback."""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        ext = cls()
+        crawler.callback_latency = ext.samples
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        return ext
+
+    def response_received(self, response, request, spider):
+        callback = getattr(request.callback, "__name__", None) or "parse"
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.samples[callback].append(latency)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def current_rss():
+    """Resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run(service, spider, args, base_url):
+    job = service.submit(spider, "Data Analyst", "Paris", args.pages, base_url=base_url)
+    peak_rss = current_rss()
+    while not job.done():
+        time.sleep(0.05)
+        peak_rss = max(peak_rss, current_rss())
+    job.result()
+    stats = job.stats
+    duration = job.duration
+    requests = stats.get("downloader/request_count", 0)
+    callbacks = {
+        name: {"responses": len(values), "p50_ms": percentile(values, 0.5) * 1000,
+               "p99_ms": percentile(values, 0.99) * 1000}
+        for name, values in sorted(job._crawler.callback_latency.items())
+    }
+    return {
+        "spider": spider,
+        "duration_s": duration,
+        "items": len(job.items),
+        "items_per_s": len(job.items) / duration,
+        "requests": requests,
+        "requests_per_s": requests / duration,
+        "retries": stats.get("retry/count", 0),
+        "errors": len(job.errors),
+        "callbacks": callbacks,
+        "peak_rss_mb": peak_rss / 1e6,
+        "adaptive_concurrency": {key[len("adaptive_concurrency/"):]: value for key, value in sorted(stats.items())
+                                 if key.startswith("adaptive_concurrency/")},
+    }
+
+
+def report(result):
+    print(f"{result['spider']:<10} {result['items']:5d} items in {result['duration_s']:6.2f} s"
+          f" | {result['items_per_s']:7.1f} items/s | {result['requests_per_s']:7.1f} req/s"
+          f" | retries {result['retries']} | errors {result['errors']}"
+          f" | peak RSS {result['peak_rss_mb']:6.1f} MB")
+    for name, latency in result["callbacks"].items():
+        print(f"    {name:<20} {latency['responses']:5d} responses"
+              f" | p50 {latency['p50_ms']:7.1f} ms | p99 {latency['p99_ms']:7.1f} ms")
+    print(f"    served by the stand-in: {result['served']}")
+    if result["adaptive_concurrency"]:
+        print(f"    adaptive concurrency: {result['adaptive_concurrency']}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--spiders", nargs="+", default=["hellowork", "wttj"])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--offers-per-page", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--max-inflight", type=int, default=0, help="answer 429 above this many requests in flight")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override a Scrapy setting, e.g. CONCURRENT_REQUESTS=32")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--metrics-port", type=int, default=9410, help="Prometheus endpoint during the run, 0 to disable")
+    args = parser.parse_args()
+
+    service = CrawlService()
+    service.settings.set("LOG_LEVEL", "WARNING")
+    service.settings.set("SEEN_OFFERS_DB", None)
+    service.settings.set("METRICS_FILE", None)
+    service.settings.set("METRICS_PORT", args.metrics_port)
+    service.settings.set("EXTENSIONS", {**service.settings.getdict("EXTENSIONS"),
+                                        "benchmarks.bench_load.CallbackLatency": 0})
+    for override in args.set:
+        name, _, value = override.partition("=")
+        service.settings.set(name, value, priority="cmdline")
+    service.start()
+
+    results = []
+    for spider in args.spiders:
+        # A fresh server per spider so that the served counts are its own
+        with StandInServer(pages=args.pages, offers_per_page=args.offers_per_page,
+                           latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           captcha_rate=args.captcha_rate, max_inflight=args.max_inflight,
+                           seed=args.seed) as server:
+            result = run(service, spider, args, server.base_url)
+            result["served"] = {str(status): count for status, count in server.served.items()}
+        report(result)
+        results.append(result)
+    service.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"arguments": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
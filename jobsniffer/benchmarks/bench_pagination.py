@@ -0,0 +1,70 @@
+# Benchmark: serial page chain vs fanned-out HelloWork listing pages
+#
+#     python -m benchmarks.bench_pagination --pages 8 --latency 0.2
+#
+# The listing phase is measured from crawl start to the parse of the last
+# listing page. With the previous serial chain it grows as pages x RTT; with
+# all pages scheduled from start_requests it stays close to one RTT.
+
+import argparse
+import time
+
+import scrapy
+
+from benchmarks.standin_server import StandInServer
+from jobsniffer.runner import CrawlService
+from jobsniffer.spiders.hellowork import HelloWorkSpider
+
+
+class FanOutHelloWorkSpider(HelloWorkSpider):
+    name = "hellowork_fanout"
+    listing_parsed_at = []
+
+    def parse(self, response, page=1):
+        self.listing_parsed_at.append(time.perf_counter())
+        yield from super().parse(response, page)
+
+
+class SerialHelloWorkSpider(FanOutHelloWorkSpider):
+    """Previous behaviour: page N+1 is requested once page N is parsed."""
+
+    name = "hellowork_serial"
+    listing_parsed_at = []
+
+    def start_requests(self):
+        yield scrapy.Request(url=self.search_url(1), callback=self.parse, cb_kwargs={"page": 1})
+
+    def parse(self, response, page=1):
+        yield from super().parse(response, page)
+        if page < self.max_pages:
+            yield scrapy.Request(url=self.search_url(page + 1), callback=self.parse, cb_kwargs={"page": page + 1})
+
+
+def run(service, spider_cls, base_url, pages):
+    spider_cls.listing_parsed_at.clear()
+    job = service.submit(spider_cls, "Data Analyst", "Paris", pages, base_url=base_url)
+    job.result()
+    started = job.started_at
+    return max(spider_cls.listing_parsed_at) - started, job.duration, len(job.items)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with StandInServer(pages=args.pages, offers_per_page=5, latency=args.latency) as server:
+        service = CrawlService()
+        service.settings.set("LOG_LEVEL", "WARNING")
+        service.settings.set("SEEN_OFFERS_DB", None)
+        service.start()
+        for spider_cls in (SerialHelloWorkSpider, FanOutHelloWorkSpider):
+            listing, total, items = run(service, spider_cls, server.base_url, args.pages)
+            print(f"{spider_cls.name:<18} listing phase {listing:6.2f} s ({listing / args.latency:4.1f} x RTT)"
+                  f" | total {total:6.2f} s | items {items}")
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
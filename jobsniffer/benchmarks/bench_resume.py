@@ -0,0 +1,105 @@
+# Benchmark: crawl frontier in memory vs on disk (JOBDIR), stop and resume
+#
+#     python -m benchmarks.bench_resume --frontier 200000 --pages 100 --offers 20
+#
+# Frontier: --frontier HelloWork detail requests are put in Scrapy's
+# scheduler and taken out again, with the in-memory queues ("memory") and
+# with the disk queues of a JOBDIR ("jobdir"), which the job queue now gives
+# every crawl (jobsniffer/runner.py). Each mode runs in its own process and
+# reports the RSS the queued requests add and the time per request.
+#
+# Resume: the real spider crawls --pages x --offers offers of the stand-in
+# board with a JOBDIR, is stopped halfway and resumed from its folder. The
+# two runs together must yield every offer once, without downloading any
+# page twice.
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from scrapy import Request
+from scrapy.core.scheduler import Scheduler
+from scrapy.utils.test import get_crawler
+
+from benchmarks.bench_load import current_rss
+from benchmarks.standin_server import StandInServer
+from jobsniffer.items import JobListing
+from jobsniffer.runner import CrawlService
+from jobsniffer.spiders.hellowork import HelloWorkSpider
+
+
+def run_frontier(mode, count):
+    with tempfile.TemporaryDirectory() as folder:
+        crawler = get_crawler(HelloWorkSpider, {"JOBDIR": folder} if mode == "jobdir" else {})
+        spider = crawler.spider = HelloWorkSpider.from_crawler(crawler, job_title="Data", location="Paris")
+        scheduler = Scheduler.from_crawler(crawler)
+        scheduler.open(spider)
+        before = current_rss()
+        start = time.perf_counter()
+        for i in range(count):
+            url = f"https://www.hellowork.com/fr-fr/emplois/{60_000_000 + i}.html"
+            item = JobListing(job_url=url, job_title=f"Data Analyst {i}", contract_type="CDI",
+                              company_name=f"Société {i % 5000}", location="Paris - 75")
+            scheduler.enqueue_request(Request(url, callback=spider.parse_job_details, meta={"depth": 1},
+                                              cb_kwargs={"item": item}))
+        queued = current_rss() - before
+        while scheduler.next_request() is not None:
+            pass
+        elapsed = time.perf_counter() - start
+        scheduler.close("finished")
+    return {"mode": mode, "rss_mb": queued / 1e6, "per_request": queued / count, "us": elapsed / count * 1e6}
+
+
+def crawl(service, args, base_url, jobdir, stop_after=None):
+    job = service.submit("hellowork", "Data Analyst", "Paris", args.pages, jobdir=jobdir, base_url=base_url)
+    while not job.done():
+        time.sleep(0.05)
+        if stop_after is not None and len(job.items) >= stop_after:
+            service.cancel(job)
+            stop_after = None
+    job.result()
+    return job
+
+
+def run_resume(args):
+    service = CrawlService()
+    for name, value in (("LOG_LEVEL", "WARNING"), ("SEEN_OFFERS_DB", None), ("METRICS_FILE", None),
+                        ("METRICS_PORT", 0)):
+        service.settings.set(name, value)
+    expected = args.pages * args.offers
+    with StandInServer(pages=args.pages, offers_per_page=args.offers, latency=0.02) as server, \
+            tempfile.TemporaryDirectory() as folder:
+        runs = [crawl(service, args, server.base_url, folder, stop_after=expected // 2),
+                crawl(service, args, server.base_url, folder)]
+    service.stop()
+    urls = [item["job_url"] for job in runs for item in job.items]
+    downloads = sum(job.stats.get("downloader/request_count", 0) for job in runs)
+    print(f"resume  items {' + '.join(str(len(job.items)) for job in runs)} = {len(set(urls))} unique "
+          f"({expected} expected) | {downloads} downloads ({args.pages + expected} pages)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frontier", type=int, default=200_000)
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--offers", type=int, default=20)
+    parser.add_argument("--mode", choices=["memory", "jobdir"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_frontier(args.mode, args.frontier)))
+        return
+    for mode in ("memory", "jobdir"):
+        output = subprocess.run([sys.executable, "-m", "benchmarks.bench_resume", "--mode", mode,
+                                 "--frontier", str(args.frontier)], capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"{mode:<7} {args.frontier} queued detail requests: +{result['rss_mb']:6.1f} MB RSS "
+              f"({result['per_request']:5.0f} B/request) | {result['us']:5.1f} µs/request in and out")
+    run_resume(args)
+
+
+if __name__ == "__main__":
+    main()
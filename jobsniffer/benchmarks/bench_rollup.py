@@ -0,0 +1,91 @@
+# Benchmark: comparison aggregates from raw offers vs from the rollup
+#
+#     python -m benchmarks.bench_rollup --days 10 20 40 --offers-per-day 20000
+#
+# Writes a history of growing length with HistoryStore (which maintains the
+# rollup on append) and times, at each size, the aggregates of the
+# comparison section (mean salary by title, contract types by location)
+# computed from every raw offer and from the all-days rollup. The raw times
+# grow with the history; the rollup stops growing once the distinct
+# (location, title, contract, source) combinations have all been seen, as
+# happens when the same searches are scraped day after day.
+
+import argparse
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.history import HistoryStore
+
+
+def offers(rows, rng):
+    return pd.DataFrame({
+        "job_title": [f"Data {i} H/F" for i in rng.integers(0, 40, rows)],
+        "location": [f"Ville {i} - {i % 95:02d}" for i in rng.integers(0, 300, rows)],
+        "contract_type": rng.choice(["CDI", "CDD", "Stage"], rows),
+        "salary_annual_eur": np.where(rng.random(rows) < 0.4, np.nan, rng.random(rows) * 50000),
+        "source": rng.choice(["HelloWork", "WTTJ"], rows),
+    })
+
+
+def from_raw(store):
+    data = store.load(columns=["job_title", "location", "contract_type", "salary_annual_eur"])
+    salary = data.groupby("job_title")["salary_annual_eur"].mean()
+    contracts = data.groupby(["location", "contract_type"]).size()
+    return salary, contracts
+
+
+def from_rollup(store):
+    data = store.load_rollup()
+    sums = data.groupby("job_title")[["salary_eur_sum", "salary_eur_count"]].sum()
+    salary = sums["salary_eur_sum"] / sums["salary_eur_count"]
+    contracts = data.groupby(["location", "contract_type"])["count"].sum()
+    return salary, contracts
+
+
+def timed(fn, *args, runs=3):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, nargs="+", default=[10, 20, 40])
+    parser.add_argument("--offers-per-day", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    root = tempfile.mkdtemp(prefix="jobsniffer-rollup-")
+    store = HistoryStore(root)
+    store.rollup.rebuild(store)
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    written = 0
+    try:
+        for days in sorted(args.days):
+            append_time, appended = 0.0, 0
+            while written < days:
+                batch = offers(args.offers_per_day, rng)
+                start = time.perf_counter()
+                store.append(batch, scraped_at=base + timedelta(days=written))
+                append_time += time.perf_counter() - start
+                written += 1
+                appended += 1
+            rollup_rows = len(store.load_rollup())
+            print(f"{written * args.offers_per_day:9d} offers | {rollup_rows:8d} rollup rows"
+                  f" | raw {timed(from_raw, store) * 1000:8.1f} ms"
+                  f" | rollup {timed(from_rollup, store) * 1000:8.1f} ms"
+                  f" | append with rollup {append_time / max(appended, 1) * 1000:6.1f} ms/day")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
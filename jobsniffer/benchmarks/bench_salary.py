@@ -0,0 +1,130 @@
+# Benchmark: per-row extract_salary vs vectorized normalize_salaries
+#
+#     python -m benchmarks.bench_salary --rows 1000000
+
+import argparse
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.salary import normalize_salaries
+
+# Formats seen on the boards; amounts are drawn per row, so that nearly every
+# string is distinct and the factorize step of normalize_salaries cannot hide
+# the parsing cost (a few hundred templated strings would be parsed once each)
+TEMPLATES = [
+    "{low} - {high} € / an",
+    "{low} € / an",
+    "{low} € brut annuel",
+    "{month} - {month_high} € / mois",
+    "{month} € par mois",
+    "{hour} € / heure",
+    "{day} - {day_high} € / jour",
+    "{k}k€ - {k_high}k€",
+    "{k}k€",
+    "Selon profil",
+]
+EXTRAS = ["", "", "", " + 13ème mois", " sur 13 mois", " + primes", ", selon expérience", " + 14e mois"]
+# Plain, no-break and narrow no-break spaces, a dot or nothing between thousands
+SEPARATORS = [" ", "\u00a0", "\u202f", ".", ""]
+
+# Parsed annual salary every format must give, extra months included
+CHECKS = {
+    "40k€ + 13ème mois": 40000.0,
+    "45 000 € / an sur 13 mois": 45000.0,
+    "3 000 € / mois + 13e mois": 36000.0,
+    "40 - 45k€": 42500.0,
+    "11,88 € / heure": 11.88 * 1607,
+    "450 - 550 € / jour": 500.0 * 218,
+}
+
+
+def extract_salary(salary_text):
+    # Previous implementation from spiders/main.py, kept as the reference
+    if pd.isna(salary_text) or not isinstance(salary_text, str):
+        return None
+    numbers = re.findall(r'(\d+\s*\d*)', salary_text)
+    if not numbers:
+        return None
+    values = []
+    for num in numbers:
+        cleaned_num = num.replace(' ', '')
+        if cleaned_num:
+            try:
+                values.append(float(cleaned_num))
+            except:
+                pass
+    if values:
+        return sum(values) / len(values)
+    return None
+
+
+def _thousands(value, separator):
+    return f"{value:,}".replace(",", separator)
+
+
+def synthetic_salaries(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(TEMPLATES), rows)
+    extras = rng.integers(0, len(EXTRAS), rows)
+    separators = rng.integers(0, len(SEPARATORS), rows)
+    low = rng.integers(180, 1200, rows) * 100
+    month = rng.integers(1500, 8000, rows)
+    hour = rng.integers(1150, 6000, rows) / 100
+    day = rng.integers(150, 900, rows)
+    k = rng.integers(200, 900, rows) / 10
+    values = []
+    for n in range(rows):
+        sep = SEPARATORS[separators[n]]
+        text = TEMPLATES[picks[n]].format(
+            low=_thousands(int(low[n]), sep), high=_thousands(int(low[n]) + 5000, sep),
+            month=_thousands(int(month[n]), sep), month_high=_thousands(int(month[n]) + 500, sep),
+            hour=f"{hour[n]:.2f}".replace(".", ","), day=day[n], day_high=day[n] + 100,
+            k=f"{k[n]:g}".replace(".", ","), k_high=f"{k[n] + 5:g}".replace(".", ","),
+        )
+        values.append(text + EXTRAS[extras[n]])
+    values = pd.Series(values, dtype=object)
+    values[rng.random(rows) < 0.1] = None
+    return values
+
+
+def check_parsing():
+    """Exit with status 1 when a known format is parsed wrong."""
+    salaries = pd.Series(list(CHECKS), dtype=object)
+    parsed = normalize_salaries(salaries)["salary_annual_eur"]
+    failures = 0
+    for text, got in zip(salaries, parsed):
+        if not np.isclose(got, CHECKS[text]):
+            print(f"  {text!r}: {got:,.0f} €/an, {CHECKS[text]:,.0f} expected")
+            failures += 1
+    if failures:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    check_parsing()
+    salaries = synthetic_salaries(args.rows)
+
+    start = time.perf_counter()
+    salaries.apply(extract_salary)
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    normalized = normalize_salaries(salaries)
+    vectorized = time.perf_counter() - start
+
+    print(f"rows: {args.rows}, distinct salaries: {salaries.nunique()}")
+    print(f"extract_salary (apply): {legacy:7.2f} s  ({args.rows / legacy:,.0f} rows/s)")
+    print(f"normalize_salaries:     {vectorized:7.2f} s  ({args.rows / vectorized:,.0f} rows/s)")
+    print(f"parsed: {normalized['salary_numeric'].notna().sum()} / units: "
+          f"{normalized['salary_unit'].value_counts().to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
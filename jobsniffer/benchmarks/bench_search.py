@@ -0,0 +1,73 @@
+# Benchmark: results filter box, row-by-row scan vs inverted index
+#
+#     python -m benchmarks.bench_search --rows 300000
+#
+# Synthetic offers shaped like the combined scrape results. The scan is the
+# previous filter of main.py (every cell cast to str, every column searched);
+# it is timed on --scan-rows rows only and scaled, since it is linear.
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.search import SearchIndex
+
+TITLES = ["Data Analyst H/F", "Ingénieur Données", "Développeur Python", "Chef de projet",
+          "Data Scientist", "Comptable", "Analyste financier", "Consultant SAP", "Technicien réseau"]
+COMPANIES = [f"Société {i}" for i in range(3000)] + ["Total", "Dataiku", "Société Générale"]
+CITIES = [f"Ville {i} - {i % 95:02d}" for i in range(2000)] + ["Paris - 75", "Lyon - 69"]
+CONTRACTS = ["CDI", "CDD", "Stage", "Alternance", "Freelance"]
+WORDS = ("analyser données construire tableaux bord piloter équipe développer api python sql "
+         "modéliser risques rédiger rapports accompagner clients déployer réseau").split()
+QUERIES = ["data", "donnees", "analy", "company:total", "contrat:cdi paris", "python sql", "lyst"]
+
+
+def offers(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    missions = [" ".join(rng.choice(WORDS, 12)) + f" réf {i}" for i in range(rows)]
+    return pd.DataFrame({
+        "job_title": rng.choice(TITLES, rows),
+        "company_name": rng.choice(COMPANIES, rows),
+        "location": rng.choice(CITIES, rows),
+        "contract_type": rng.choice(CONTRACTS, rows),
+        "salary": rng.choice(["40 000 € / an", "2 100 € / mois", None], rows),
+        "qualifications": [list(rng.choice(["Bac +5", "SQL", "Python", "Excel", "Anglais"], 2)) for _ in range(rows)],
+        "missions": missions,
+    })
+
+
+def scan(df, query):
+    return df[df.astype(str).apply(lambda row: row.str.contains(query, case=False).any(), axis=1)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--scan-rows", type=int, default=20_000)
+    args = parser.parse_args()
+
+    df = offers(args.rows)
+    start = time.perf_counter()
+    index = SearchIndex(df)
+    print(f"{args.rows} offers, index built in {time.perf_counter() - start:.2f} s")
+
+    sample = df.head(args.scan_rows)
+    start = time.perf_counter()
+    scan(sample, "data")
+    per_row = (time.perf_counter() - start) / len(sample)
+    print(f"row scan: {per_row * args.rows * 1000:10.0f} ms per query (scaled from {len(sample)} rows)")
+
+    for query in QUERIES:
+        index.search(query)
+        runs = 20
+        start = time.perf_counter()
+        for _ in range(runs):
+            hits = index.search(query)
+        elapsed = (time.perf_counter() - start) / runs
+        print(f"index {query!r:<22} {elapsed * 1000:8.2f} ms | {len(hits)} matches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# Benchmark: source adapters on saved pages and on the stand-in board
+#
+#     python -m benchmarks.bench_sources --pages 5 --offers 20
+#     python -m benchmarks.bench_sources --fixtures path/to/fixtures
+#
+# Fixtures: every <source>/expected.json under --fixtures lists saved pages
+# of that source (listing or detail), the URL they were served at and the
+# cards or detail fields the source adapter (jobsniffer/extractors) must
+# extract from them. Mismatches are printed field by field, then the time
+# per page. Saved pages keep the markup of the real board, so a changed
+# selector shows up here before a crawl comes back empty.
+#
+# Crawl: each SourceSpider crawls --pages x --offers offers of the stand-in
+# board, with the metrics extension on; every offer must come out once,
+# with its listing and detail fields, and no error may be logged (signal
+# handlers such as CrawlMetrics.item_scraped log theirs instead of failing
+# the crawl).
+#
+# The benchmark exits with status 1 when a fixture page or a crawl fails
+# these checks.
+
+import argparse
+import json
+import os
+import time
+
+from scrapy.http import HtmlResponse
+
+from benchmarks.standin_server import StandInServer
+from jobsniffer.runner import CrawlService
+from jobsniffer.spiders.hellowork import HelloWorkSpider
+from jobsniffer.spiders.indeed import IndeedSpider
+from jobsniffer.spiders.wttj import WelcomeToTheJungleSpider
+
+SPIDERS = {spider.name: spider for spider in (HelloWorkSpider, WelcomeToTheJungleSpider, IndeedSpider)}
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+# Fields every crawled offer must have, from its listing card and its detail page
+CRAWL_FIELDS = {
+    "hellowork": ("job_title", "company_name", "location", "job_url", "missions"),
+    "wttj": ("job_title", "company_name", "location", "job_url", "missions"),
+    "indeed": ("job_id", "job_title", "company_name", "location", "contract_type", "job_url", "description"),
+}
+
+
+def extract(spider, page):
+    response = HtmlResponse(url=page["url"], body=page["body"], encoding="utf-8")
+    if "cards" in page:
+        return spider.listing_cards(response)
+    return spider.adapter.detail.extract_response(response)
+
+
+def diff(expected, actual, path=""):
+    if isinstance(expected, list) and isinstance(actual, list) and expected and isinstance(expected[0], dict):
+        if len(expected) != len(actual):
+            yield f"{path}: {len(actual)} cards, {len(expected)} expected"
+        for n, (want, got) in enumerate(zip(expected, actual)):
+            yield from diff(want, got, f"{path}[{n}]")
+    elif isinstance(expected, dict) and isinstance(actual, dict):
+        for key in expected.keys() | actual.keys():
+            yield from diff(expected.get(key), actual.get(key), f"{path}.{key}")
+    elif expected != actual:
+        yield f"{path}: {actual!r}, {expected!r} expected"
+
+
+def run_fixtures(folder, repeat):
+    """Check and time the fixtures; return the number of mismatching pages."""
+    failures = 0
+    for source in sorted(os.listdir(folder)):
+        expected_path = os.path.join(folder, source, "expected.json")
+        if source not in SPIDERS or not os.path.exists(expected_path):
+            continue
+        spider = SPIDERS[source](job_title="Data Analyst", location="Paris")
+        with open(expected_path, encoding="utf-8") as f:
+            pages = json.load(f)
+        mismatches = 0
+        elapsed = 0.0
+        for name, page in sorted(pages.items()):
+            with open(os.path.join(folder, source, name), "rb") as f:
+                page["body"] = f.read()
+            actual = extract(spider, page)
+            problems = list(diff(page.get("cards", page.get("detail")), actual, name))
+            mismatches += bool(problems)
+            for problem in problems:
+                print(f"  {source} {problem}")
+            start = time.perf_counter()
+            for _ in range(repeat):
+                extract(spider, page)
+            elapsed += time.perf_counter() - start
+        print(f"fixtures {source:<9} {len(pages) - mismatches}/{len(pages)} pages match | "
+              f"{elapsed / (repeat * len(pages)) * 1e3:.2f} ms/page")
+        failures += mismatches
+    return failures
+
+
+def run_crawls(args):
+    """Crawl the stand-in board with each source; return the number of failed crawls."""
+    failures = 0
+    service = CrawlService()
+    for name, value in (("LOG_LEVEL", "WARNING"), ("SEEN_OFFERS_DB", None), ("METRICS_FILE", None),
+                        ("METRICS_PORT", 0)):
+        service.settings.set(name, value)
+    expected = args.pages * args.offers
+    with StandInServer(pages=args.pages, offers_per_page=args.offers, latency=0.02) as server:
+        for source in SPIDERS:
+            start = time.perf_counter()
+            job = service.submit(source, "Data Analyst", "Paris", args.pages, base_url=server.base_url)
+            job.result()
+            elapsed = time.perf_counter() - start
+            urls = {item["job_url"] for item in job.items}
+            incomplete = sum(any(not item.get(field) for field in CRAWL_FIELDS[source]) for item in job.items)
+            errors = job.stats.get('log_count/ERROR', 0)
+            failures += len(job.items) != expected or len(urls) != expected or bool(incomplete) or bool(errors)
+            print(f"crawl    {source:<9} {len(job.items)} items, {len(urls)} unique ({expected} expected), "
+                  f"{incomplete} incomplete, {errors} errors, "
+                  f"{job.metrics['items'] if job.metrics else 0} items in metrics | "
+                  f"{job.stats.get('source/listing_pages', 0)} listing + "
+                  f"{job.stats.get('source/detail_pages', 0)} detail pages in {elapsed:.2f}s")
+    service.stop()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=FIXTURES)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--offers", type=int, default=20)
+    args = parser.parse_args()
+    failures = run_fixtures(args.fixtures, args.repeat) + run_crawls(args)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Benchmark: "Par intitulé de poste" groups, raw titles vs title families
+#
+#     python -m benchmarks.bench_titles --rows 1000000 --jobs 300
+#
+# Generates --rows offers over --jobs base titles, decorated the way the job
+# boards do (gender markers, contract, seniority, casing, accents, plurals),
+# then reports the number of groups and the groupby time on the raw
+# job_title and on the title_family computed by jobsniffer/titles.py, with
+# the ingest cost of the families (first ingest, then an ingest of a new
+# batch against the known families).
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from jobsniffer.titles import TitleFamilies, add_title_family
+
+ROLES = ["Data Analyst", "Data Scientist", "Data Engineer", "Développeur Python", "Développeur Java",
+         "Développeur Full Stack", "Chef de projet digital", "Ingénieur DevOps", "Product Owner",
+         "Comptable", "Contrôleur de gestion", "Chargé de recrutement", "Assistant commercial",
+         "Technicien de maintenance", "Responsable logistique", "Infirmier", "Commercial terrain"]
+FIELDS = ["", " BI", " Cloud", " SAP", " Marketing", " RH", " Finance", " Industrie", " Santé", " Retail",
+          " Énergie", " Banque", " Assurance", " Transport", " Logistique", " Supply Chain", " Web", " Mobile"]
+DECORATIONS = ["{} H/F", "{} (F/H)", "{} - CDI", "{} (H/F) - CDD", "{} Junior", "{} Senior H/F",
+               "{} Confirmé", "{} - Stage 6 mois", "{} - Alternance", "{} F/H - Freelance", "{}"]
+
+
+def variant(rng, title):
+    text = DECORATIONS[rng.integers(len(DECORATIONS))].format(title)
+    roll = rng.random()
+    if roll < 0.1:
+        text = text.upper()
+    elif roll < 0.2:
+        text = text.lower()
+    elif roll < 0.25:
+        text = text.replace("é", "e")
+    elif roll < 0.3:
+        text = text.replace("Analyst", "Analyste").replace("Developpeur", "Développeur")
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--jobs", type=int, default=300)
+    parser.add_argument("--variants", type=int, default=60, help="distinct spellings per job")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    jobs = [role + field for role in ROLES for field in FIELDS][:args.jobs]
+    spellings = [variant(rng, job) for job in jobs for _ in range(args.variants)]
+    titles = pd.Series(np.array(spellings, dtype=object)[rng.integers(len(spellings), size=args.rows)])
+    history = pd.DataFrame({"job_title": titles, "salary_numeric": rng.normal(45_000, 8_000, args.rows)})
+
+    families = TitleFamilies()
+    half = args.rows // 2
+    start = time.perf_counter()
+    first = add_title_family(history.iloc[:half], families)
+    first_time = time.perf_counter() - start
+    start = time.perf_counter()
+    second = add_title_family(history.iloc[half:], families)
+    second_time = time.perf_counter() - start
+    history = pd.concat([first, second], ignore_index=True)
+    print(f"{args.rows} offers over {args.jobs} jobs | {len(families)} canonical titles")
+    print(f"title_family, first half  {first_time * 1000:8.0f} ms")
+    print(f"title_family, second half {second_time * 1000:8.0f} ms (against the known families)")
+
+    for column in ("job_title", "title_family"):
+        start = time.perf_counter()
+        groups = history.groupby(column, observed=True)["salary_numeric"].mean()
+        elapsed = time.perf_counter() - start
+        print(f"groupby {column:<13} {elapsed * 1000:8.1f} ms | {len(groups)} groups")
+
+
+if __name__ == "__main__":
+    main()
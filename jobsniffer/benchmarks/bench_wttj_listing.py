@@ -0,0 +1,99 @@
+# Benchmark: WTTJ listing pages from embedded state vs Selenium rendering
+#
+#     python -m benchmarks.bench_wttj_listing --pages 200
+#     python -m benchmarks.bench_wttj_listing --fixtures path/to/saved/listing/pages
+#
+# Runs offline on saved listing pages (*.html) or, by default, on synthetic
+# pages from the stand-in server. The Selenium path needs a local headless
+# Chrome; it is skipped with a message when none is available.
+
+import argparse
+import glob
+import os
+import tempfile
+import time
+import tracemalloc
+
+from parsel import Selector
+
+from benchmarks.standin_server import wttj_listing_html
+from jobsniffer.extractors.wttj import extract_listing_cards
+
+BASE_URL = "https://www.welcometothejungle.com"
+
+
+def load_pages(args):
+    if args.fixtures:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.fixtures, "*.html"))):
+            with open(path, encoding="utf-8") as f:
+                pages.append(f.read())
+        return pages
+    return [wttj_listing_html(page, 30, args.pages) for page in range(1, args.pages + 1)]
+
+
+def rendered_cards(html):
+    # Same selectors as WelcomeToTheJungleSpider.parse on the rendered page
+    return [job.css("h4::text").get() for job in Selector(text=html).css('div[data-role="jobs:thumb"]')]
+
+
+def measure(name, pages, parse):
+    tracemalloc.start()
+    start = time.perf_counter()
+    cards = sum(len(parse(html) or []) for html in pages)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {len(pages) / elapsed:9.1f} pages/s | {cards} cards | peak Python memory {peak / 1e6:6.1f} MB")
+
+
+def measure_selenium(pages):
+    try:
+        from selenium import webdriver
+        import psutil
+    except ImportError as e:
+        print(f"selenium render         skipped ({e})")
+        return
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless=new")
+    try:
+        driver = webdriver.Chrome(options=options)
+    except Exception as e:
+        print(f"selenium render         skipped (no headless Chrome: {e.__class__.__name__})")
+        return
+    try:
+        browser = psutil.Process(driver.service.process.pid)
+        peak_rss = 0
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            cards = 0
+            for i, html in enumerate(pages):
+                path = os.path.join(tmp, f"page{i}.html")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(html)
+                driver.get(f"file://{path}")
+                cards += len(rendered_cards(driver.page_source))
+                rss = sum(p.memory_info().rss for p in [browser, *browser.children(recursive=True)])
+                peak_rss = max(peak_rss, rss)
+            elapsed = time.perf_counter() - start
+        print(f"{'selenium render':<22} {len(pages) / elapsed:9.1f} pages/s | {cards} cards | peak browser RSS {peak_rss / 1e6:6.1f} MB")
+    finally:
+        driver.quit()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--fixtures", help="folder of saved WTTJ listing pages (*.html)")
+    parser.add_argument("--no-selenium", action="store_true")
+    args = parser.parse_args()
+
+    pages = load_pages(args)
+    measure("embedded state (json)", pages, lambda html: extract_listing_cards(html, BASE_URL))
+    measure("rendered cards (css)", pages, rendered_cards)
+    if not args.no_selenium:
+        measure_selenium(pages)
+
+
+if __name__ == "__main__":
+    main()
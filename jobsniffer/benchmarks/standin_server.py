@@ -0,0 +1,306 @@
+# Local stand-in for the job boards
+#
+# Serves synthetic HelloWork-, WTTJ- and Indeed-shaped listing and detail pages so the
+# spiders can be benchmarked offline. Point a spider at it with
+# `-a base_url=http://127.0.0.1:<port>`. Latency (with jitter), server errors
+# and CAPTCHA pages can be injected to see how a crawl behaves under load,
+# and a rate limit answers 429 above a number of requests in flight.
+
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+CONTRACTS = ["CDI", "CDD", "Alternance", "Stage", "Independant"]
+CITIES = ["Paris - 75", "Lyon - 69", "Toulouse - 31", "Bordeaux - 33", "Nantes - 44"]
+SALARIES = ["40 000 - 45 000 € / an", "35 000 € / an", "2 100 € / mois", None]
+
+
+def hellowork_listing_html(page, offers_per_page):
+    items = []
+    for n in range(offers_per_page):
+        job_id = page * 1000 + n
+        salary = SALARIES[job_id % len(SALARIES)]
+        salary_div = f'<div class="tw-tag-attractive-s">{salary}</div>' if salary else ""
+        items.append(f"""
+<li data-id-storage-target="item" data-id-storage-item-id="{job_id}">
+  <a data-cy="offerTitle" title="Data Analyst H/F - Entreprise {job_id % 97}" href="/fr-fr/emplois/{job_id}.html">Data Analyst H/F</a>
+  <div data-cy="contractCard">{CONTRACTS[job_id % len(CONTRACTS)]}</div>
+  <div data-cy="contractTag">Télétravail partiel</div>
+  <div data-cy="localisationCard">{CITIES[job_id % len(CITIES)]}</div>
+  {salary_div}
+  <div class="tw-typo-s tw-text-grey">il y a {job_id % 7 + 1} jours</div>
+</li>""")
+    return f"<html><body><ul>{''.join(items)}</ul></body></html>"
+
+
+def hellowork_detail_html(job_id):
+    return f"""<html><body>
+<section class="tw-mb-8"><div class="tw-typo-xl">Résumé de l'offre {job_id}</div></section>
+<ul class="tw-flex-wrap"><li>Bac +5</li><li>Exp. 1 à 7 ans</li><li>{CONTRACTS[job_id % len(CONTRACTS)]}</li></ul>
+<h2>Les missions du poste</h2>
+<p>Analyser les données de l'offre {job_id}.</p>
+<p>Construire des tableaux de bord.</p>
+<h2>Le profil recherché</h2>
+<p>Maîtrise de Python et SQL.</p>
+</body></html>"""
+
+
+WTTJ_CONTRACTS = ["full_time", "temporary", "internship", "apprenticeship", "freelance"]
+WTTJ_REMOTE = ["partial", "punctual", "no", "fulltime"]
+
+
+def wttj_hits(page, offers_per_page):
+    hits = []
+    for n in range(offers_per_page):
+        job_id = page * 1000 + n
+        hits.append({
+            "name": f"Data Analyst {job_id}",
+            "slug": f"data-analyst-{job_id}",
+            "reference": str(job_id),
+            "organization": {"name": f"Entreprise {job_id % 97}", "slug": f"entreprise-{job_id % 97}"},
+            "offices": [{"city": CITIES[job_id % len(CITIES)].split(" - ")[0], "country_code": "FR"}],
+            "contract_type": WTTJ_CONTRACTS[job_id % len(WTTJ_CONTRACTS)],
+            "remote": WTTJ_REMOTE[job_id % len(WTTJ_REMOTE)],
+            "published_at": "2024-05-02T08:00:00Z",
+        })
+    return hits
+
+
+def wttj_listing_html(page, offers_per_page, pages):
+    """Listing page as served, with both the embedded state and the cards
+    markup the browser would render from it."""
+    hits = wttj_hits(page, offers_per_page) if page <= pages else []
+    state = {"queries": [{"state": {"data": {"hits": hits, "nbPages": pages, "page": page - 1}}}]}
+    cards = "".join(f"""
+<div data-role="jobs:thumb">
+  <a href="/fr/companies/{hit['organization']['slug']}/jobs/{hit['slug']}"><h4>{hit['name']}</h4></a>
+  <span class="wui-text">{hit['organization']['name']}</span>
+  <p class="wui-text"><span>{hit['offices'][0]['city']}</span></p>
+  <div variant="default"><span>{hit['contract_type']}</span></div><div><span>{hit['remote']}</span></div>
+</div>""" for hit in hits)
+    return (f"<html><head><script>window.__INITIAL_DATA__ = {json.dumps(json.dumps(state))}</script></head>"
+            f"<body>{cards}</body></html>")
+
+
+def wttj_detail_html(slug):
+    return f"""<html><body>
+<section class="tw-mb-8"><div class="tw-typo-xl">Descriptif du poste {slug}</div></section>
+<ul class="tw-flex-wrap"><li>CDI</li><li>Bac +5</li></ul>
+<h2>Les missions</h2>
+<p>Analyser les données ({slug}).</p>
+<h2>Le profil recherché</h2>
+<p>Python, SQL.</p>
+</body></html>"""
+
+
+INDEED_PAGE_SIZE = 10
+INDEED_CONTRACTS = ["CDI", "CDD", "Alternance", "Stage", "Freelance / Indépendant"]
+
+
+def indeed_listing_html(start, offers_per_page, pages):
+    """Search page of the offers from ``start``; Indeed pages hold ten cards,
+    the stand-in serves ``offers_per_page`` per page at the same offsets."""
+    page = start // INDEED_PAGE_SIZE + 1
+    cards = []
+    for n in range(offers_per_page if page <= pages else 0):
+        jk = f"{page * 1000 + n:016x}"
+        job_id = page * 1000 + n
+        salary = SALARIES[job_id % len(SALARIES)]
+        salary_div = (f'<div class="metadata salary-snippet-container"><div data-testid="attribute_snippet_testid">'
+                      f'{salary}</div></div>' if salary else "")
+        cards.append(f"""
+<li><div class="cardOutline tapItem result job_{jk}"><div class="job_seen_beacon">
+  <h2 class="jobTitle"><a data-jk="{jk}" class="jcs-JobTitle" href="/rc/clk?jk={jk}&amp;bb=x"><span title="Data Analyst {job_id}">Data Analyst {job_id}</span></a></h2>
+  <span data-testid="company-name">Entreprise {job_id % 97}</span>
+  <div data-testid="text-location">{CITIES[job_id % len(CITIES)]}</div>
+  {salary_div}
+  <div class="metadata"><div data-testid="attribute_snippet_testid">{INDEED_CONTRACTS[job_id % len(INDEED_CONTRACTS)]}</div></div>
+  <div class="metadata"><div data-testid="attribute_snippet_testid">Télétravail partiel</div></div>
+  <span data-testid="myJobsStateDate"><span class="visually-hidden">Posted</span>Il y a {job_id % 7 + 1} jours</span>
+</div></div></li>""")
+    return f"<html><body><div id=\"mosaic-provider-jobcards\"><ul>{''.join(cards)}</ul></div></body></html>"
+
+
+def indeed_detail_html(jk):
+    return f"""<html><body>
+<h1 class="jobsearch-JobInfoHeader-title"><span>Data Analyst</span></h1>
+<div id="jobDetailsSection"><ul><li><span>Python</span></li><li><span>SQL</span></li></ul></div>
+<div id="jobDescriptionText"><p>Analyser les données de l'offre {jk}.</p><ul><li>Construire des tableaux de bord.</li></ul></div>
+</body></html>"""
+
+
+ERROR_STATUSES = [500, 503, 429]
+
+
+def captcha_html():
+    """Challenge page as served by the anti-bot layer, with an HTTP 200."""
+    return """<html><head><title>Vérification de sécurité</title></head><body>
+<div id="captcha-container" class="captcha">Merci de confirmer que vous n'êtes pas un robot.</div>
+<script src="https://captcha-delivery.com/captcha/"></script>
+</body></html>"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.inflight += 1
+            limited = server.max_inflight and server.inflight > server.max_inflight
+        try:
+            if limited:
+                server.count("rate_limited")
+                self._send_empty(429)
+            else:
+                self._serve()
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+    def _serve(self):
+        server = self.server
+        with server.lock:
+            delay = server.latency + server.rng.uniform(0, server.jitter) if server.jitter else server.latency
+            roll = server.rng.random()
+            status = server.rng.choice(ERROR_STATUSES)
+        if delay:
+            time.sleep(delay)
+        if roll < server.error_rate:
+            server.count(status)
+            self._send_empty(status)
+            return
+        if roll < server.error_rate + server.captcha_rate:
+            server.count("captcha")
+            self._send_html(captcha_html())
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/fr-fr/emploi/recherche.html":
+            page = int(query.get("page", ["1"])[0])
+            if page > server.pages:
+                body = "<html><body><ul></ul></body></html>"
+            else:
+                body = hellowork_listing_html(page, server.offers_per_page)
+        elif url.path.startswith("/fr-fr/emplois/") and url.path.endswith(".html"):
+            job_id = int(url.path.rsplit("/", 1)[-1][:-len(".html")])
+            body = hellowork_detail_html(job_id)
+        elif url.path == "/fr/jobs":
+            page = int(query.get("page", ["1"])[0])
+            body = wttj_listing_html(page, server.offers_per_page, server.pages)
+        elif url.path.startswith("/fr/companies/") and "/jobs/" in url.path:
+            body = wttj_detail_html(url.path.rsplit("/", 1)[-1])
+        elif url.path == "/jobs":
+            body = indeed_listing_html(int(query.get("start", ["0"])[0]), server.offers_per_page, server.pages)
+        elif url.path == "/viewjob" and "jk" in query:
+            body = indeed_detail_html(query["jk"][0])
+        else:
+            server.count(404)
+            self.send_error(404)
+            return
+        server.count(200)
+        self._send_html(body)
+
+    def _send_empty(self, status):
+        self.send_response(status)
+        if status in (429, 503):
+            self.send_header("Retry-After", "1")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_html(self, body):
+        payload = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # The default backlog of 5 makes the kernel drop connections under
+    # concurrent crawls, which shows up as one-second latency outliers
+    request_queue_size = 128
+
+
+class StandInServer:
+    """Threaded HTTP server usable as a context manager.
+
+    ``latency`` is added to every response, plus a uniform ``jitter``.
+    ``error_rate`` and ``captcha_rate`` are the shares of requests answered
+    with a 500/503/429 or with a CAPTCHA page; ``seed`` makes them
+    reproducible. Above ``max_inflight`` concurrent requests the server
+    answers 429 at once, like a rate-limiting front. ``served`` counts
+    responses by status ("captcha" and "rate_limited" apart).
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, pages=5, offers_per_page=20, latency=0.0,
+                 jitter=0.0, error_rate=0.0, captcha_rate=0.0, max_inflight=0, seed=None):
+        self.httpd = _HTTPServer((host, port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.pages = pages
+        self.httpd.offers_per_page = offers_per_page
+        self.httpd.latency = latency
+        self.httpd.jitter = jitter
+        self.httpd.error_rate = error_rate
+        self.httpd.captcha_rate = captcha_rate
+        self.httpd.max_inflight = max_inflight
+        self.httpd.inflight = 0
+        self.httpd.rng = random.Random(seed)
+        self.httpd.lock = threading.Lock()
+        self.httpd.served = {}
+        self.httpd.count = self._count
+        self._thread = None
+
+    def _count(self, status):
+        with self.httpd.lock:
+            self.httpd.served[status] = self.httpd.served.get(status, 0) + 1
+
+    @property
+    def served(self):
+        return dict(self.httpd.served)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--offers-per-page", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--captcha-rate", type=float, default=0.0)
+    parser.add_argument("--max-inflight", type=int, default=0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    server = StandInServer(port=args.port, pages=args.pages, offers_per_page=args.offers_per_page,
+                           latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           captcha_rate=args.captcha_rate, max_inflight=args.max_inflight, seed=args.seed)
+    print(f"Stand-in job board on {server.base_url}")
+    server.httpd.serve_forever()
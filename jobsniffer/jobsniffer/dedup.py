@@ -0,0 +1,292 @@
+# Cross-source duplicate offers
+#
+# The same offer is often published on HelloWork and on WTTJ, and is scraped
+# again by every later search that finds it. add_duplicate_columns gives each
+# offer a dedup_cluster_id shared by its near duplicates, and flags as
+# duplicate every offer whose cluster already had an earlier member, so that
+# the dashboard counts unique offers with a plain sum.
+#
+# Offers are compared on the word 3-grams of their missions / profile /
+# description text and the words of their company name, with MinHash / LSH
+# (see minhash.py): an offer is only compared with the offers sharing one of
+# the band buckets of its text, never with the whole history. A quarter of
+# the signature hashes the company, so that the same text posted by two
+# companies (agency boilerplate, copied templates) stays below the
+# threshold. The buckets and the signature of each cluster's first offer are
+# kept in SQLite next to the history, so an ingest looks up its own buckets
+# and adds those of the clusters it opens:
+#
+#     buckets key -> clusters       clusters id -> signature
+#
+# Given offer keys (see offer_keys), the cluster and flag of each offer are
+# also kept: an offer read again under the same key, such as the earlier
+# offers of a resumed crawl, keeps them instead of being taken for a
+# duplicate of itself.
+#
+#     offers key -> cluster, duplicate
+
+import json
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .minhash import (MinHasher, band_keys, candidate_pairs, connected_components, hash_shingles, similarity,
+                      word_shingle_arrays)
+from .search import normalize
+
+# Signature: TEXT_PERM hashes of the text, then COMPANY_PERM of the company
+TEXT_PERM = 48
+COMPANY_PERM = 16
+BANDS = 12
+# Signature agreement above which two offers are the same offer
+THRESHOLD = 0.8
+SHINGLE_WORDS = 3
+# Offers of a batch compared with the next WINDOW offers of each bucket
+WINDOW = 4
+TEXT_COLUMNS = ["missions", "profil_recherche", "profile", "description"]
+# Legal forms and words the job boards add to or drop from company names
+COMPANY_STOP_WORDS = {"sa", "sas", "sasu", "sarl", "eurl", "sca", "snc", "scop", "groupe", "group", "france"}
+
+
+def _text(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return " ".join(str(v) for v in value)
+    return "" if value is None or (isinstance(value, float) and np.isnan(value)) else str(value)
+
+
+def company_shingles(company):
+    """Hashed words of a company name, legal form left out."""
+    words = set(normalize(company).replace(".", "").split()) - COMPANY_STOP_WORDS
+    return hash_shingles(words)
+
+
+class DuplicateIndex:
+    """LSH buckets of every offer seen so far, in SQLite."""
+
+    def __init__(self, path=":memory:", bands=BANDS, threshold=THRESHOLD):
+        self.path = path
+        self.bands = bands
+        self.threshold = threshold
+        self.text_hasher = MinHasher(TEXT_PERM, seed=1)
+        self.company_hasher = MinHasher(COMPANY_PERM, seed=2)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS clusters ("
+            " id INTEGER PRIMARY KEY,"
+            " signature BLOB NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " key INTEGER NOT NULL,"
+            " cluster INTEGER NOT NULL,"
+            " PRIMARY KEY (key, cluster)) WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS offers ("
+            " key TEXT PRIMARY KEY,"
+            " cluster INTEGER NOT NULL,"
+            " duplicate INTEGER NOT NULL) WITHOUT ROWID"
+        )
+        self.db.commit()
+        self.next_id = (self.db.execute("SELECT MAX(id) FROM clusters").fetchone()[0] or 0) + 1
+
+    def __len__(self):
+        return self.next_id - 1
+
+    def _stored_matches(self, keys, signatures):
+        """Best known cluster of each row and its similarity, -1 when none."""
+        # Keys of different bands differ (see band_keys): no band column
+        flat = pd.DataFrame({"row": np.repeat(np.arange(len(keys)), keys.shape[1]),
+                             "key": keys.view(np.int64).ravel()})
+        found = pd.DataFrame(self.db.execute(
+            "SELECT key, cluster FROM buckets WHERE key IN (SELECT value FROM json_each(?))",
+            (json.dumps(flat["key"].unique().tolist()),),
+        ).fetchall(), columns=["key", "cluster"], dtype=np.int64)
+        pairs = flat.merge(found, on="key")[["row", "cluster"]].drop_duplicates().to_numpy()
+        best = np.full(len(keys), -1, dtype=np.int64)
+        if not len(pairs):
+            return best
+        clusters, positions = np.unique(pairs[:, 1], return_inverse=True)
+        stored = dict(self.db.execute(
+            "SELECT id, signature FROM clusters WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(clusters.tolist()),),
+        ))
+        known = np.frombuffer(b"".join(stored[c] for c in clusters.tolist()),
+                              dtype=np.uint32).reshape(len(clusters), -1)
+        scores = (signatures[pairs[:, 0]] == known[positions]).mean(axis=1)
+        # Highest score last, so that it wins the assignment
+        order = np.argsort(scores, kind="stable")
+        score = np.zeros(len(keys))
+        best[pairs[order, 0]] = pairs[order, 1]
+        score[pairs[order, 0]] = scores[order]
+        return np.where(score >= self.threshold, best, -1)
+
+    def assign(self, texts, companies):
+        """Cluster id (-1 without text) and duplicate flag of each offer.
+
+        Offers are matched against the known clusters and against each
+        other; offers of the same batch are in their input order, so the
+        first of a new cluster is the one not flagged as a duplicate. Offers
+        without text cannot be told apart from other offers of the same
+        company and are never matched.
+        """
+        n = len(texts)
+        cluster_ids = np.full(n, -1, dtype=np.int64)
+        duplicate = np.zeros(n, dtype=bool)
+        values, lengths = word_shingle_arrays(texts, SHINGLE_WORDS)
+        present = np.flatnonzero(lengths)
+        if not len(present):
+            return cluster_ids, duplicate
+        with self._lock:
+            company_codes, company_names = pd.factorize(pd.Series(companies).iloc[present])
+            company_signatures = self.company_hasher.signatures([company_shingles(c) for c in company_names])
+            signatures = np.hstack([
+                self.text_hasher.signatures_flat(values, lengths)[present],
+                company_signatures[company_codes],
+            ])
+            # Buckets on the text only: the company weighs in the verification
+            keys = band_keys(signatures[:, :TEXT_PERM], self.bands)
+            best = self._stored_matches(keys, signatures)
+
+            left, right = candidate_pairs(keys, window=WINDOW)
+            keep = similarity(signatures, left, right) >= self.threshold
+            components = connected_components(len(present), left[keep], right[keep])
+
+            # A component joins the known cluster one of its members matched,
+            # or opens a new cluster whose first member is not a duplicate
+            matched = best >= 0
+            joined = pd.Series(best[matched]).groupby(components[matched]).first()
+            target = np.full(len(present), -1, dtype=np.int64)
+            in_known = np.isin(components, joined.index.to_numpy())
+            target[in_known] = joined.reindex(components[in_known]).to_numpy()
+            fresh, first = np.unique(components[~in_known], return_index=True)
+            new_ids = self.next_id + np.arange(len(fresh))
+            target[~in_known] = new_ids[np.searchsorted(fresh, components[~in_known])]
+            is_duplicate = np.ones(len(present), dtype=bool)
+            is_duplicate[np.flatnonzero(~in_known)[first]] = False
+
+            # Later offers are verified against the first offer of a cluster,
+            # only its buckets are needed to find it
+            leaders = np.flatnonzero(~in_known)[first]
+            self.db.executemany("INSERT INTO clusters (id, signature) VALUES (?, ?)",
+                                zip(new_ids.tolist(), (signatures[i].tobytes() for i in leaders)))
+            self.db.executemany("INSERT OR IGNORE INTO buckets (key, cluster) VALUES (?, ?)",
+                                zip(keys[leaders].view(np.int64).ravel().tolist(),
+                                    np.repeat(new_ids, self.bands).tolist()))
+            self.db.commit()
+            self.next_id += len(fresh)
+
+        cluster_ids[present] = target
+        duplicate[present] = is_duplicate
+        return cluster_ids, duplicate
+
+    def lookup(self, keys):
+        """(cluster id, duplicate) already given to each of ``keys``, by key."""
+        keys = [key for key in dict.fromkeys(keys) if isinstance(key, str)]
+        if not keys:
+            return {}
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT key, cluster, duplicate FROM offers WHERE key IN (SELECT value FROM json_each(?))",
+                (json.dumps(keys),),
+            ).fetchall()
+        return {key: (cluster, bool(duplicate)) for key, cluster, duplicate in rows}
+
+    def remember(self, keys, cluster_ids, duplicate):
+        """Keep the cluster and flag given to each keyed offer; the first one wins."""
+        rows = [(key, int(cluster), int(flag)) for key, cluster, flag in zip(keys, cluster_ids, duplicate)
+                if isinstance(key, str)]
+        with self._lock:
+            self.db.executemany("INSERT OR IGNORE INTO offers (key, cluster, duplicate) VALUES (?, ?, ?)", rows)
+            self.db.commit()
+
+    def clear(self):
+        """Forget every offer, before clustering the history again."""
+        with self._lock:
+            self.db.execute("DELETE FROM clusters")
+            self.db.execute("DELETE FROM buckets")
+            self.db.execute("DELETE FROM offers")
+            self.db.commit()
+            self.next_id = 1
+
+    def close(self):
+        self.db.close()
+
+
+def offer_keys(df, scope):
+    """Key of each offer within ``scope`` (e.g. the crawl job it comes from).
+
+    ``scope`` is a scalar or a Series aligned on ``df``. Offers are told
+    apart by their job_id, else their job_url; the key is None without
+    either.
+    """
+    ident = pd.Series(None, index=df.index, dtype=object)
+    for column, prefix in (("job_url", "url:"), ("job_id", "id:")):
+        if column in df.columns:
+            values = df[column].astype(object)
+            present = values.notna() & (values.astype(str) != "")
+            ident = ident.where(~present, prefix + values.astype(str))
+    keys = scope.astype(str) if isinstance(scope, pd.Series) else str(scope)
+    keys = keys + ":" + ident.fillna("")
+    return keys.where(ident.notna(), None).astype(object)
+
+
+def add_duplicate_columns(df, index=None, keys=None):
+    """Add dedup_cluster_id and duplicate to a batch of offers.
+
+    ``index`` is the DuplicateIndex to match against and extend (a throwaway
+    in-memory one by default). Identical documents, such as the same offer
+    scraped again, are shingled and hashed once. With ``keys`` (see
+    offer_keys), offers the index already saw under the same key keep their
+    cluster and flag.
+    """
+    df = df.copy()
+    index = index if index is not None else DuplicateIndex()
+    keys = pd.Series(list(keys) if keys is not None else None, index=df.index, dtype=object)
+    stored = index.lookup(keys.tolist())
+    known = keys.isin(list(stored)).to_numpy()
+    batch = df[~known]
+    company = batch["company_name"].map(_text) if "company_name" in batch.columns else pd.Series("", index=batch.index)
+    text = pd.Series("", index=batch.index)
+    for column in TEXT_COLUMNS:
+        if column in batch.columns:
+            text = text + " " + batch[column].map(_text)
+    # Documents numbered in order of first appearance, as drop_duplicates keeps them
+    documents = pd.DataFrame({"company": company, "text": text})
+    codes = documents.groupby(["company", "text"], sort=False).ngroup().to_numpy()
+    uniques = documents.drop_duplicates()
+    cluster_ids, duplicate = index.assign(uniques["text"].tolist(), uniques["company"].tolist())
+    ids = np.full(len(df), -1, dtype=np.int64)
+    flags = np.zeros(len(df), dtype=bool)
+    ids[~known] = cluster_ids[codes]
+    # Repeats of a document after its first row are duplicates of it
+    repeated = pd.Series(codes, dtype=np.int64).duplicated().to_numpy()
+    flags[~known] = (duplicate[codes] | repeated) & (ids[~known] >= 0)
+    if known.any():
+        ids[known], flags[known] = zip(*(stored[key] for key in keys[known]))
+    index.remember(keys[~known].tolist(), ids[~known], flags[~known])
+    df["dedup_cluster_id"] = pd.arrays.IntegerArray(np.maximum(ids, 0), ids < 0)
+    df["duplicate"] = flags
+    return df
+
+
+def backfill(store):
+    """Cluster every offer already in the history again, oldest day first."""
+    store.duplicates.clear()
+    return store.rewrite(lambda df: add_duplicate_columns(df.sort_values("scraped_at", kind="stable"),
+                                                          store.duplicates))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from jobsniffer.history import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Add dedup_cluster_id / duplicate to a history store")
+    parser.add_argument("root", help="history store folder, e.g. jobsniffer/spiders/history")
+    args = parser.parse_args()
+    store = HistoryStore(args.root)
+    print(f"{backfill(store)} offres, {len(store.duplicates)} offres uniques")
@@ -0,0 +1 @@
+# Per-source extraction helpers used by the spiders
@@ -0,0 +1,108 @@
+# Compiled detail-page extractors
+#
+# Each source declares its detail fields once with the CSS selectors the
+# spiders used to run. They are translated to XPath and compiled when the
+# module is imported, then evaluated once per page against the tree Scrapy
+# already parsed: no Selector object per match, no CSS translation per
+# response, and no selector evaluated twice. Listing cards are extracted
+# the same way, relative to each card.
+#
+# A SourceAdapter gathers everything the generic spider (see sources.py)
+# needs to crawl a job board.
+
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import lxml.html
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+_translator = HTMLTranslator()
+
+
+class DetailExtractor:
+    """Extract the fields of a detail page with precompiled selectors.
+
+    ``fields`` maps an item field to ``(css, mode)`` where the selector
+    ends in ``::text`` or ``::attr(name)`` and mode is one of:
+
+    - ``"first"``: first text node, stripped, or None
+    - ``"list"``: every text node, stripped
+    - ``"join"``: every text node, stripped and joined with newlines
+    """
+
+    MODES = ("first", "list", "join")
+
+    def __init__(self, fields):
+        self.fields = []
+        for name, (css, mode) in fields.items():
+            if mode not in self.MODES:
+                raise ValueError(f"Unknown extraction mode {mode!r} for {name}")
+            xpath = etree.XPath(_translator.css_to_xpath(css), smart_strings=False)
+            self.fields.append((name, xpath, mode))
+
+    def extract(self, root):
+        data = {}
+        for name, xpath, mode in self.fields:
+            texts = xpath(root)
+            if mode == "first":
+                data[name] = texts[0].strip() if texts else None
+            elif mode == "list":
+                data[name] = [t.strip() for t in texts]
+            else:
+                data[name] = '\n'.join([t.strip() for t in texts])
+        return data
+
+    def extract_response(self, response):
+        """Reuse the lxml tree Scrapy already built for the response."""
+        return self.extract(response.selector.root)
+
+    def extract_html(self, html):
+        """Parse raw HTML with lxml directly, without Scrapy or parsel."""
+        return self.extract(lxml.html.fromstring(html))
+
+
+class ListingExtractor:
+    """Extract the job cards of a listing page.
+
+    ``cards`` is the CSS selector of one card; ``fields`` are declared as for
+    DetailExtractor and evaluated relative to each card.
+    """
+
+    def __init__(self, cards, fields):
+        self.cards = etree.XPath(_translator.css_to_xpath(cards))
+        self.fields = DetailExtractor(fields)
+
+    def extract(self, root):
+        return [self.fields.extract(card) for card in self.cards(root)]
+
+    def extract_response(self, response):
+        return self.extract(response.selector.root)
+
+    def extract_html(self, html):
+        return self.extract(lxml.html.fromstring(html))
+
+
+# Listing pages addressed by their number: all requested at once
+PARALLEL = "parallel"
+# Page N + 1 requested once page N has brought offers
+SEQUENTIAL = "sequential"
+
+
+@dataclass(frozen=True)
+class SourceAdapter:
+    """Declarative description of a job board.
+
+    ``search_url(base_url, job_title, location, page)`` builds the URL of a
+    listing page (pages start at 1). ``listing`` yields the card fields,
+    among which ``job_url`` (relative URLs are fine) and optionally
+    ``job_id``; ``clean_card`` turns them into listing fields, or returns
+    None to drop the card. ``detail`` extracts the detail page fields.
+    """
+
+    base_url: str
+    search_url: Callable
+    listing: ListingExtractor
+    detail: DetailExtractor
+    pagination: str = PARALLEL
+    clean_card: Optional[Callable] = None
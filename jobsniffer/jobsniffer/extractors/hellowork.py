@@ -0,0 +1,46 @@
+# HelloWork extraction helpers
+#
+# Listing pages are addressed by number. A card's title attribute reads
+# "<job title> - <company>".
+
+from .base import PARALLEL, DetailExtractor, ListingExtractor, SourceAdapter
+
+LISTING = ListingExtractor("ul li[data-id-storage-target='item']", {
+    "title": ("a[data-cy='offerTitle']::attr(title)", "first"),
+    "job_id": ("::attr(data-id-storage-item-id)", "first"),
+    "contract_type": ("div[data-cy='contractCard']::text", "first"),
+    "contract_tag": ("div[data-cy='contractTag']::text", "first"),
+    "salary": ("div.tw-tag-attractive-s::text", "first"),
+    "location": ("div[data-cy='localisationCard']::text", "first"),
+    "publication_date": ("div.tw-typo-s.tw-text-grey::text", "first"),
+    "job_url": ("a[data-cy='offerTitle']::attr(href)", "first"),
+})
+
+DETAIL = DetailExtractor({
+    "resume_de_loffre": ("section.tw-mb-8 div.tw-typo-xl::text", "first"),
+    "qualifications": ("ul.tw-flex-wrap li::text", "list"),
+    "missions": ("h2:contains('Les missions') ~ p::text", "join"),
+    "profil_recherche": ("h2:contains('Le profil') ~ p::text", "join"),
+})
+
+
+def search_url(base_url, job_title, location, page):
+    url = f"{base_url}/fr-fr/emploi/recherche.html?k={job_title}&l={location}"
+    return url if page == 1 else f"{url}&page={page}"
+
+
+def clean_card(card):
+    title, _, company = (card.pop("title") or "").rpartition("-")
+    card["job_title"] = title.strip() if title else company.strip()
+    card["company_name"] = company.strip() if title else None
+    return card
+
+
+ADAPTER = SourceAdapter(
+    base_url="https://www.hellowork.com",
+    search_url=search_url,
+    listing=LISTING,
+    detail=DETAIL,
+    pagination=PARALLEL,
+    clean_card=clean_card,
+)
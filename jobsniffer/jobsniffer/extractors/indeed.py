@@ -0,0 +1,65 @@
+# Indeed extraction helpers
+#
+# Search pages list PAGE_SIZE offers addressed by a start offset, so every
+# listing page URL is known in advance. Cards link to a tracking redirect:
+# the offer page is rebuilt from the card's job key (jk) instead. Contract
+# type, remote work and schedule share the same untyped snippets on a card
+# and are told apart by their wording; a remote offer's location reads
+# "Télétravail à Paris (75)".
+
+import re
+from urllib.parse import urlencode
+
+from .base import PARALLEL, DetailExtractor, ListingExtractor, SourceAdapter
+
+PAGE_SIZE = 10
+
+LISTING = ListingExtractor("div.job_seen_beacon", {
+    "job_id": ("h2.jobTitle a::attr(data-jk)", "first"),
+    "job_title": ("h2.jobTitle span::attr(title)", "first"),
+    "company_name": ("span[data-testid='company-name']::text", "first"),
+    "location": ("div[data-testid='text-location']::text", "first"),
+    "salary": ("div.salary-snippet-container div[data-testid='attribute_snippet_testid']::text", "first"),
+    "snippets": ("div.metadata:not(.salary-snippet-container) div[data-testid='attribute_snippet_testid']::text",
+                 "list"),
+    "publication_date": ("span[data-testid='myJobsStateDate']::text", "first"),
+})
+
+DETAIL = DetailExtractor({
+    "qualifications": ("div#jobDetailsSection li span::text", "list"),
+    "description": ("div#jobDescriptionText p::text, div#jobDescriptionText li::text", "join"),
+})
+
+CONTRACTS = ("CDI", "CDD", "Intérim", "Stage", "Alternance", "Apprentissage", "Freelance", "Indépendant",
+             "Contrat pro", "VIE")
+REMOTE_LOCATION = re.compile(r"^(Télétravail) (?:à|in) ", re.IGNORECASE)
+
+
+def search_url(base_url, job_title, location, page):
+    query = {"q": job_title or "", "l": location or "", "start": (page - 1) * PAGE_SIZE}
+    return f"{base_url}/jobs?{urlencode(query)}"
+
+
+def clean_card(card):
+    if not card["job_id"]:
+        return None
+    snippets = card.pop("snippets")
+    card["contract_type"] = next((s for s in snippets if s.startswith(CONTRACTS)), None)
+    card["remote"] = next((s for s in snippets if "télétravail" in s.lower()), None)
+    card["contract_tag"] = next((s for s in snippets if s not in (card["contract_type"], card["remote"])), None)
+    remote = REMOTE_LOCATION.match(card["location"] or "")
+    if remote:
+        card["location"] = card["location"][remote.end():]
+        card["remote"] = card["remote"] or remote.group(1)
+    card["job_url"] = f"/viewjob?jk={card['job_id']}"
+    return card
+
+
+ADAPTER = SourceAdapter(
+    base_url="https://fr.indeed.com",
+    search_url=search_url,
+    listing=LISTING,
+    detail=DETAIL,
+    pagination=PARALLEL,
+    clean_card=clean_card,
+)
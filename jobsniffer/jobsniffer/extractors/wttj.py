@@ -0,0 +1,152 @@
+# Welcome to the Jungle extraction helpers
+#
+# WTTJ listing pages ship the search results in the JSON state embedded in
+# the HTML (the payload the front-end hydrates from). Reading it with a JSON
+# parser gives the job cards without rendering the page in a browser; the
+# adapter's LISTING selectors read the cards of a page rendered by the
+# browser, when that state cannot be found.
+
+import json
+import re
+
+from .base import SEQUENTIAL, DetailExtractor, ListingExtractor, SourceAdapter
+
+STATE_PATTERNS = [
+    # Next.js pages
+    re.compile(r'<script[^>]+id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S),
+    # Legacy front-end: a JSON document serialized as a JS string
+    re.compile(r'window\.__INITIAL_DATA__\s*=\s*(".*?")\s*;?\s*</script>', re.S),
+    re.compile(r'window\.__INITIAL_DATA__\s*=\s*(\{.*?\})\s*;?\s*</script>', re.S),
+]
+
+CONTRACT_LABELS = {
+    "full_time": "CDI",
+    "temporary": "CDD / Temporaire",
+    "internship": "Stage",
+    "apprenticeship": "Alternance",
+    "freelance": "Freelance",
+    "part_time": "Temps partiel",
+    "vie": "VIE",
+}
+
+REMOTE_LABELS = {
+    "fulltime": "Télétravail total",
+    "partial": "Télétravail fréquent",
+    "punctual": "Télétravail occasionnel",
+    "no": "Télétravail non autorisé",
+}
+
+
+def load_state(html):
+    """Return the embedded page state as Python objects, or None."""
+    for pattern in STATE_PATTERNS:
+        match = pattern.search(html)
+        if match is None:
+            continue
+        try:
+            state = json.loads(match.group(1))
+            if isinstance(state, str):
+                state = json.loads(state)
+        except ValueError:
+            continue
+        return state
+    return None
+
+
+def _is_job_hit(node):
+    organization = node.get("organization")
+    return (
+        isinstance(organization, dict)
+        and isinstance(node.get("slug"), str)
+        and isinstance(node.get("name"), str)
+        and isinstance(organization.get("slug"), str)
+    )
+
+
+def iter_job_hits(node):
+    """Walk the state and yield every object shaped like a job search hit."""
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        if isinstance(current, dict):
+            if _is_job_hit(current):
+                yield current
+                continue
+            stack.extend(reversed(list(current.values())))
+        elif isinstance(current, list):
+            stack.extend(reversed(current))
+
+
+def job_card(hit, base_url):
+    """Map a search hit to the listing fields of the spider."""
+    organization = hit["organization"]
+    offices = hit.get("offices") or []
+    location = offices[0].get("city") if offices and isinstance(offices[0], dict) else None
+    contract_type = hit.get("contract_type")
+    remote = hit.get("remote")
+    return {
+        "job_title": hit["name"],
+        "company_name": organization.get("name"),
+        "location": location,
+        "contract_type": CONTRACT_LABELS.get(contract_type, contract_type),
+        "remote": REMOTE_LABELS.get(remote, remote),
+        "publication_date": hit.get("published_at"),
+        "job_url": f"{base_url}/fr/companies/{organization['slug']}/jobs/{hit['slug']}",
+    }
+
+
+def extract_listing_cards(html, base_url, page=1):
+    """Job cards of a listing page read from its embedded state.
+
+    Returns None when the page carries no usable state, in which case the
+    caller should fall back to rendering it. A first page whose state holds
+    no job hit counts as unusable too: the state schema has more likely
+    changed than the search come back empty. Later pages may run out of
+    offers.
+    """
+    state = load_state(html)
+    if state is None:
+        return None
+    cards = []
+    seen = set()
+    for hit in iter_job_hits(state):
+        card = job_card(hit, base_url)
+        if card["job_url"] not in seen:
+            seen.add(card["job_url"])
+            cards.append(card)
+    if not cards and page == 1:
+        return None
+    return cards
+
+
+LISTING = ListingExtractor('div[data-role="jobs:thumb"]', {
+    "job_title": ("h4::text", "first"),
+    "company_name": ("span.wui-text::text", "first"),
+    "location": ("p.wui-text span::text", "first"),
+    "contract_type": ('div[variant="default"] span::text', "first"),
+    "remote": ('div[variant="default"] + div span::text', "first"),
+    "job_url": ("a::attr(href)", "first"),
+})
+
+# Detail pages use the same blocks as HelloWork, under WTTJ field names
+DETAIL = DetailExtractor({
+    "description": ("section.tw-mb-8 div.tw-typo-xl::text", "first"),
+    "qualifications": ("ul.tw-flex-wrap li::text", "list"),
+    "missions": ("h2:contains('Les missions') ~ p::text", "join"),
+    "profile": ("h2:contains('Le profil') ~ p::text", "join"),
+})
+
+
+def search_url(base_url, job_title, location, page):
+    return (f"{base_url}/fr/jobs?query={job_title}&page={page}&aroundQuery={location}"
+            "&refinementList%5Boffices.country_code%5D%5B%5D=FR&aroundLatLng=48.85341%2C2.3488&aroundRadius=20")
+
+
+# The number of pages is only known from a listing page: walked in order
+ADAPTER = SourceAdapter(
+    base_url="https://www.welcometothejungle.com",
+    search_url=search_url,
+    listing=LISTING,
+    detail=DETAIL,
+    pagination=SEQUENTIAL,
+)
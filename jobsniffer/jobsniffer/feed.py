@@ -0,0 +1,157 @@
+# Streaming JSON Lines feed
+#
+# A `-o results.json` feed is a JSON array: it is only valid once the crawl
+# has ended and must then be parsed whole. JsonLinesFeed writes one JSON
+# object per line and flushes after every item, so a reader in another
+# thread or process can follow the crawl; JsonLinesTail is that reader: it
+# remembers how far it has read and only parses the bytes appended since.
+#
+#     scrapy crawl hellowork -a stream_feed=hellowork.jsonl
+#     scrapy crawl wttj -s STREAM_FEED=feeds/%(name)s.jsonl
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.utils.job import job_dir
+
+
+class JsonLinesFeed:
+    """Scrapy extension appending every scraped item to a JSON Lines file.
+
+    The path is the ``stream_feed`` spider argument, or the STREAM_FEED
+    setting (``%(name)s`` is the spider name). Without either it does
+    nothing. A crawl resumed from its JOBDIR appends to the feed of the
+    previous run.
+    """
+
+    def __init__(self, template=None, resume=False):
+        self.template = template
+        self.resume = resume
+        self.file = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        # Scrapy writes spider.state when a crawl with a JOBDIR closes
+        jobdir = job_dir(crawler.settings)
+        resume = jobdir is not None and os.path.exists(os.path.join(jobdir, "spider.state"))
+        ext = cls(crawler.settings.get("STREAM_FEED"), resume=resume)
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        return ext
+
+    def spider_opened(self, spider):
+        path = getattr(spider, "stream_feed", None) or self.template
+        if not path:
+            return
+        path = path % {"name": spider.name}
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        if self.resume:
+            self.file = open(path, "ab")
+            return
+        # A new file rather than a truncated one: a reader still following
+        # the previous crawl sees the inode change and starts over
+        if os.path.exists(path):
+            os.remove(path)
+        self.file = open(path, "wb")
+
+    def item_scraped(self, item, response, spider):
+        if self.file is None:
+            return
+        line = json.dumps(ItemAdapter(item).asdict(), ensure_ascii=False, default=str)
+        # One write per line: a reader never sees a line cut by another item
+        self.file.write(line.encode("utf-8") + b"\n")
+        self.file.flush()
+
+    def spider_closed(self, spider, reason):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class JsonLinesTail:
+    """Incremental reader of a JSON Lines file that is still being written.
+
+    ``poll()`` parses the complete lines appended since the previous call and
+    appends them to the in-memory table returned by ``frame()``. A trailing
+    line without its newline yet is kept for the next poll. If the file is
+    replaced or truncated, reading starts over.
+
+    The table is kept as one object array per column, grown by doubling, so
+    a poll only writes the new rows. ``frame()`` returns a view of them:
+    copy it before modifying it in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.rows = 0
+        self._inode = None
+        self._partial = b""
+        self._capacity = 0
+        self._columns = {}
+        self._frame = None
+
+    def poll(self):
+        """Read the new lines; return them as a DataFrame (maybe empty)."""
+        try:
+            with open(self.path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_ino != self._inode or stat.st_size < self.offset:
+                    self.reset()
+                    self._inode = stat.st_ino
+                if stat.st_size == self.offset:
+                    return pd.DataFrame()
+                f.seek(self.offset)
+                data = f.read(stat.st_size - self.offset)
+        except FileNotFoundError:
+            return pd.DataFrame()
+        self.offset += len(data)
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+        records = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+        if not records:
+            return pd.DataFrame()
+        start = self.rows
+        self._append(records)
+        return self._view(start, self.rows)
+
+    def _append(self, records):
+        rows = self.rows + len(records)
+        if rows > self._capacity:
+            self._capacity = max(rows, 2 * self._capacity, 64)
+            for name, values in self._columns.items():
+                grown = np.empty(self._capacity, dtype=object)
+                grown[:self.rows] = values[:self.rows]
+                self._columns[name] = grown
+        # New columns in the order they first appear, like from_records
+        for name in dict.fromkeys(name for record in records for name in record):
+            if name not in self._columns:
+                # Rows read before a column first shows up hold None
+                self._columns[name] = np.empty(self._capacity, dtype=object)
+        for name, values in self._columns.items():
+            # fromiter keeps lists (qualifications) as single values
+            values[self.rows:rows] = np.fromiter((record.get(name) for record in records),
+                                                 dtype=object, count=len(records))
+        self.rows = rows
+        self._frame = None
+
+    def _view(self, start, end):
+        return pd.DataFrame({name: pd.Series(values[start:end], dtype=object, copy=False)
+                             for name, values in self._columns.items()}, copy=False)
+
+    def frame(self):
+        """Every row read so far."""
+        if self._frame is None:
+            self._frame = self._view(0, self.rows)
+        return self._frame
@@ -0,0 +1,178 @@
+# Offline gazetteer of French locations
+#
+# The job boards write locations as "Paris - 75", "Paris 15e - 75", "Lyon",
+# "Île-de-France" or "Nantes - Paris". add_location_columns turns them into
+# typed city / departement / region categoricals at ingest time, so that
+# filtering by area is an equality test on integer codes instead of a
+# substring scan, and "Paris - 75" and "Paris 15e - 75" both land in Paris.
+#
+# Bundled data (jobsniffer/data): the 18 regions and 101 départements with
+# their INSEE codes, and the communes that matter for job offers
+# (préfectures, large cities and business suburbs). communes.csv can be
+# swapped for the full INSEE commune list with the same two columns; for
+# homonyms the first row wins, and a département code in the location
+# string always takes precedence over the name lookup. So does a postal code
+# ("75011 Paris", "Montreuil-Bellay (49260)"): a commune missing from the
+# bundled list still gets its département and region from it.
+
+import csv
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from .search import normalize
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# "Lyon - 69", "Ajaccio - 2A", "Cayenne - 973"
+DEPARTEMENT_SUFFIX = re.compile(r"^(?P<place>.*?)\s*[-–,(]\s*(?P<code>\d{2,3}|2[ab])\s*\)?$", re.I)
+# "75011 Paris", "Paris 75011", "Ajaccio (20000)"
+POSTAL_CODE = re.compile(r"(?<!\d)(?P<code>\d{5})(?!\d)")
+# "Paris 15e", "Lyon 1er", "Marseille 8ème"
+ARRONDISSEMENT = re.compile(r"\s+\d{1,2}\s*(?:er|e|eme|ème)$", re.I)
+SEPARATORS = re.compile(r"[-–'’\s]+")
+
+
+def _key(text):
+    """Lookup key: lower case, no accents, hyphens and apostrophes as spaces."""
+    key = SEPARATORS.sub(" ", normalize(text)).strip()
+    key = re.sub(r"\bst\b", "saint", key)
+    return re.sub(r"\bste\b", "sainte", key)
+
+
+def postal_departement(code):
+    """Département code of a 5-digit postal code (not checked against the list)."""
+    if code.startswith("97"):
+        return code[:3]
+    if code.startswith("20"):
+        # Corse-du-Sud 200xx-201xx, Haute-Corse 202xx-206xx
+        return "2A" if code < "20200" else "2B"
+    return code[:2]
+
+
+def _read(name):
+    with open(os.path.join(DATA_DIR, name), encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+class Gazetteer:
+    """Lookup tables built once from the bundled CSV files."""
+
+    def __init__(self):
+        self.regions = {row["code"]: row["name"] for row in _read("regions.csv")}
+        self.departements = {}
+        self.region_of = {}
+        for row in _read("departements.csv"):
+            self.departements[row["code"]] = row["name"]
+            self.region_of[row["code"]] = row["region"]
+        self.communes = {}
+        for row in _read("communes.csv"):
+            self.communes.setdefault(_key(row["name"]), (row["name"], row["departement"]))
+        self.departement_keys = {_key(name): code for code, name in self.departements.items()}
+        self.region_keys = {_key(name): code for code, name in self.regions.items()}
+        # Results by raw location string
+        self._cache = {}
+
+    def _place(self, place, code=None):
+        """(city, departement code, region code) of a place name."""
+        place = ARRONDISSEMENT.sub("", place.strip())
+        key = _key(place)
+        if not key:
+            return None, code, None
+        commune = self.communes.get(key)
+        if code is not None:
+            # The code decides; the gazetteer only fixes the spelling
+            city = commune[0] if commune is not None and commune[1] == code else place
+            return city, code, None
+        if commune is not None:
+            return commune[0], commune[1], None
+        if key in self.departement_keys:
+            return None, self.departement_keys[key], None
+        if key in self.region_keys:
+            return None, None, self.region_keys[key]
+        return None, None, None
+
+    def locate(self, location):
+        """(city, departement, region) names of a location, None when unknown."""
+        if location in self._cache:
+            return self._cache[location]
+        city = departement = region = None
+        if isinstance(location, str) and location.strip():
+            match = DEPARTEMENT_SUFFIX.match(location.strip())
+            postal = POSTAL_CODE.search(location)
+            if match and match.group("code").upper() in self.departements:
+                city, departement, region = self._place(match.group("place"), match.group("code").upper())
+            elif postal and postal_departement(postal.group("code")) in self.departements:
+                place = location[:postal.start()] + " " + location[postal.end():]
+                city, departement, region = self._place(place.strip(" -–,()"), postal_departement(postal.group("code")))
+            else:
+                city, departement, region = self._place(location)
+                if departement is None and region is None and " - " in location:
+                    # "Nantes - Paris": several places, keep the first
+                    city, departement, region = self._place(location.split(" - ")[0])
+        if departement is not None:
+            region = self.region_of[departement]
+        result = (
+            city,
+            self.departements.get(departement),
+            self.regions.get(region),
+        )
+        self._cache[location] = result
+        return result
+
+    def departement_label(self, name):
+        """'Rhône (69)' for a département name."""
+        for code, departement in self.departements.items():
+            if departement == name:
+                return f"{name} ({code})"
+        return name
+
+
+@functools.lru_cache(maxsize=None)
+def get_gazetteer():
+    return Gazetteer()
+
+
+def add_location_columns(df):
+    """Add city, departement and region categoricals derived from location.
+
+    Each distinct location is looked up once. departement and region use
+    every known name as categories, so their codes are the same in every
+    frame.
+    """
+    df = df.copy()
+    gazetteer = get_gazetteer()
+    if "location" not in df.columns:
+        df["location"] = None
+    codes, uniques = pd.factorize(df["location"])
+    located = [gazetteer.locate(value) for value in uniques.tolist()] + [(None, None, None)]
+    cities = sorted({city for city, _, _ in located if city is not None})
+    for position, column, categories in (
+        (0, "city", cities),
+        (1, "departement", list(gazetteer.departements.values())),
+        (2, "region", sorted(gazetteer.regions.values())),
+    ):
+        # Category code of each distinct location, then one take per row
+        lookup = {name: code for code, name in enumerate(categories)}
+        distinct = np.array([lookup.get(place[position], -1) for place in located], dtype=np.int32)
+        df[column] = pd.Categorical.from_codes(distinct[codes], categories=categories)
+    return df
+
+
+def backfill(store):
+    """Recompute the location columns of every offer already in the history."""
+    return store.rewrite(add_location_columns)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from jobsniffer.history import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Add city / departement / region to a history store")
+    parser.add_argument("root", help="history store folder, e.g. jobsniffer/spiders/history")
+    args = parser.parse_args()
+    print(f"{backfill(HistoryStore(args.root))} offres localisées")
@@ -0,0 +1,347 @@
+# Append-only history of scraped offers
+#
+# Replaces the all_results.csv read/concat/rewrite cycle. Each scrape is
+# written as a new Parquet segment under a hive-style layout:
+#
+#     <root>/date=2024-05-02/source=HelloWork/part-<ts>-<uuid>.parquet
+#
+# so ingest cost only depends on the size of the new batch. Reads go through
+# pyarrow.dataset, which prunes partitions and only decodes the requested
+# columns. Small segments of a partition are merged once there are enough of
+# them. Every append is also folded into the rollup kept under <root>/_rollup
+# (see rollup.py), which the dataset ignores like any "_"-prefixed path. The
+# title families of titles.py live in <root>/_titles.sqlite, the duplicate
+# index of dedup.py in <root>/_duplicates.sqlite. Writers (append with its
+# compaction and rollup fold, compact, rewrite) run one at a time.
+
+import ast
+import glob
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from .dedup import DuplicateIndex, add_duplicate_columns
+from .gazetteer import add_location_columns
+from .rollup import Rollup
+from .salary import add_salary_columns
+from .titles import TitleFamilies, add_title_family
+
+SCHEMA = pa.schema([
+    ("job_id", pa.string()),
+    ("job_title", pa.string()),
+    ("title_family", pa.string()),
+    ("company_name", pa.string()),
+    ("location", pa.string()),
+    ("city", pa.string()),
+    ("departement", pa.string()),
+    ("region", pa.string()),
+    ("contract_type", pa.string()),
+    ("contract_tag", pa.string()),
+    ("remote", pa.string()),
+    ("salary", pa.string()),
+    ("salary_numeric", pa.float64()),
+    ("salary_min", pa.float64()),
+    ("salary_max", pa.float64()),
+    ("salary_annual_eur", pa.float64()),
+    ("salary_unit", pa.string()),
+    ("publication_date", pa.string()),
+    ("job_url", pa.string()),
+    ("resume_de_loffre", pa.string()),
+    ("description", pa.string()),
+    ("qualifications", pa.list_(pa.string())),
+    ("missions", pa.string()),
+    ("profil_recherche", pa.string()),
+    ("profile", pa.string()),
+    ("dedup_cluster_id", pa.int64()),
+    ("duplicate", pa.bool_()),
+    ("scraped_at", pa.timestamp("s", tz="UTC")),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([("date", pa.string()), ("source", pa.string())]), flavor="hive"
+)
+
+
+def _string_column(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        series = series.dt.strftime("%Y-%m-%d")
+    elif pd.api.types.is_float_dtype(series) and (series.dropna() % 1 == 0).all():
+        # Ids read back from CSV come out as floats ("63423960.0")
+        series = series.astype("Int64")
+    return [None if pd.isna(v) else str(v) for v in series]
+
+
+def _list_column(series):
+    values = []
+    for v in series:
+        if isinstance(v, str):
+            try:
+                v = ast.literal_eval(v)
+            except (ValueError, SyntaxError):
+                v = [v]
+        if isinstance(v, (list, tuple)):
+            values.append([str(x) for x in v])
+        else:
+            values.append(None)
+    return values
+
+
+def to_arrow(df):
+    """Cast an offers DataFrame to the store schema.
+
+    Missing columns are filled with nulls and unknown ones are dropped.
+    """
+    arrays = []
+    for field in SCHEMA:
+        if field.name not in df.columns:
+            arrays.append(pa.nulls(len(df), type=field.type))
+            continue
+        column = df[field.name]
+        if pa.types.is_string(field.type):
+            arrays.append(pa.array(_string_column(column), type=field.type))
+        elif pa.types.is_list(field.type):
+            arrays.append(pa.array(_list_column(column), type=field.type))
+        elif pa.types.is_boolean(field.type):
+            arrays.append(pa.array([None if pd.isna(v) else bool(v) for v in column], type=field.type))
+        elif pa.types.is_timestamp(field.type):
+            column = pd.to_datetime(column, errors="coerce", utc=True).dt.floor("s")
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+        else:
+            column = pd.to_numeric(column, errors="coerce")
+            arrays.append(pa.array(column, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=SCHEMA)
+
+
+class HistoryStore:
+    """Partitioned Parquet store of every scraped offer."""
+
+    def __init__(self, root, compact_threshold=16):
+        self.root = root
+        self.compact_threshold = compact_threshold
+        # Shared by every Streamlit session through st.cache_resource: a
+        # compaction must not delete a segment another append just wrote
+        self._lock = threading.Lock()
+        self.rollup = Rollup(os.path.join(root, "_rollup"))
+        os.makedirs(root, exist_ok=True)
+        self.titles = TitleFamilies(os.path.join(root, "_titles.sqlite"))
+        self.duplicates = DuplicateIndex(os.path.join(root, "_duplicates.sqlite"))
+
+    def _partition_dir(self, date, source):
+        return os.path.join(self.root, f"date={date}", f"source={source}")
+
+    def _segments(self, partition_dir):
+        return sorted(glob.glob(os.path.join(partition_dir, "part-*.parquet")))
+
+    def segment_paths(self):
+        """Every committed segment of the store."""
+        return glob.glob(os.path.join(self.root, "date=*", "source=*", "part-*.parquet"))
+
+    def read_segments(self, paths, columns=None):
+        """Read the given segments, with their date/source partition columns."""
+        dataset = ds.dataset(list(paths), format="parquet", partitioning=PARTITIONING,
+                             partition_base_dir=self.root,
+                             schema=pa.unify_schemas([SCHEMA, PARTITIONING.schema]))
+        return dataset.to_table(columns=columns).to_pandas()
+
+    def append(self, df, scraped_at=None):
+        """Write a batch of offers as new segments, one per source.
+
+        Returns the number of rows written.
+        """
+        if df.empty:
+            return 0
+        scraped_at = scraped_at or datetime.now(timezone.utc)
+        df = df.copy()
+        if "scraped_at" not in df.columns:
+            df["scraped_at"] = scraped_at
+        if "source" not in df.columns:
+            df["source"] = "unknown"
+        date = scraped_at.strftime("%Y-%m-%d")
+        with self._lock:
+            for source, batch in df.groupby(df["source"].fillna("unknown")):
+                partition_dir = self._partition_dir(date, source)
+                os.makedirs(partition_dir, exist_ok=True)
+                name = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+                tmp_path = os.path.join(partition_dir, f"_{name}")
+                pq.write_table(to_arrow(batch), tmp_path)
+                os.replace(tmp_path, os.path.join(partition_dir, name))
+                if len(self._segments(partition_dir)) >= self.compact_threshold:
+                    self._compact_partition(partition_dir)
+            if self.rollup.exists():
+                self.rollup.add(df, day=date)
+        return len(df)
+
+    def load_rollup(self, since=None, until=None):
+        """Rollup rows (see rollup.py), built from the history on first use."""
+        with self._lock:
+            if not self.rollup.exists():
+                self.rollup.rebuild(self)
+        return self.rollup.load(since=since, until=until)
+
+    def import_csv(self, path):
+        """One-off migration of a legacy all_results.csv into the store.
+
+        The columns derived at ingest (salaries, location, title family,
+        duplicates) are computed as for a scrape, so that imported offers
+        group like the others. The CSV is renamed to ``<path>.imported`` so
+        it is not imported twice.
+        """
+        legacy = add_salary_columns(pd.read_csv(path))
+        legacy = add_location_columns(legacy)
+        legacy = add_title_family(legacy, self.titles)
+        legacy = add_duplicate_columns(legacy, self.duplicates)
+        mtime = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc)
+        self.append(legacy, scraped_at=mtime)
+        os.replace(path, f"{path}.imported")
+        return len(legacy)
+
+    def dataset(self):
+        return ds.dataset(self.root, format="parquet", partitioning=PARTITIONING,
+                          schema=pa.unify_schemas([SCHEMA, PARTITIONING.schema]))
+
+    def load(self, columns=None, sources=None, since=None, until=None):
+        """Read offers as a DataFrame.
+
+        ``sources`` and the ``since``/``until`` dates (YYYY-MM-DD, inclusive)
+        are pushed down to partition pruning, and only ``columns`` are decoded.
+        """
+        expression = None
+        if sources is not None:
+            expression = ds.field("source").isin(list(sources))
+        if since is not None:
+            cond = ds.field("date") >= str(since)
+            expression = cond if expression is None else expression & cond
+        if until is not None:
+            cond = ds.field("date") <= str(until)
+            expression = cond if expression is None else expression & cond
+        table = self.dataset().to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+    def _replace_segments(self, partition_dir, segments, table):
+        name = f"part-{time.time_ns()}-compacted.parquet"
+        tmp_path = os.path.join(partition_dir, f"_{name}")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(partition_dir, name))
+        for path in segments:
+            os.remove(path)
+
+    def _compact_partition(self, partition_dir):
+        segments = self._segments(partition_dir)
+        if len(segments) < 2:
+            return
+        # Older segments may predate some columns, the dataset fills them with nulls
+        table = ds.dataset(segments, format="parquet", schema=SCHEMA).to_table()
+        self._replace_segments(partition_dir, segments, table)
+
+    def rewrite(self, transform):
+        """Apply ``transform`` (DataFrame -> DataFrame) to every partition.
+
+        Used to backfill derived columns over the whole history; each
+        partition ends up compacted into a single segment. Partitions are
+        visited oldest day first. Returns the number of rows rewritten.
+        """
+        rows = 0
+        with self._lock:
+            for partition_dir in sorted(glob.glob(os.path.join(self.root, "date=*", "source=*"))):
+                segments = self._segments(partition_dir)
+                if not segments:
+                    continue
+                df = ds.dataset(segments, format="parquet", schema=SCHEMA).to_table().to_pandas()
+                table = to_arrow(transform(df))
+                self._replace_segments(partition_dir, segments, table)
+                rows += table.num_rows
+            if self.rollup.exists():
+                self.rollup.rebuild(self)
+        return rows
+
+    def compact(self):
+        """Merge the segments of every partition into a single file."""
+        with self._lock:
+            for partition_dir in glob.glob(os.path.join(self.root, "date=*", "source=*")):
+                self._compact_partition(partition_dir)
+
+
+def _partition_of(path):
+    partition_dir = os.path.dirname(path)
+    source = os.path.basename(partition_dir)[len("source="):]
+    date = os.path.basename(os.path.dirname(partition_dir))[len("date="):]
+    return date, source
+
+
+class HistoryCache:
+    """In-memory copy of some history columns, kept in sync incrementally.
+
+    ``refresh()`` only decodes the segments written since the previous call.
+    Partitions whose segments were replaced (compaction, ``rewrite``) are
+    reloaded on their own. String columns are kept as categoricals to bound
+    memory, and ``version`` changes whenever the frame does, so that derived
+    results can be cached on it.
+    """
+
+    def __init__(self, store, columns=None):
+        self.store = store
+        self.columns = columns
+        self.frame = pd.DataFrame()
+        self.segments = set()
+        self.version = 0
+        # Shared by every Streamlit session through st.cache_resource
+        self._lock = threading.Lock()
+
+    def _read_columns(self):
+        if self.columns is None:
+            return None
+        return [c for c in self.columns if c not in ("date", "source")] + ["date", "source"]
+
+    def refresh(self):
+        """Bring the frame up to date with the store and return it."""
+        # The store's lock keeps a compaction from deleting a listed segment
+        # before it is read
+        with self._lock, self.store._lock:
+            current = set(self.store.segment_paths())
+            new = current - self.segments
+            gone = self.segments - current
+            if not new and not gone:
+                return self.frame
+            frame = self.frame
+            if gone:
+                stale = {_partition_of(path) for path in gone}
+                if not frame.empty:
+                    drop = pd.Series(False, index=frame.index)
+                    for date, source in stale:
+                        drop |= (frame["date"] == date) & (frame["source"] == source)
+                    frame = frame[~drop]
+                new |= {path for path in current if _partition_of(path) in stale}
+            added = self.store.read_segments(sorted(new), columns=self._read_columns())
+            self.frame = self._concat(frame, added)
+            self.segments = current
+            self.version += 1
+            return self.frame
+
+    @staticmethod
+    def _concat(frame, added):
+        added = added.reset_index(drop=True)
+        for column in added.columns:
+            dtype = added[column].dtype
+            if column != "qualifications" and (dtype == object or pd.api.types.is_string_dtype(dtype)):
+                added[column] = added[column].astype("category")
+        if frame.empty:
+            return added
+        if added.empty:
+            return frame.reset_index(drop=True)
+        merged = {}
+        for column in frame.columns:
+            if isinstance(frame[column].dtype, pd.CategoricalDtype):
+                # Keeps the existing codes, only the new rows are encoded
+                merged[column] = pd.api.types.union_categoricals(
+                    [frame[column], added[column].astype("category")], ignore_order=True)
+            else:
+                merged[column] = pd.concat([frame[column], added[column]], ignore_index=True)
+        return pd.DataFrame(merged)
+
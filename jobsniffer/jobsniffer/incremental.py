@@ -0,0 +1,202 @@
+# Incremental crawls for saved searches
+#
+# A search refreshed several times a day mostly walks pages of offers it
+# already knows. In incremental mode the spiders stop paginating once
+# INCREMENTAL_STOP_PAGES consecutive listing pages bring no unseen offer,
+# and a delta summary (new / updated / disappeared) is written to the stats.
+# Each saved search keeps a high-water mark: the largest numeric job_id and
+# the newest publication date seen. An offer without job_id (WTTJ) published
+# before the previous run's date mark does not keep the pagination going,
+# even when the index does not know its URL.
+# A crawl with a JOBDIR keeps this bookkeeping in the spider state, so that
+# a resumed crawl sums up the whole run, not only its last part.
+
+import re
+import time
+from datetime import date, datetime, timedelta
+
+from scrapy import signals
+
+from .seen import SeenOfferIndex
+
+
+RELATIVE_DATE = re.compile(r"il y a (\d+) (minute|heure|jour|semaine|mois)")
+DAYS_PER_UNIT = {"minute": 0, "heure": 0, "jour": 1, "semaine": 7, "mois": 30}
+DAY_MONTH_YEAR = re.compile(r"(\d{1,2})/(\d{1,2})/(\d{4})")
+
+
+def is_true(value):
+    """Spider arguments arrive as strings from `scrapy crawl -a`."""
+    return str(value).strip().lower() in ("1", "true", "yes", "oui")
+
+
+def publication_day(value, today=None):
+    """ISO day of a publication date as the boards show it, or None.
+
+    Reads ISO timestamps ("2024-05-02T08:00:00Z"), "02/05/2024" and the
+    relative dates of the listings ("il y a 3 jours", "hier").
+    """
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip().lower()
+    today = today or date.today()
+    try:
+        return datetime.fromisoformat(text.upper()).date().isoformat()
+    except ValueError:
+        pass
+    match = DAY_MONTH_YEAR.search(text)
+    if match:
+        day, month, year = map(int, match.groups())
+        try:
+            return date(year, month, day).isoformat()
+        except ValueError:
+            return None
+    if "aujourd" in text or "instant" in text:
+        return today.isoformat()
+    if "hier" in text:
+        return (today - timedelta(days=1)).isoformat()
+    match = RELATIVE_DATE.search(text)
+    if match:
+        return (today - timedelta(days=int(match.group(1)) * DAYS_PER_UNIT[match.group(2)])).isoformat()
+    return None
+
+
+class IncrementalCrawl:
+    """Bookkeeping of one incremental run of a saved search."""
+
+    def __init__(self, index, query, stop_after=2):
+        self.index = index
+        self.query = query
+        self.stop_after = stop_after
+        self.run = time.time()
+        state = index.query_state(query)
+        self.high_water_id = state["high_water_id"] if state else None
+        self.high_water_date = state["high_water_date"] if state else None
+        # Mark of the previous run, that offers without job_id are compared with
+        self.previous_date = self.high_water_date
+        self.previous = index.query_offers(query)
+        self.current = set()
+        self.new = 0
+        self.updated = 0
+        self.pages_without_new = 0
+        self.stopped_early = False
+
+    # Bookkeeping carried over to a resumed crawl
+    RESUMED = ("run", "high_water_id", "high_water_date", "previous_date", "current", "new", "updated",
+               "pages_without_new", "stopped_early")
+
+    def snapshot(self):
+        return {name: getattr(self, name) for name in self.RESUMED}
+
+    def restore(self, saved):
+        for name in self.RESUMED:
+            # States saved before the publication date mark lack it
+            if name in saved:
+                setattr(self, name, saved[name])
+
+    def offer(self, job_id, job_url, listing, known):
+        """Record an offer found on a listing page, return True if unseen.
+
+        An offer without job_id published before the previous run's date
+        mark returns False: it was already listed then, maybe under another
+        URL.
+        """
+        key = self.index.offer_key(job_id, job_url)
+        self.current.add(key)
+        if job_id and str(job_id).isdigit():
+            if self.high_water_id is None or int(job_id) > int(self.high_water_id):
+                self.high_water_id = str(job_id)
+        published = publication_day(listing.get("publication_date") or (known or {}).get("publication_date"))
+        if published is not None and (self.high_water_date is None or published > self.high_water_date):
+            self.high_water_date = published
+        if known is None:
+            self.new += 1
+            listed_before = (not job_id and published is not None and self.previous_date is not None
+                             and published < self.previous_date)
+            return not listed_before
+        if any(known.get(field) != value for field, value in listing.items()):
+            self.updated += 1
+        return False
+
+    def page_done(self, new_offers):
+        """Return True if the next listing page is worth fetching."""
+        self.pages_without_new = 0 if new_offers else self.pages_without_new + 1
+        if self.pages_without_new >= self.stop_after:
+            self.stopped_early = True
+            return False
+        return True
+
+    def close(self, complete=True):
+        """Persist the query state and return the delta summary.
+
+        Offers only count as disappeared when every listing page was walked,
+        otherwise they may simply sit on a page we did not fetch.
+        """
+        walked_everything = complete and not self.stopped_early
+        summary = {
+            "new": self.new,
+            "updated": self.updated,
+            "disappeared": len(self.previous - self.current) if walked_everything else None,
+            "stopped_early": self.stopped_early,
+            "high_water_id": self.high_water_id,
+            "high_water_date": self.high_water_date,
+        }
+        self.index.save_query(self.query, self.high_water_id, self.run, self.current,
+                              summary, replace=walked_everything, high_water_date=self.high_water_date)
+        return summary
+
+
+class SeenOffersMixin:
+    """Opens the seen-offer index (and incremental state) for a spider.
+
+    Spiders set ``incremental_requested`` in ``__init__`` and consult
+    ``self.seen_offers`` / ``self.incremental`` while parsing.
+    """
+
+    seen_offers = None
+    incremental = None
+    incremental_requested = False
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        path = crawler.settings.get("SEEN_OFFERS_DB")
+        if path:
+            spider.seen_offers = SeenOfferIndex(path)
+            if spider.incremental_requested:
+                query = f"{spider.name}|{str(spider.job_title).strip().lower()}|{str(spider.location).strip().lower()}"
+                spider.incremental = IncrementalCrawl(
+                    spider.seen_offers, query, crawler.settings.getint("INCREMENTAL_STOP_PAGES", 2)
+                )
+            crawler.signals.connect(spider.close_seen_offers, signal=signals.spider_closed)
+            crawler.signals.connect(spider.commit_seen_offers, signal=signals.spider_idle)
+            # spider.state is loaded once spider_opened has run (JOBDIR only)
+            crawler.signals.connect(spider.resume_incremental, signal=signals.engine_started)
+        elif spider.incremental_requested:
+            spider.logger.warning("Incremental mode needs SEEN_OFFERS_DB, running a full crawl")
+        return spider
+
+    def resume_incremental(self):
+        saved = getattr(self, "state", {}).get("incremental")
+        if self.incremental is not None and saved is not None:
+            self.incremental.restore(saved)
+            self.logger.info("Incremental crawl of %s resumed", self.incremental.query)
+
+    def commit_seen_offers(self, spider):
+        # Write the offers buffered while the spider waited on downloads
+        self.seen_offers.commit()
+
+    def close_seen_offers(self, spider, reason):
+        if self.incremental is not None:
+            # Before the SpiderState extension writes the state on close
+            if hasattr(self, "state"):
+                if reason == "finished":
+                    self.state.pop("incremental", None)
+                else:
+                    self.state["incremental"] = self.incremental.snapshot()
+            summary = self.incremental.close(complete=reason == "finished")
+            for key, value in summary.items():
+                if value is not None:
+                    self.crawler.stats.set_value(f"incremental/{key}", value)
+            self.logger.info("Incremental delta for %s: %s", self.incremental.query, summary)
+        self.seen_offers.close()
@@ -1,16 +1,66 @@
-import scrapy
-
-class JobListingItem(scrapy.Item):
-    job_title = scrapy.Field()
-    job_id = scrapy.Field()
-    contract_type = scrapy.Field()
-    contract_tag = scrapy.Field()
-    salary = scrapy.Field()
-    company_name = scrapy.Field()
-    location = scrapy.Field()
-    publication_date = scrapy.Field()
-    job_url = scrapy.Field()
-    resume_de_loffre = scrapy.Field()
-    qualifications = scrapy.Field()
-    missions = scrapy.Field()
-    profil_recherche = scrapy.Field()
+# Item model shared by the spiders
+#
+# A slotted dataclass rather than a dict-backed scrapy.Item: one fixed-size
+# object per offer, no per-instance __dict__, and attribute access while the
+# item is assembled. Scrapy, the feed exports and the runner handle it
+# through itemadapter like any other item type. The listing fields are put in
+# a JobListing on the listing page and travel to the detail callback through
+# cb_kwargs, which the detail page completes in place.
+#
+# Listing values repeat across offers ("CDI", "Paris - 75", "il y a 2
+# jours") but every parsed page makes new string objects of them: they are
+# interned, so that thousands of queued offers share one copy of each.
+
+import sys
+from dataclasses import dataclass, fields
+from typing import List, Optional
+
+# Listing fields with few distinct values
+INTERNED = ("contract_type", "contract_tag", "remote", "salary", "company_name", "location", "publication_date")
+
+
+@dataclass(slots=True)
+class JobListing:
+    job_title: Optional[str] = None
+    job_id: Optional[str] = None
+    contract_type: Optional[str] = None
+    contract_tag: Optional[str] = None
+    remote: Optional[str] = None
+    salary: Optional[str] = None
+    company_name: Optional[str] = None
+    location: Optional[str] = None
+    publication_date: Optional[str] = None
+    job_url: Optional[str] = None
+    resume_de_loffre: Optional[str] = None
+    description: Optional[str] = None
+    qualifications: Optional[List[str]] = None
+    missions: Optional[str] = None
+    profil_recherche: Optional[str] = None
+    profile: Optional[str] = None
+
+    def __post_init__(self):
+        self._intern(INTERNED)
+
+    def _intern(self, names):
+        for name in names:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build an item from a dict, ignoring keys that are not fields."""
+        return cls(**{name: data[name] for name in FIELDS if name in data})
+
+    def update(self, data):
+        """Set the fields present in ``data``, e.g. the detail page fields.
+
+        Keys that are not fields are ignored, as in from_dict.
+        """
+        names = [name for name in FIELDS if name in data]
+        for name in names:
+            setattr(self, name, data[name])
+        self._intern([name for name in names if name in INTERNED])
+
+
+FIELDS = tuple(field.name for field in fields(JobListing))
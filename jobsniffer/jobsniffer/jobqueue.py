@@ -0,0 +1,498 @@
+# Shared crawl job queue
+#
+# Sessions of the app no longer run their crawls themselves: they add jobs to
+# a SQLite queue and poll it. A fixed-size CrawlWorkerPool claims the jobs
+# and runs them on a CrawlService, so the number of crawls running at once
+# is set by JOB_QUEUE_WORKERS, not by the number of open browser tabs. The
+# next job goes to the user with the fewest running jobs, then to the one
+# served least recently, so one user queuing many searches does not starve
+# the others. Items reach the sessions through each job's JSON Lines feed
+# (see feed.py); status, progress, metrics and final stats through the queue.
+#
+# The queue is also a result cache. A search identical to one still queued
+# or running (same spider and normalized arguments) joins that job instead
+# of starting a crawl (single flight). One that finished less than cache_ttl
+# seconds ago is answered from its feed. At most cache_size finished jobs
+# are kept reusable, least recently used first out. Every search following
+# a job is a subscription: cancelling detaches that search only (the job
+# reads as cancelled for its user), and the crawl is stopped once no search
+# follows it any more.
+#
+# With a state_dir, each job crawls with its own Scrapy JOBDIR: its pending
+# requests wait in disk queues, and a job cancelled or interrupted by the
+# shutdown of its worker can be resumed. It is queued again under the same
+# id, continues the same feed and only fetches what the first run had not.
+# State folders are deleted once their job is done.
+#
+# The app starts a pool in its own process. Pools in other processes can
+# serve the same queue (claims are atomic):
+#
+#     python -m jobsniffer.jobqueue --db jobsniffer/spiders/jobs.sqlite --workers 4
+#
+# --resume first queues again the jobs interrupted when a worker stopped.
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from .search import normalize
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_JSON_COLUMNS = ("kwargs", "metrics", "stats")
+# Columns added after the first version of the table
+_ADDED_COLUMNS = {"cache_key": "TEXT", "shared": "INTEGER NOT NULL DEFAULT 0", "last_used": "REAL",
+                  "state_dir": "TEXT"}
+# Error of the jobs stopped with their worker, which --resume queues again
+INTERRUPTED = "interrupted"
+
+
+def cache_key(spider, **spider_kwargs):
+    """Same key for searches that only differ in case, accents or spacing."""
+    normalized = {}
+    for name, value in spider_kwargs.items():
+        if isinstance(value, str):
+            value = " ".join(normalize(value).split())
+        normalized[name] = value
+    return json.dumps([spider, normalized], sort_keys=True)
+
+
+class JobQueue:
+    """Crawl jobs stored in SQLite, shared by threads and processes."""
+
+    def __init__(self, path, feed_dir="feeds", stale_after=120, cache_ttl=0, cache_size=64, feed_retention=3600,
+                 state_dir=None):
+        self.path = path
+        self.feed_dir = os.path.abspath(feed_dir)
+        # Folder of the jobs' crawl states, None for in-memory crawls
+        self.state_dir = os.path.abspath(state_dir) if state_dir else None
+        # A running job whose worker has not reported for this long is failed
+        self.stale_after = stale_after
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        # Feeds of jobs out of the cache are deleted after this many seconds
+        self.feed_retention = feed_retention
+        with closing(self._connect()) as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " user TEXT NOT NULL,"
+                " spider TEXT NOT NULL,"
+                " kwargs TEXT NOT NULL,"
+                " feed TEXT,"
+                " status TEXT NOT NULL,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+                " worker TEXT,"
+                " progress REAL NOT NULL DEFAULT 0,"
+                " items INTEGER NOT NULL DEFAULT 0,"
+                " metrics TEXT,"
+                " stats TEXT,"
+                " error TEXT,"
+                " created_at REAL NOT NULL,"
+                " started_at REAL,"
+                " updated_at REAL,"
+                " finished_at REAL)"
+            )
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            for column, definition in _ADDED_COLUMNS.items():
+                if column not in columns:
+                    db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_status_user ON jobs (status, user)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_cache_key ON jobs (cache_key)")
+            # Searches following each job; shared only counts cache hits
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                " job_id INTEGER NOT NULL,"
+                " user TEXT NOT NULL,"
+                " cancelled_at REAL,"
+                " PRIMARY KEY (job_id, user))"
+            )
+
+    def _connect(self):
+        # One short-lived connection per call: safe from any thread, and
+        # autocommit except inside the explicit transaction of claim()
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        return db
+
+    @staticmethod
+    def _as_dict(row):
+        if row is None:
+            return None
+        job = dict(row)
+        for column in _JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else {}
+        return job
+
+    def submit(self, user, spider, **spider_kwargs):
+        """Queue a crawl of ``spider`` for ``user`` and return its job id.
+
+        The id is the one of an identical job when the cache can answer:
+        its ``user`` is then not ``user``.
+        """
+        key = cache_key(spider, **spider_kwargs)
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                self._evict(db, now)
+                row = db.execute(
+                    "SELECT id FROM jobs WHERE cache_key = ? AND (status IN (?, ?) OR finished_at >= ?)"
+                    " ORDER BY id DESC LIMIT 1",
+                    (key, QUEUED, RUNNING, now - self.cache_ttl),
+                ).fetchone()
+                if row is not None:
+                    job_id = row["id"]
+                    db.execute("UPDATE jobs SET shared = shared + 1, last_used = ? WHERE id = ?", (now, job_id))
+                else:
+                    cursor = db.execute(
+                        "INSERT INTO jobs (user, spider, kwargs, status, cache_key, created_at, last_used)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (user, spider, json.dumps(spider_kwargs), QUEUED, key, now, now),
+                    )
+                    job_id = cursor.lastrowid
+                    feed = os.path.join(self.feed_dir, f"{spider}-{job_id}.jsonl")
+                    state = os.path.join(self.state_dir, f"{spider}-{job_id}") if self.state_dir else None
+                    db.execute("UPDATE jobs SET feed = ?, state_dir = ? WHERE id = ?", (feed, state, job_id))
+                # Searching again follows the job again, even after a cancel
+                db.execute(
+                    "INSERT INTO subscriptions (job_id, user) VALUES (?, ?)"
+                    " ON CONFLICT(job_id, user) DO UPDATE SET cancelled_at = NULL",
+                    (job_id, user),
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def _evict(self, db, now):
+        """Drop expired and least recently used results from the cache."""
+        # Failed and cancelled jobs are never reused
+        db.execute("UPDATE jobs SET cache_key = NULL WHERE cache_key IS NOT NULL AND status IN (?, ?)",
+                   (FAILED, CANCELLED))
+        db.execute("UPDATE jobs SET cache_key = NULL WHERE cache_key IS NOT NULL AND status = ? AND finished_at < ?",
+                   (DONE, now - self.cache_ttl))
+        db.execute(
+            "UPDATE jobs SET cache_key = NULL WHERE id IN (SELECT id FROM jobs WHERE cache_key IS NOT NULL"
+            " AND status = ? ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (DONE, self.cache_size),
+        )
+        old = db.execute(
+            "SELECT id, feed, state_dir FROM jobs WHERE cache_key IS NULL AND feed IS NOT NULL AND finished_at < ?",
+            (now - self.feed_retention,),
+        ).fetchall()
+        for row in old:
+            if os.path.exists(row["feed"]):
+                os.remove(row["feed"])
+            # Without its feed, a job is no longer worth resuming
+            if row["state_dir"]:
+                shutil.rmtree(row["state_dir"], ignore_errors=True)
+        db.executemany("UPDATE jobs SET feed = NULL, state_dir = NULL WHERE id = ?", [(row["id"],) for row in old])
+        db.executemany("DELETE FROM subscriptions WHERE job_id = ?", [(row["id"],) for row in old])
+
+    def cache_stats(self):
+        """Searches answered without a crawl of their own, and crawl time saved."""
+        with closing(self._connect()) as db:
+            row = db.execute(
+                "SELECT COUNT(*) AS crawls, COALESCE(SUM(shared), 0) AS hits,"
+                " COALESCE(SUM(CASE WHEN status = ? THEN shared * (finished_at - started_at) END), 0) AS saved"
+                " FROM jobs",
+                (DONE,),
+            ).fetchone()
+        requests = row["crawls"] + row["hits"]
+        return {
+            "requests": requests,
+            "hits": row["hits"],
+            "hit_rate": row["hits"] / requests if requests else 0.0,
+            "saved_seconds": row["saved"],
+        }
+
+    def get(self, job_id, user=None):
+        """The job, as ``user`` sees it when given.
+
+        A job that ``user`` cancelled while other searches still follow it
+        keeps running, but reads as cancelled (at the time of the cancel).
+        """
+        with closing(self._connect()) as db:
+            job = self._as_dict(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+            if job is None or user is None:
+                return job
+            row = db.execute("SELECT cancelled_at FROM subscriptions WHERE job_id = ? AND user = ?",
+                             (job_id, user)).fetchone()
+        if row is not None and row["cancelled_at"] is not None and not job["cancel_requested"] \
+                and job["status"] != CANCELLED:
+            job["status"] = CANCELLED
+            job["finished_at"] = row["cancelled_at"]
+        return job
+
+    def jobs(self, user=None, statuses=None):
+        """Jobs of ``user`` (or of everyone), oldest first."""
+        query, params = "SELECT * FROM jobs WHERE 1", []
+        if user is not None:
+            query += " AND user = ?"
+            params.append(user)
+        if statuses:
+            query += f" AND status IN ({', '.join('?' * len(statuses))})"
+            params.extend(statuses)
+        with closing(self._connect()) as db:
+            return [self._as_dict(row) for row in db.execute(query + " ORDER BY id", params)]
+
+    def counts(self):
+        """Number of jobs by status."""
+        with closing(self._connect()) as db:
+            return dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    @staticmethod
+    def resumable(job):
+        """True for a stopped job whose crawl state was saved on disk."""
+        # Scrapy writes spider.state when the crawl closes: a worker killed
+        # outright leaves no consistent state to resume from
+        return (job["status"] in (FAILED, CANCELLED) and bool(job["feed"]) and bool(job["state_dir"])
+                and os.path.exists(os.path.join(job["state_dir"], "spider.state")))
+
+    def resume(self, job_id, user=None):
+        """Queue a stopped job again, to continue its crawl; False if it cannot be.
+
+        ``user``, when given, follows the job again.
+        """
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                job = self._as_dict(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+                resumed = job is not None and self.resumable(job)
+                if resumed:
+                    db.execute(
+                        "UPDATE jobs SET status = ?, cancel_requested = 0, worker = NULL, progress = 0, error = NULL,"
+                        " finished_at = NULL, cache_key = ?, last_used = ? WHERE id = ?",
+                        (QUEUED, cache_key(job["spider"], **job["kwargs"]), now, job_id),
+                    )
+                    if user is not None:
+                        db.execute("UPDATE subscriptions SET cancelled_at = NULL WHERE job_id = ? AND user = ?",
+                                   (job_id, user))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return resumed
+
+    def interrupted(self):
+        """Ids of the resumable jobs stopped with their worker."""
+        return [job["id"] for job in self.jobs(statuses=[FAILED])
+                if job["error"] == INTERRUPTED and self.resumable(job)]
+
+    def cancel(self, job_id, user=None):
+        """Cancel a job: at once if still queued, by its worker if running.
+
+        With ``user``, only that user's search is detached from the job,
+        which keeps running while identical searches still follow it.
+        """
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                if user is not None:
+                    db.execute("UPDATE subscriptions SET cancelled_at = ?"
+                               " WHERE job_id = ? AND user = ? AND cancelled_at IS NULL", (now, job_id, user))
+                    following = db.execute("SELECT COUNT(*) FROM subscriptions WHERE job_id = ? AND cancelled_at IS NULL",
+                                           (job_id,)).fetchone()[0]
+                if user is None or not following:
+                    db.execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                               (CANCELLED, now, job_id, QUEUED))
+                    db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def claim(self, worker):
+        """Mark the next job to run as running for ``worker`` and return it."""
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                db.execute(
+                    "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status = ? AND updated_at < ?",
+                    (FAILED, "worker lost", now, RUNNING, now - self.stale_after),
+                )
+                # Fair share: fewest running jobs first, then the user whose
+                # last job started longest ago, then the oldest job
+                row = db.execute(
+                    "SELECT id FROM jobs AS j WHERE status = ? ORDER BY"
+                    " (SELECT COUNT(*) FROM jobs WHERE user = j.user AND status = ?),"
+                    " COALESCE((SELECT MAX(started_at) FROM jobs WHERE user = j.user), 0),"
+                    " id LIMIT 1",
+                    (QUEUED, RUNNING),
+                ).fetchone()
+                if row is None:
+                    db.execute("COMMIT")
+                    return None
+                db.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, started_at = ?, updated_at = ? WHERE id = ?",
+                    (RUNNING, worker, now, now, row["id"]),
+                )
+                job = self._as_dict(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return job
+
+    def cancel_requested(self, job_ids):
+        """Ids among ``job_ids`` whose cancellation was asked for."""
+        if not job_ids:
+            return set()
+        with closing(self._connect()) as db:
+            rows = db.execute(
+                f"SELECT id FROM jobs WHERE cancel_requested = 1 AND id IN ({', '.join('?' * len(job_ids))})",
+                list(job_ids),
+            )
+            return {row["id"] for row in rows}
+
+    def update(self, job_id, progress, items, metrics=None):
+        """Progress report of a running job; also its worker's heartbeat."""
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET progress = ?, items = ?, metrics = ?, updated_at = ? WHERE id = ?",
+                (progress, items, json.dumps(metrics or {}), time.time(), job_id),
+            )
+
+    def finish(self, job_id, status, items, stats=None, metrics=None, error=None):
+        now = time.time()
+        with closing(self._connect()) as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, progress = 1, items = ?, stats = ?, metrics = ?, error = ?,"
+                " updated_at = ?, finished_at = ? WHERE id = ?",
+                (status, items, json.dumps(stats or {}, default=str), json.dumps(metrics or {}),
+                 error, now, now, job_id),
+            )
+
+
+class CrawlWorkerPool:
+    """Runs the jobs of a JobQueue on a CrawlService, ``workers`` at a time.
+
+    A background thread claims jobs while a worker slot is free, reports
+    the progress of running jobs and stops those whose cancellation was
+    requested.
+    """
+
+    def __init__(self, queue, service, workers=2, poll_interval=0.5, name=None):
+        self.queue = queue
+        self.service = service
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.running = {}
+        # Items of the previous runs of resumed jobs, in their feeds already
+        self._items_before = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="jobsniffer-workers", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception:
+                logger.exception("Crawl worker pool error")
+            self._stop.wait(self.poll_interval)
+
+    def tick(self):
+        """One round: report, reap and cancel running jobs, then start new ones."""
+        self.reap()
+        while len(self.running) < self.workers:
+            row = self.queue.claim(self.name)
+            if row is None:
+                break
+            kwargs = dict(row["kwargs"])
+            self._items_before[row["id"]] = row["items"]
+            self.running[row["id"]] = self.service.submit(
+                row["spider"], kwargs.pop("job_title"), kwargs.pop("location"), kwargs.pop("max_pages"),
+                jobdir=row["state_dir"], stream_feed=row["feed"], **kwargs,
+            )
+
+    def reap(self):
+        """Report running jobs, record the finished ones, cancel as requested."""
+        cancelled = self.queue.cancel_requested(list(self.running))
+        for job_id, job in list(self.running.items()):
+            if job_id in cancelled and not job.done():
+                self.service.cancel(job)
+            if job.done():
+                self._finish(job_id, job)
+            else:
+                self.queue.update(job_id, job.progress, self._items_before[job_id] + len(job.items), job.metrics)
+
+    def _finish(self, job_id, job):
+        del self.running[job_id]
+        items = self._items_before.pop(job_id) + len(job.items)
+        try:
+            job.result()
+        except Exception:
+            status, error = FAILED, "\n".join(job.errors)
+        else:
+            if job.cancelled:
+                status, error = CANCELLED, None
+            elif job.stats.get("finish_reason") == "shutdown":
+                # Stopped with the CrawlService, not by a user
+                status, error = FAILED, INTERRUPTED
+            else:
+                status, error = DONE, None
+        if status == DONE and job.jobdir:
+            shutil.rmtree(job.jobdir, ignore_errors=True)
+        self.queue.finish(job_id, status, items, stats=job.stats, metrics=job.metrics, error=error)
+
+    def stop(self):
+        """Stop claiming jobs; running crawls are left to the CrawlService."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main():
+    from .runner import CrawlService
+
+    parser = argparse.ArgumentParser(description="Serve the crawl job queue with a pool of workers")
+    parser.add_argument("--db", default="jobs.sqlite")
+    parser.add_argument("--feeds", default="feeds")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--state", default="crawl_state", help="folder of the crawl states, '' to crawl in memory")
+    parser.add_argument("--resume", action="store_true", help="queue again the jobs interrupted by a worker shutdown")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    queue = JobQueue(args.db, feed_dir=args.feeds, state_dir=args.state or None)
+    if args.resume:
+        resumed = [job_id for job_id in queue.interrupted() if queue.resume(job_id)]
+        logger.info("Resuming %d interrupted jobs: %s", len(resumed), resumed)
+    service = CrawlService()
+    pool = CrawlWorkerPool(queue, service, workers=args.workers)
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        # Running crawls close their state on disk: --resume continues them
+        pool.stop()
+        service.stop()
+        pool.reap()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# Live crawl metrics
+#
+# Gathers, per crawl, download latency histograms by callback, the CPU time
+# spent in each callback (measured by JobsnifferSpiderMiddleware), bytes
+# downloaded, scheduler queue depth, items/s and dropped or duplicate counts.
+# A snapshot is refreshed on the reactor thread every METRICS_INTERVAL
+# seconds; it is written to METRICS_FILE as JSON while the crawl runs, served
+# in the Prometheus text format on METRICS_PORT and exposed to the app as
+# CrawlJob.metrics.
+#
+# Several crawls of the same spider may run at once in the app process, so
+# snapshots are keyed on a crawl id: the JOBDIR folder name of a queued job
+# ("hellowork-12"), else the spider name, process id and a counter. It is
+# the %(job)s placeholder of METRICS_FILE and the job label of the
+# Prometheus series, which are both dropped once the crawl has closed.
+
+import bisect
+import itertools
+import json
+import logging
+import os
+import time
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.job import job_dir
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Last snapshot of each running crawl, by crawl id, for the Prometheus endpoint
+_snapshots = {}
+_endpoint = None
+_crawl_ids = itertools.count(1)
+
+
+def callback_name(request):
+    return getattr(request.callback, "__name__", None) or "parse"
+
+
+def engine_scheduler(engine):
+    """Scheduler of a running engine (Scrapy 2.13 renamed engine.slot to _slot)."""
+    slot = getattr(engine, "_slot", None) or engine.slot
+    return slot.scheduler
+
+
+class LatencyHistogram:
+    """Fixed-bucket histogram, cumulative like Prometheus histograms."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def as_dict(self):
+        p50, p99 = self.quantile(0.5), self.quantile(0.99)
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip([*map(str, self.buckets), "+Inf"], self.counts):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {
+            "buckets": buckets,
+            "sum": self.sum,
+            "count": self.count,
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+
+class CrawlMetrics:
+    """Scrapy extension collecting the metrics of one crawl."""
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.interval = settings.getfloat("METRICS_INTERVAL", 1.0)
+        self.path = settings.get("METRICS_FILE")
+        self.port = settings.getint("METRICS_PORT", 0)
+        self.host = settings.get("METRICS_HOST", "127.0.0.1")
+        self.latency = {}
+        self.items = 0
+        self.duplicates = 0
+        self.keys = set()
+        self.queue_max = 0
+        self.started_at = None
+        self.loop = None
+        self.latest = {}
+        self.job = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED", True):
+            raise NotConfigured
+        ext = cls(crawler)
+        crawler.metrics = ext
+        crawler.signals.connect(ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(ext.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(ext.response_received, signal=signals.response_received)
+        crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
+        return ext
+
+    def spider_opened(self, spider):
+        from twisted.internet import task
+
+        self.started_at = time.perf_counter()
+        self.spider = spider
+        jobdir = job_dir(self.crawler.settings)
+        if jobdir:
+            self.job = os.path.basename(os.path.normpath(jobdir))
+        else:
+            self.job = f"{spider.name}-{os.getpid()}-{next(_crawl_ids)}"
+        if self.port:
+            start_endpoint(self.host, self.port)
+        self.loop = task.LoopingCall(self.refresh)
+        self.loop.start(self.interval, now=True)
+
+    def response_received(self, response, request, spider):
+        latency = request.meta.get("download_latency")
+        if latency is None:
+            return
+        name = callback_name(request)
+        histogram = self.latency.get(name)
+        if histogram is None:
+            histogram = self.latency[name] = LatencyHistogram()
+        histogram.observe(latency)
+
+    def item_scraped(self, item, response, spider):
+        self.items += 1
+        # JobListing is a slotted dataclass, not a dict
+        adapter = ItemAdapter(item)
+        key = adapter.get("job_id") or adapter.get("job_url")
+        if key:
+            if key in self.keys:
+                self.duplicates += 1
+            self.keys.add(key)
+
+    def _queue_depth(self):
+        try:
+            return len(engine_scheduler(self.crawler.engine))
+        except (AttributeError, TypeError):
+            return 0
+
+    def refresh(self):
+        """Rebuild the snapshot; runs on the reactor thread."""
+        stats = self.stats.get_stats()
+        elapsed = time.perf_counter() - self.started_at
+        queue_depth = self._queue_depth()
+        self.queue_max = max(self.queue_max, queue_depth)
+        names = set(self.latency) | {key.split("/")[1] for key in stats if key.startswith("callback/")}
+        callbacks = {}
+        for name in sorted(names):
+            histogram = self.latency.get(name) or LatencyHistogram()
+            calls = stats.get(f"callback/{name}/calls", 0)
+            cpu = stats.get(f"callback/{name}/cpu_seconds", 0.0)
+            callbacks[name] = {
+                "calls": calls,
+                "cpu_seconds": round(cpu, 4),
+                "cpu_ms_per_call": round(cpu / calls * 1000, 2) if calls else None,
+                "latency": histogram.as_dict(),
+            }
+        snapshot = {
+            "spider": self.spider.name,
+            "job": self.job,
+            "elapsed_s": round(elapsed, 2),
+            "items": self.items,
+            "items_per_s": round(self.items / elapsed, 2) if elapsed else 0.0,
+            "requests": stats.get("downloader/request_count", 0),
+            "responses": stats.get("response_received_count", 0),
+            "bytes_downloaded": stats.get("downloader/response_bytes", 0),
+            "queue_depth": queue_depth,
+            "queue_depth_max": self.queue_max,
+            "in_progress": len(getattr(self.crawler.engine.downloader, "active", ())),
+            "items_dropped": stats.get("item_dropped_count", 0),
+            "duplicate_items": self.duplicates,
+            "duplicate_requests": stats.get("dupefilter/filtered", 0),
+            "callbacks": callbacks,
+        }
+        # Swapped in one assignment: readers on other threads never see a
+        # half-built snapshot
+        self.latest = snapshot
+        _snapshots[self.job] = snapshot
+        if self.path:
+            self._write(snapshot)
+
+    def _file(self):
+        return self.path % {"name": self.spider.name, "job": self.job}
+
+    def _write(self, snapshot):
+        path = self._file()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = os.path.join(folder, f"_{os.path.basename(path)}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2)
+        os.replace(tmp, path)
+
+    def spider_closed(self, spider, reason):
+        if self.loop is not None and self.loop.running:
+            self.loop.stop()
+        self.refresh()
+        # The final snapshot stays in CrawlJob.metrics and the crawl stats;
+        # one file per crawl would pile up otherwise
+        _snapshots.pop(self.job, None)
+        if self.path:
+            try:
+                os.remove(self._file())
+            except FileNotFoundError:
+                pass
+        for key in ("items_per_s", "queue_depth_max", "duplicate_items"):
+            self.stats.set_value(f"metrics/{key}", self.latest[key])
+
+
+def prometheus_text(snapshots):
+    """Render snapshots in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP jobsniffer_{name} {help_text}")
+        lines.append(f"# TYPE jobsniffer_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"jobsniffer_{name}{{{label_text}}} {value}")
+
+    for name, key, kind, help_text in (
+        ("items_total", "items", "counter", "Items scraped"),
+        ("items_per_second", "items_per_s", "gauge", "Items scraped per second since the crawl started"),
+        ("requests_total", "requests", "counter", "Requests sent by the downloader"),
+        ("downloaded_bytes_total", "bytes_downloaded", "counter", "Response bytes downloaded"),
+        ("queue_depth", "queue_depth", "gauge", "Requests waiting in the scheduler"),
+        ("in_progress", "in_progress", "gauge", "Requests being downloaded"),
+        ("items_dropped_total", "items_dropped", "counter", "Items dropped by pipelines"),
+        ("duplicate_items_total", "duplicate_items", "counter", "Items yielded twice for the same offer"),
+        ("duplicate_requests_total", "duplicate_requests", "counter", "Requests filtered as duplicates"),
+    ):
+        metric(name, kind, help_text, [({"spider": s["spider"], "job": s["job"]}, s[key]) for s in snapshots])
+
+    metric("callback_cpu_seconds_total", "counter", "CPU time spent in spider callbacks",
+           [({"spider": s["spider"], "job": s["job"], "callback": cb}, data["cpu_seconds"])
+            for s in snapshots for cb, data in s["callbacks"].items()])
+
+    lines.append("# HELP jobsniffer_download_latency_seconds Download latency by callback")
+    lines.append("# TYPE jobsniffer_download_latency_seconds histogram")
+    for s in snapshots:
+        for cb, data in s["callbacks"].items():
+            labels = f'spider="{s["spider"]}",job="{s["job"]}",callback="{cb}"'
+            for bound, count in data["latency"]["buckets"].items():
+                lines.append(f'jobsniffer_download_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"jobsniffer_download_latency_seconds_sum{{{labels}}} {data['latency']['sum']}")
+            lines.append(f"jobsniffer_download_latency_seconds_count{{{labels}}} {data['latency']['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def start_endpoint(host, port):
+    """Serve /metrics for every crawl of this process (started once)."""
+    global _endpoint
+    if _endpoint is not None:
+        return
+    from twisted.internet import reactor
+    from twisted.internet.error import CannotListenError
+    from twisted.web import resource, server
+
+    class MetricsResource(resource.Resource):
+        isLeaf = True
+
+        def render_GET(self, request):
+            request.setHeader(b"content-type", b"text/plain; version=0.0.4; charset=utf-8")
+            return prometheus_text(list(_snapshots.values())).encode("utf-8")
+
+    try:
+        _endpoint = reactor.listenTCP(port, server.Site(MetricsResource()), interface=host)
+        logger.info("Crawl metrics served on http://%s:%d/metrics", host, port)
+    except CannotListenError as e:
+        # Another crawl process already serves its metrics on this port
+        _endpoint = False
+        logger.warning("Crawl metrics endpoint disabled: %s", e)
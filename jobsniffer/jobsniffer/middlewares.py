@@ -3,21 +3,39 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
+import queue
+import time
+
 from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import HtmlResponse, TextResponse
+from scrapy_selenium import SeleniumRequest
+from twisted.internet.defer import DeferredSemaphore
+from twisted.python.failure import Failure
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+logger = logging.getLogger(__name__)
+
 
 class JobsnifferSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
     # passed objects.
+    #
+    # Measures the CPU time of each callback for the crawl metrics
+    # (jobsniffer/metrics.py): the callbacks are generators, so their work
+    # happens while this middleware iterates over their output.
+
+    def __init__(self, stats=None):
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
@@ -33,8 +51,36 @@ class JobsnifferSpiderMiddleware:
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
-            yield i
+        cpu = 0.0
+        start = time.thread_time()
+        try:
+            for i in result:
+                cpu += time.thread_time() - start
+                yield i
+                start = time.thread_time()
+            cpu += time.thread_time() - start
+        finally:
+            self._record(response, cpu)
+
+    async def process_spider_output_async(self, response, result, spider):
+        # Same as process_spider_output, for asynchronous spider output
+        # (async callbacks, or an async middleware before this one).
+        cpu = 0.0
+        start = time.thread_time()
+        try:
+            async for i in result:
+                cpu += time.thread_time() - start
+                yield i
+                start = time.thread_time()
+            cpu += time.thread_time() - start
+        finally:
+            self._record(response, cpu)
+
+    def _record(self, response, cpu):
+        if self.stats is not None:
+            name = getattr(response.request.callback, "__name__", None) or "parse"
+            self.stats.inc_value(f"callback/{name}/cpu_seconds", cpu)
+            self.stats.inc_value(f"callback/{name}/calls")
 
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
@@ -56,48 +102,330 @@ class JobsnifferSpiderMiddleware:
         spider.logger.info("Spider opened: %s" % spider.name)
 
 
+class AdaptiveSlot:
+    """Concurrency state of one download slot (one domain by default)."""
+
+    def __init__(self, key, concurrency):
+        self.key = key
+        self.concurrency = float(concurrency)
+        self.baseline = None
+        self.last_backoff = 0.0
+        self.reset()
+
+    def reset(self):
+        self.latencies = []
+        self.responses = 0
+        self.errors = 0
+
+    def record(self, latency, error=False):
+        self.responses += 1
+        if error:
+            self.errors += 1
+        elif latency is not None:
+            self.latencies.append(latency)
+
+
 class JobsnifferDownloaderMiddleware:
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+    """Per-domain adaptive concurrency (AIMD).
+
+    Every ADAPTIVE_CONCURRENCY_WINDOW responses, the concurrency of the
+    domain's download slot goes up by one while its median latency stays
+    within ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE times its baseline and few
+    responses fail, and is cut otherwise. A 429, a 503 or a CAPTCHA page
+    halves it at once, at most once per round trip. Decisions are exported
+    in the stats under ``adaptive_concurrency/``.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.initial = settings.getint("CONCURRENT_REQUESTS_PER_DOMAIN", 8)
+        self.minimum = settings.getint("ADAPTIVE_CONCURRENCY_MIN", 1)
+        self.maximum = settings.getint("ADAPTIVE_CONCURRENCY_MAX", 32)
+        self.window = settings.getint("ADAPTIVE_CONCURRENCY_WINDOW", 20)
+        self.tolerance = settings.getfloat("ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE", 2.0)
+        self.backoff = settings.getfloat("ADAPTIVE_CONCURRENCY_BACKOFF", 0.5)
+        self.max_error_rate = settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE", 0.1)
+        self.captcha_markers = [m.encode() for m in settings.getlist("ADAPTIVE_CONCURRENCY_CAPTCHA_MARKERS", [])]
+        self.slots = {}
 
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED", True):
+            raise NotConfigured
+        s = cls(crawler)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
+    def _slot(self, request):
+        key = self.crawler.engine.downloader.get_slot_key(request)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = self.slots[key] = AdaptiveSlot(key, min(max(self.initial, self.minimum), self.maximum))
+            self._export(slot)
+        return slot
+
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        slot = self._slot(request)
+        request.meta["adaptive_sent_at"] = time.monotonic()
+        # Scrapy creates (and garbage-collects) its slots on its own, with
+        # the default concurrency
+        downloader_slot = self.crawler.engine.downloader.slots.get(slot.key)
+        if downloader_slot is not None and downloader_slot.concurrency != int(slot.concurrency):
+            downloader_slot.concurrency = int(slot.concurrency)
         return None
 
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
-
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
+        slot = self._slot(request)
+        if response.status in (429, 503):
+            self._back_off(slot, request, f"http_{response.status}")
+        elif self._is_captcha(response):
+            self._back_off(slot, request, "captcha")
+        else:
+            slot.record(request.meta.get("download_latency"), error=response.status >= 500)
+            if slot.responses >= self.window:
+                self._adjust(slot)
         return response
 
     def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+        if not isinstance(exception, IgnoreRequest):
+            slot = self._slot(request)
+            slot.record(None, error=True)
+            if slot.responses >= self.window:
+                self._adjust(slot)
+        return None
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+    def _is_captcha(self, response):
+        if not self.captcha_markers or not isinstance(response, TextResponse):
+            return False
+        body = response.body.lower()
+        return any(marker in body for marker in self.captcha_markers)
+
+    def _adjust(self, slot):
+        error_rate = slot.errors / slot.responses
+        latency = sorted(slot.latencies)[len(slot.latencies) // 2] if slot.latencies else None
+        if error_rate > self.max_error_rate:
+            self._set(slot, slot.concurrency * 0.75, "errors")
+        elif latency is not None and slot.baseline is not None and latency > slot.baseline * self.tolerance:
+            self._set(slot, slot.concurrency * 0.9, "latency")
+        else:
+            self._set(slot, slot.concurrency + 1, "increase")
+        if latency is not None:
+            # Let the baseline follow a site that became slower for good
+            slot.baseline = latency if slot.baseline is None else min(latency, slot.baseline * 1.05)
+        slot.reset()
+
+    def _back_off(self, slot, request, reason):
+        self.stats.inc_value(f"adaptive_concurrency/{reason}")
+        # Responses to requests sent before the last cut belong to the same
+        # congestion episode
+        if request.meta.get("adaptive_sent_at", 0.0) < slot.last_backoff:
+            return
+        slot.last_backoff = time.monotonic()
+        self._set(slot, slot.concurrency * self.backoff, "backoff")
+        slot.reset()
+
+    def _set(self, slot, concurrency, decision):
+        previous = int(slot.concurrency)
+        slot.concurrency = min(max(concurrency, self.minimum), self.maximum)
+        self.stats.inc_value(f"adaptive_concurrency/{slot.key}/{decision}")
+        if int(slot.concurrency) != previous:
+            logger.debug("Concurrency for %s: %d -> %d (%s)", slot.key, previous, int(slot.concurrency), decision)
+        self._export(slot)
+
+    def _export(self, slot):
+        self.stats.set_value(f"adaptive_concurrency/{slot.key}/concurrency", int(slot.concurrency))
+        self.stats.max_value(f"adaptive_concurrency/{slot.key}/concurrency_max", int(slot.concurrency))
+        self.stats.min_value(f"adaptive_concurrency/{slot.key}/concurrency_min", int(slot.concurrency))
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+    def spider_closed(self, spider):
+        for slot in self.slots.values():
+            if slot.baseline is not None:
+                self.stats.set_value(f"adaptive_concurrency/{slot.key}/latency_baseline_ms",
+                                     round(slot.baseline * 1000, 1))
+
+
+class BrowserPoolMiddleware:
+    """Render SeleniumRequest with a pool of reusable headless browsers.
+
+    scrapy_selenium drives a single WebDriver, so rendered requests are
+    serialized and one browser crash ends the crawl. This middleware keeps up
+    to BROWSER_POOL_SIZE browsers, each rendering in its own worker thread,
+    and replaces a browser after BROWSER_POOL_MAX_PAGES pages, when its
+    process tree goes over BROWSER_POOL_MAX_RSS_MB, or when it crashes.
+    Images, fonts and stylesheets are blocked to speed up rendering.
+
+    A request waits for a free browser on a DeferredSemaphore. Once
+    BROWSER_POOL_QUEUE_SIZE requests are waiting, the engine is paused so
+    that further requests stay in the scheduler until the pool catches up.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.pool_size = settings.getint("BROWSER_POOL_SIZE", 2)
+        self.queue_size = settings.getint("BROWSER_POOL_QUEUE_SIZE", 16)
+        self.max_pages = settings.getint("BROWSER_POOL_MAX_PAGES", 50)
+        self.max_rss = settings.getint("BROWSER_POOL_MAX_RSS_MB", 1024) * 1024 * 1024
+        self.arguments = settings.getlist("BROWSER_POOL_ARGUMENTS", ["--headless=new", "--disable-gpu"])
+        self.blocked_urls = settings.getlist("BROWSER_POOL_BLOCKED_URLS", [])
+        self.idle = queue.LifoQueue()
+        self.threadpool = None
+        self.shutdown_trigger = None
+        # Free browsers; requests beyond them wait on the semaphore
+        self.browsers = DeferredSemaphore(self.pool_size)
+        self.paused_engine = False
+        self.pending = 0
+        self.busy_time = 0.0
+        self.opened_at = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        s = cls(crawler)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        return s
+
+    def _start_pool(self):
+        from twisted.internet import reactor
+        from twisted.python.threadpool import ThreadPool
+
+        self.threadpool = ThreadPool(minthreads=0, maxthreads=self.pool_size, name="browser-pool")
+        self.threadpool.start()
+        # The reactor outlives the crawl in the app: removed on spider_closed
+        self.shutdown_trigger = reactor.addSystemEventTrigger("before", "shutdown", self._stop_pool)
+        self.opened_at = time.perf_counter()
+
+    def _stop_pool(self):
+        # Called on spider_closed, or on reactor shutdown during a crawl
+        if not self.threadpool.joined:
+            self.threadpool.stop()
+        if self.shutdown_trigger is not None:
+            from twisted.internet import reactor
+
+            reactor.removeSystemEventTrigger(self.shutdown_trigger)
+            self.shutdown_trigger = None
+
+    def _new_driver(self):
+        from selenium import webdriver
+
+        options = webdriver.ChromeOptions()
+        for argument in self.arguments:
+            options.add_argument(argument)
+        options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+        driver = webdriver.Chrome(options=options)
+        if self.blocked_urls:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.blocked_urls})
+        driver.pages_rendered = 0
+        return driver
+
+    def _rss(self, driver):
+        try:
+            import psutil
+        except ImportError:
+            return 0
+        try:
+            process = psutil.Process(driver.service.process.pid)
+            return sum(p.memory_info().rss for p in [process, *process.children(recursive=True)])
+        except (psutil.Error, AttributeError):
+            return 0
+
+    def _render(self, request):
+        # Runs in a pool thread: only touches the driver, stats are updated
+        # back in the reactor thread
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        try:
+            driver = self.idle.get_nowait()
+        except queue.Empty:
+            driver = self._new_driver()
+        start = time.perf_counter()
+        returned = False
+        try:
+            driver.get(request.url)
+            if getattr(request, "wait_until", None):
+                WebDriverWait(driver, request.wait_time).until(request.wait_until)
+            if getattr(request, "script", None):
+                driver.execute_script(request.script)
+            body = driver.page_source.encode("utf-8")
+            url = driver.current_url
+            render_time = time.perf_counter() - start
+            driver.pages_rendered += 1
+            recycled = driver.pages_rendered >= self.max_pages or (self.max_rss and self._rss(driver) > self.max_rss)
+            if not recycled:
+                self.idle.put(driver)
+                returned = True
+        finally:
+            # Whatever went wrong, a browser not back in the idle pool is
+            # quit rather than leaked: its slot gets a new one
+            if not returned:
+                driver.quit()
+        response = HtmlResponse(url, body=body, encoding="utf-8", request=request)
+        return response, render_time, recycled
+
+    def process_request(self, request, spider):
+        if not isinstance(request, SeleniumRequest):
+            return None
+        if self.threadpool is None:
+            self._start_pool()
+
+        from twisted.internet import reactor, threads
+
+        self.pending += 1
+        self.stats.max_value("browser_pool/queue_max", self.pending)
+        # Held here until a browser is free, rendered in a pool thread
+        d = self.browsers.run(threads.deferToThreadPool, reactor, self.threadpool, self._render, request)
+        d.addBoth(self._render_done)
+        self._backpressure()
+        return d
+
+    def _backpressure(self):
+        # Bounded queue: the engine stops taking requests from the scheduler
+        # while the queue is full (only unpaused if paused here)
+        engine = self.crawler.engine
+        full = self.pending >= self.pool_size + self.queue_size
+        if full and not engine.paused:
+            self.stats.inc_value("browser_pool/queue_full")
+            engine.pause()
+            self.paused_engine = True
+        elif not full and self.paused_engine:
+            engine.unpause()
+            self.paused_engine = False
+
+    def _render_done(self, result):
+        self.pending -= 1
+        self._backpressure()
+        if isinstance(result, Failure):
+            self.stats.inc_value("browser_pool/crashes")
+            return result
+        response, render_time, recycled = result
+        self.busy_time += render_time
+        self.stats.inc_value("browser_pool/renders")
+        self.stats.inc_value("browser_pool/render_time_total", render_time)
+        self.stats.max_value("browser_pool/render_time_max", render_time)
+        if recycled:
+            self.stats.inc_value("browser_pool/recycled")
+        return response
+
+    def spider_closed(self, spider):
+        if self.threadpool is None:
+            return
+        elapsed = time.perf_counter() - self.opened_at
+        renders = self.stats.get_value("browser_pool/renders", 0)
+        if renders:
+            self.stats.set_value("browser_pool/render_time_avg", self.busy_time / renders)
+        if elapsed > 0:
+            self.stats.set_value("browser_pool/utilization", self.busy_time / (elapsed * self.pool_size))
+        self._stop_pool()
+        while True:
+            try:
+                self.idle.get_nowait().quit()
+            except queue.Empty:
+                break
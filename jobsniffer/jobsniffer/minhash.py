@@ -0,0 +1,159 @@
+# MinHash signatures and LSH banding, vectorized with numpy
+#
+# Near-duplicate grouping of short texts (job titles, offer descriptions)
+# without comparing every pair. Each text becomes a set of hashed shingles;
+# its MinHash signature keeps, for each of num_perm hash functions, the
+# smallest hash of its shingles, so that two signatures agree on a fraction
+# of positions close to the Jaccard similarity of the sets. Signatures are
+# cut into bands: texts sharing one band end up in the same bucket, and only
+# texts that are neighbours in a bucket are compared. Shingle hashes are
+# CRC32, stable across processes, so signatures and bucket keys can be
+# stored and matched against later batches.
+
+import itertools
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from .search import normalize
+
+_MASK32 = np.uint64(0xFFFFFFFF)
+_SHIFT = np.uint64(32)
+_GRAM_MULTIPLIER = np.uint64(0x9E3779B1)
+
+
+def hash_shingles(shingles):
+    """Stable 32-bit hashes of a set of string shingles."""
+    return np.fromiter((zlib.crc32(s.encode()) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+
+def word_shingle_arrays(texts, k=3):
+    """Hashes of the word k-grams of many texts, flat, and the count per text.
+
+    Each distinct word is hashed once and the k-grams are combined from the
+    word hashes with numpy. Texts shorter than k words contribute their word
+    hashes. A k-gram repeated within a text is kept: it does not change the
+    MinHash signature.
+    """
+    split = [normalize(text).split() for text in texts]
+    lengths = np.fromiter(map(len, split), dtype=np.int64, count=len(split))
+    words = np.fromiter(itertools.chain.from_iterable(split), dtype=object, count=int(lengths.sum()))
+    codes, vocabulary = pd.factorize(words)
+    word_hashes = hash_shingles(vocabulary.tolist())[codes]
+    starts = np.cumsum(lengths) - lengths
+    # k-gram at word i when words i .. i + k - 1 belong to the same text
+    ends = np.repeat(starts + lengths, lengths)
+    first = np.arange(len(word_hashes)) + k <= ends
+    grams = word_hashes.copy()
+    positions = np.flatnonzero(first)
+    with np.errstate(over="ignore"):
+        for offset in range(1, k):
+            grams[positions] = grams[positions] * _GRAM_MULTIPLIER + word_hashes[positions + offset]
+    grams &= _MASK32
+    keep = first | np.repeat(lengths < k, lengths)
+    return grams[keep], np.where(lengths >= k, lengths - k + 1, lengths)
+
+
+class MinHasher:
+    """num_perm multiply-shift hash functions over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        # Odd 64-bit multipliers: (a * x + b) >> 32 is a universal family
+        self.a = rng.integers(1, 2**63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def signatures(self, shingle_sets, chunk=200_000):
+        """(len(shingle_sets), num_perm) uint32 signatures.
+
+        An empty set gets the all-max signature, which matches nothing but
+        other empty sets.
+        """
+        lengths = np.fromiter((len(s) for s in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+        values = np.concatenate(list(shingle_sets)) if len(shingle_sets) else np.empty(0, dtype=np.uint64)
+        return self.signatures_flat(values.astype(np.uint64), lengths, chunk)
+
+    def signatures_flat(self, values, lengths, chunk=200_000):
+        """Signatures of sets given as consecutive runs of ``lengths`` values."""
+        signatures = np.full((len(lengths), self.num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+        present = np.flatnonzero(lengths)
+        if not len(present):
+            return signatures
+        starts = np.zeros(len(present), dtype=np.int64)
+        np.cumsum(lengths[present][:-1], out=starts[1:])
+        # Whole documents per chunk of about `chunk` shingles
+        bounds = np.searchsorted(starts, np.arange(0, len(values), chunk), side="right") - 1
+        bounds = np.unique(np.r_[bounds, len(present)])
+        for lo, hi in zip(bounds[:-1], bounds[1:]):
+            first, last = starts[lo], (starts[hi] if hi < len(present) else len(values))
+            # One row per hash function: reduceat along rows is much faster
+            with np.errstate(over="ignore"):
+                hashed = ((values[None, first:last] * self.a[:, None] + self.b[:, None]) >> _SHIFT).astype(np.uint32)
+            signatures[present[lo:hi]] = np.minimum.reduceat(hashed, starts[lo:hi] - first, axis=1).T
+        return signatures
+
+
+def band_keys(signatures, bands):
+    """(n, bands) uint64 keys: equal keys mean equal signature bands."""
+    rows = signatures.shape[1] // bands
+    rng = np.random.default_rng(0)
+    weights = rng.integers(1, 2**63, rows, dtype=np.uint64) | np.uint64(1)
+    banded = signatures[:, :bands * rows].astype(np.uint64).reshape(len(signatures), bands, rows)
+    with np.errstate(over="ignore"):
+        return (banded * weights).sum(axis=2, dtype=np.uint64) ^ np.arange(bands, dtype=np.uint64)
+
+
+def similarity(signatures, left, right):
+    """Estimated Jaccard similarity of the pairs (left[i], right[i])."""
+    return (signatures[left] == signatures[right]).mean(axis=1)
+
+
+def candidate_pairs(keys, window=1):
+    """Pairs of rows that are neighbours in a bucket of some band.
+
+    Sorting the keys of a band puts each bucket in a run; linking each row
+    to the next ``window`` rows of its run connects the bucket with about
+    window * len pairs. A window above 1 keeps the bucket connected when
+    some pairs fail the verification.
+    """
+    left, right = [], []
+    for band in range(keys.shape[1]):
+        order = np.argsort(keys[:, band], kind="stable")
+        for offset in range(1, window + 1):
+            same = keys[order[offset:], band] == keys[order[:-offset], band]
+            left.append(order[:-offset][same])
+            right.append(order[offset:][same])
+    if not left:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(left), np.concatenate(right)
+
+
+def connected_components(n, left, right):
+    """Component label (smallest member) of each of n nodes given edges."""
+    labels = np.arange(n, dtype=np.int64)
+    if not len(left):
+        return labels
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        previous = labels.copy()
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        # Pointer jumping: follow labels to their own label
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+
+def cluster(signatures, bands, threshold):
+    """Group rows whose signatures are near duplicates.
+
+    Returns a component label per row; rows are linked when they share a
+    band bucket and their estimated similarity is at least ``threshold``.
+    """
+    left, right = candidate_pairs(band_keys(signatures, bands))
+    if len(left):
+        keep = similarity(signatures, left, right) >= threshold
+        left, right = left[keep], right[keep]
+    return connected_components(len(signatures), left, right)
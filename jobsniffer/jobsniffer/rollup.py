@@ -0,0 +1,217 @@
+# Ingest-time rollup of the history
+#
+# The comparison dashboard only needs counts and salary statistics per
+# (location, title, contract type, source, day), plus the département and
+# region of the location (see gazetteer.py) to filter by area. The title is
+# the title family computed at ingest (see titles.py), or the cleaned title
+# for offers ingested before families. Salaries are the annual euro figure
+# of salary.py, so that monthly, daily and yearly offers compare.
+#
+# count keeps every offer; unique_count and the salary statistics leave out
+# the offers flagged as duplicates of an earlier one (see dedup.py).
+#
+# HistoryStore.append folds every new batch into this rollup, so the
+# dashboard reads a table whose size follows the number of distinct
+# combinations instead of the number of scraped offers. One Parquet file
+# per day, so that an append only rewrites the days it touches, and an
+# all-days total (day left empty) that stays bounded by the number of
+# distinct combinations however long the history:
+#
+#     <history root>/_rollup/day=2024-05-02.parquet
+#     <history root>/_rollup/total.parquet
+
+import glob
+import os
+import re
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .gazetteer import get_gazetteer
+from .titles import canonical_titles
+
+DIMENSIONS = ["location", "departement", "region", "job_title", "contract_type", "source", "day"]
+
+SCHEMA = pa.schema([
+    ("location", pa.string()),
+    ("departement", pa.string()),
+    ("region", pa.string()),
+    ("job_title", pa.string()),
+    ("contract_type", pa.string()),
+    ("source", pa.string()),
+    ("day", pa.string()),
+    ("count", pa.int64()),
+    ("unique_count", pa.int64()),
+    # Annual salaries in euros (salary_annual_eur)
+    ("salary_eur_sum", pa.float64()),
+    ("salary_eur_count", pa.int64()),
+    ("salary_eur_min", pa.float64()),
+    ("salary_eur_max", pa.float64()),
+])
+
+SPACES = re.compile(r"\s+")
+
+
+def _normalize_distinct(series, normalize):
+    """Apply ``normalize`` once per distinct value of ``series``."""
+    codes, uniques = pd.factorize(series)
+    normalized = np.array([normalize(u) for u in uniques.tolist()] + [None], dtype=object)
+    return pd.Series(normalized[codes], index=series.index, dtype=object)
+
+
+def normalize_location(value):
+    value = SPACES.sub(" ", str(value)).strip()
+    return value or None
+
+
+def clean_titles(series):
+    """Display form of the titles (titles.py), computed once per distinct title."""
+    codes, uniques = pd.factorize(series)
+    cleaned, _ = canonical_titles(pd.Series(uniques, dtype=object))
+    cleaned = np.append(cleaned.to_numpy(dtype=object), None)
+    return pd.Series(cleaned[codes], index=series.index, dtype=object)
+
+
+def summarize(df, day=None):
+    """Aggregate offers to rollup rows.
+
+    ``df`` needs the dimension columns (``day`` may be given instead),
+    ``salary_annual_eur`` and ``duplicate``; missing dimensions count as
+    unknown, offers without ``duplicate`` as unique.
+    """
+    rows = pd.DataFrame(index=df.index)
+    rows["location"] = _normalize_distinct(df["location"], normalize_location) if "location" in df else None
+    gazetteer = get_gazetteer()
+    for position, column in ((1, "departement"), (2, "region")):
+        rows[column] = _normalize_distinct(df["location"], lambda v: gazetteer.locate(v)[position]) if "location" in df else None
+    rows["job_title"] = clean_titles(df["job_title"]) if "job_title" in df else None
+    if "title_family" in df:
+        # Offers ingested before title families keep their normalized title
+        family = df["title_family"].astype(object)
+        rows["job_title"] = family.where(family.notna(), rows["job_title"])
+    for column in ("contract_type", "source"):
+        rows[column] = df[column].astype(object) if column in df else None
+    rows["day"] = str(day) if day is not None else df["day"].astype(str)
+    if "salary_annual_eur" in df:
+        salary = pd.to_numeric(df["salary_annual_eur"], errors="coerce")
+    else:
+        salary = pd.Series(np.nan, index=df.index)
+    duplicate = df["duplicate"].eq(True) if "duplicate" in df else pd.Series(False, index=df.index)
+    salary = salary.where(~duplicate)
+    rows["count"] = 1
+    rows["unique_count"] = (~duplicate).astype("int64")
+    rows["salary_eur_sum"] = salary.fillna(0.0)
+    rows["salary_eur_count"] = salary.notna().astype("int64")
+    rows["salary_eur_min"] = salary
+    rows["salary_eur_max"] = salary
+    return merge(rows)
+
+
+def merge(rows):
+    """Combine rollup rows sharing the same dimensions."""
+    if rows.empty:
+        return pd.DataFrame({field.name: pd.Series(dtype=object) for field in SCHEMA})
+    grouped = rows.groupby(DIMENSIONS, dropna=False, sort=False)
+    return grouped.agg(
+        count=("count", "sum"),
+        unique_count=("unique_count", "sum"),
+        salary_eur_sum=("salary_eur_sum", "sum"),
+        salary_eur_count=("salary_eur_count", "sum"),
+        salary_eur_min=("salary_eur_min", "min"),
+        salary_eur_max=("salary_eur_max", "max"),
+    ).reset_index()
+
+
+class Rollup:
+    """Per-day Parquet rollup files kept next to the history segments.
+
+    Folding a batch reads and rewrites the files it touches: ``add`` and
+    ``rebuild`` run one at a time, so that overlapping appends of the shared
+    store do not drop each other's batch.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, day):
+        if day is None:
+            return os.path.join(self.root, "total.parquet")
+        return os.path.join(self.root, f"day={day}.parquet")
+
+    def _write(self, path, rows):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f"_{uuid.uuid4().hex[:8]}-{os.path.basename(path)}")
+        table = pa.Table.from_pandas(rows[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def exists(self):
+        """True when the rollup has been built, with the current columns."""
+        path = self._path(None)
+        return os.path.exists(path) and pq.read_schema(path).names == SCHEMA.names
+
+    def _fold(self, day, rows):
+        path = self._path(day)
+        if os.path.exists(path):
+            rows = merge(pd.concat([pq.read_table(path).to_pandas(), rows], ignore_index=True))
+        self._write(path, rows)
+
+    def add(self, df, day=None):
+        """Fold a batch of offers into the rollup of its day(s) and the total."""
+        batch = summarize(df, day)
+        with self._lock:
+            for batch_day, rows in batch.groupby("day"):
+                self._fold(batch_day, rows)
+            self._fold(None, merge(batch.assign(day=None)))
+
+    def rebuild(self, store):
+        """Recompute the rollup from the whole history of ``store``."""
+        with self._lock:
+            self._rebuild(store)
+
+    def _rebuild(self, store):
+        tmp_root = f"{self.root}.tmp"
+        shutil.rmtree(tmp_root, ignore_errors=True)
+        columns = ["location", "job_title", "title_family", "contract_type", "salary_annual_eur", "duplicate", "date",
+                   "source"]
+        history = store.load(columns=columns)
+        target = Rollup(tmp_root)
+        os.makedirs(tmp_root, exist_ok=True)
+        days = [summarize(batch, day) for day, batch in history.groupby("date")]
+        for rows in days:
+            target._write(target._path(rows["day"].iloc[0]), rows)
+        total = merge(pd.concat(days, ignore_index=True).assign(day=None)) if days else merge(pd.DataFrame())
+        target._write(target._path(None), total)
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.replace(tmp_root, self.root)
+
+    def version(self):
+        """Changes whenever a rollup file is written; usable as a cache key."""
+        return tuple(sorted((os.path.basename(p), os.stat(p).st_mtime_ns)
+                            for p in glob.glob(os.path.join(self.root, "[!_]*.parquet"))))
+
+    def load(self, since=None, until=None):
+        """Rollup rows of the days between since and until.
+
+        Without bounds, the all-days total is returned (``day`` is empty).
+        """
+        if since is None and until is None:
+            path = self._path(None)
+            if os.path.exists(path):
+                return pq.read_table(path).to_pandas()
+            return merge(pd.DataFrame())
+        frames = []
+        for path in sorted(glob.glob(os.path.join(self.root, "day=*.parquet"))):
+            day = os.path.basename(path)[len("day="):-len(".parquet")]
+            if (since is not None and day < str(since)) or (until is not None and day > str(until)):
+                continue
+            frames.append(pq.read_table(path).to_pandas())
+        if not frames:
+            return merge(pd.DataFrame())
+        return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,213 @@
+# In-process crawl service
+#
+# Keeps a single Twisted reactor running in a background thread so that the
+# Streamlit app can launch crawls without paying for a new interpreter, a
+# Scrapy import and a reactor boot on every click. Items are handed back as
+# plain Python dicts instead of going through a JSON feed file.
+#
+# A crawl given a ``jobdir`` keeps its pending requests in disk queues, its
+# seen requests and its spider state in that folder (Scrapy's JOBDIR): a
+# crawl stopped gracefully (cancelled, or the service stopped) and submitted
+# again with the same folder resumes where it stopped.
+
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from itemadapter import ItemAdapter
+from scrapy import signals
+from scrapy.crawler import Crawler, CrawlerRunner
+from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
+
+from .metrics import engine_scheduler
+
+os.environ.setdefault("SCRAPY_SETTINGS_MODULE", "jobsniffer.settings")
+
+
+class CrawlJob:
+    """Handle on a crawl submitted to the CrawlService.
+
+    Items are appended to ``items`` as soon as the spider yields them, so the
+    caller can read partial results while the crawl is still running.
+    """
+
+    def __init__(self, spider_name, spider_kwargs, on_item=None, jobdir=None):
+        self.spider_name = spider_name
+        self.spider_kwargs = spider_kwargs
+        self.jobdir = jobdir
+        # Requests left in the disk queues by the previous run, if resumed
+        self.resumed_requests = 0
+        self.items = []
+        self.errors = []
+        self.stats = {}
+        self.started_at = time.perf_counter()
+        self.first_item_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self._on_item = on_item
+        self._crawler = None
+        self._future = Future()
+
+    @property
+    def time_to_first_item(self):
+        if self.first_item_at is None:
+            return None
+        return self.first_item_at - self.started_at
+
+    @property
+    def duration(self):
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        return end - self.started_at
+
+    @property
+    def progress(self):
+        """Share of scheduled requests already answered, between 0 and 1."""
+        if self.done():
+            return 1.0
+        if self._crawler is None or self._crawler.stats is None:
+            return 0.0
+        enqueued = self._crawler.stats.get_value("scheduler/enqueued", 0) + self.resumed_requests
+        received = self._crawler.stats.get_value("response_received_count", 0)
+        if not enqueued:
+            return 0.0
+        return min(received / enqueued, 0.99)
+
+    @property
+    def metrics(self):
+        """Latest snapshot of the crawl metrics (see jobsniffer/metrics.py)."""
+        extension = getattr(self._crawler, "metrics", None)
+        return extension.latest if extension is not None else {}
+
+    def done(self):
+        return self._future.done()
+
+    def result(self, timeout=None):
+        """Block until the crawl ends and return the collected items."""
+        self._future.result(timeout)
+        return self.items
+
+    def _item_scraped(self, item, response, spider):
+        if self.first_item_at is None:
+            self.first_item_at = time.perf_counter()
+        data = ItemAdapter(item).asdict()
+        self.items.append(data)
+        if self._on_item is not None:
+            self._on_item(data)
+
+    def _spider_opened(self, spider):
+        self.resumed_requests = len(engine_scheduler(self._crawler.engine))
+
+    def _spider_error(self, failure, response, spider):
+        self.errors.append(failure.getTraceback())
+
+    def _finish(self, crawler):
+        self.finished_at = time.perf_counter()
+        if crawler.stats is not None:
+            self.stats = crawler.stats.get_stats()
+        self._future.set_result(self.items)
+
+    def _fail(self, failure):
+        self.finished_at = time.perf_counter()
+        self.errors.append(failure.getTraceback())
+        self._future.set_exception(failure.value)
+
+
+class CrawlService:
+    """Long-lived crawler engine running on a background reactor thread."""
+
+    def __init__(self, settings=None):
+        self.settings = settings if settings is not None else get_project_settings()
+        self._runner = None
+        self._reactor = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            ready = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run_reactor, args=(ready,),
+                name="jobsniffer-reactor", daemon=True,
+            )
+            self._thread.start()
+            ready.wait()
+
+    def _run_reactor(self, ready):
+        install_reactor(self.settings["TWISTED_REACTOR"])
+        from twisted.internet import reactor
+
+        self._reactor = reactor
+        self._runner = CrawlerRunner(self.settings)
+        reactor.callWhenRunning(ready.set)
+        reactor.run(installSignalHandlers=False)
+
+    def submit(self, spider_name, job_title, location, max_pages, on_item=None, jobdir=None, **spider_kwargs):
+        """Schedule a crawl and return its CrawlJob immediately.
+
+        ``spider_name`` is a spider name or a Spider subclass. ``on_item`` is
+        called from the reactor thread with each item dict. ``jobdir`` is the
+        folder of the crawl state, resumed if a previous run left one there.
+        """
+        self.start()
+        spider_kwargs.update(job_title=job_title, location=location, max_pages=max_pages)
+        job = CrawlJob(spider_name, spider_kwargs, on_item=on_item, jobdir=jobdir)
+        self._reactor.callFromThread(self._start_crawl, job)
+        return job
+
+    def crawl(self, spider_name, job_title, location, max_pages, timeout=None, **spider_kwargs):
+        """Run a crawl to completion and return its items as a list of dicts."""
+        job = self.submit(spider_name, job_title, location, max_pages, **spider_kwargs)
+        return job.result(timeout)
+
+    def cancel(self, job):
+        """Stop a running crawl; the items scraped so far are kept."""
+        self._reactor.callFromThread(self._stop_crawl, job)
+
+    def _stop_crawl(self, job):
+        crawler = job._crawler
+        if crawler is not None and crawler.crawling and not job.done():
+            job.cancelled = True
+            crawler.stop()
+
+    def _start_crawl(self, job):
+        try:
+            if job.jobdir is None:
+                crawler = self._runner.create_crawler(job.spider_name)
+            else:
+                spidercls = job.spider_name
+                if isinstance(spidercls, str):
+                    spidercls = self._runner.spider_loader.load(spidercls)
+                settings = self.settings.copy()
+                settings.set("JOBDIR", job.jobdir, priority="cmdline")
+                crawler = Crawler(spidercls, settings)
+        except Exception as e:
+            job.finished_at = time.perf_counter()
+            job.errors.append(repr(e))
+            job._future.set_exception(e)
+            return
+        job._crawler = crawler
+        crawler.signals.connect(job._item_scraped, signal=signals.item_scraped, weak=False)
+        crawler.signals.connect(job._spider_error, signal=signals.spider_error, weak=False)
+        if job.jobdir is not None:
+            crawler.signals.connect(job._spider_opened, signal=signals.spider_opened, weak=False)
+        d = self._runner.crawl(crawler, **job.spider_kwargs)
+        d.addCallbacks(lambda _: job._finish(crawler), job._fail)
+
+    def stop(self):
+        """Stop running crawls and the reactor thread (it cannot be restarted)."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+
+        def _shutdown():
+            d = self._runner.stop()
+            d.addBoth(lambda _: self._reactor.stop())
+            d.addBoth(lambda _: done.set())
+
+        self._reactor.callFromThread(_shutdown)
+        done.wait()
+        self._thread.join()
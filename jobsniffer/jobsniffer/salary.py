@@ -0,0 +1,133 @@
+# Vectorized salary normalization
+#
+# Turns the raw salary strings shown on the job boards ("40 000 - 45 000 € / an",
+# "11,88 € / heure", "45k€", ...) into typed columns with pyarrow compute
+# kernels, instead of running a Python function per row: the regular
+# expressions run in RE2 over the whole column. Extra months ("+ 13ème
+# mois", "sur 13 mois") are dropped first: they are neither an amount nor
+# the unit of the salary.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+UNITS = ["heure", "jour", "mois", "an"]
+
+# Number of paid units per year: 35h weeks, 218-day "forfait jours", 12 months
+ANNUAL_FACTORS = {"heure": 1607.0, "jour": 218.0, "mois": 12.0, "an": 1.0}
+
+UNIT_PATTERNS = {
+    "heure": r"heure|horaire|/\s*h\b",
+    "jour": r"jour|journalier|/\s*j\b",
+    "mois": r"mois|mensuel",
+    "an": r"\ban\b|année|annuel",
+}
+
+# RE2 has no lookarounds: THOUSANDS is applied twice, as its matches cannot
+# overlap ("1 000 000"). Thousands separators are plain, no-break and narrow
+# no-break spaces, or a dot.
+THOUSANDS = "(\\d)[ \u00a0\u202f.](\\d{3})(\\D|$)"
+DECIMAL_COMMA = r"(\d),(\d)"
+# "13ème mois", "13e mois", "treizième mois", "sur 13 mois", "13 mois de salaire"
+EXTRA_MONTHS = (r"\b\d+\s*(?:e|è|ème|eme|ième|ieme)\s+mois\b|\b(?:treizi|quatorzi)[èe]me\s+mois\b"
+                r"|\bsur\s+1[2-4]\s+mois\b|\b1[2-4]\s+mois\s+de\s+salaire\b")
+# Anything between the amounts, and what an amount looks like once cleaned
+SEPARATOR = r"[^0-9.]+"
+AMOUNT = r"^\d+(?:\.\d+)?$"
+# "45k€", "40 - 45 k€": thousands of euros, not "45 kms"
+THOUSANDS_SUFFIX = r"\d\s*k(?:[^a-z]|$)"
+
+
+def _normalize_distinct(text):
+    """Parse a pyarrow array of distinct, lower-cased salary strings."""
+    text = pc.replace_substring_regex(text, EXTRA_MONTHS, " ")
+    for _ in range(2):
+        text = pc.replace_substring_regex(text, THOUSANDS, r"\1\2\3")
+    text = pc.replace_substring_regex(text, DECIMAL_COMMA, r"\1.\2")
+
+    # Amounts of every string, flattened: rows[i] is the string of amount i
+    tokens = pc.split_pattern_regex(text, SEPARATOR)
+    flat = pc.list_flatten(tokens)
+    is_amount = pc.match_substring_regex(flat, AMOUNT)
+    values = pc.cast(pc.filter(flat, is_amount), pa.float64()).to_numpy()
+    rows = pc.filter(pc.list_parent_indices(tokens), is_amount).to_numpy()
+    # "40 - 45k€": the k applies to every small number of the row
+    row_has_k = pc.match_substring_regex(text, THOUSANDS_SUFFIX).to_numpy(zero_copy_only=False)
+    values = np.where(row_has_k[rows] & (values < 1000), values * 1000, values)
+
+    salary_min = np.full(len(text), np.nan)
+    salary_max = np.full(len(text), np.nan)
+    if len(values):
+        # Amounts of a string are contiguous: reduce from the offset of its first one
+        parsed, starts = np.unique(rows, return_index=True)
+        salary_min[parsed] = np.minimum.reduceat(values, starts)
+        salary_max[parsed] = np.maximum.reduceat(values, starts)
+    midpoint = (salary_min + salary_max) / 2
+
+    conditions = [pc.match_substring_regex(text, UNIT_PATTERNS[u]).to_numpy(zero_copy_only=False)
+                  for u in UNITS]
+    unit = np.select(conditions, range(len(UNITS)), default=-1)
+    # No explicit unit: guess from the order of magnitude
+    guessed = np.select(
+        [midpoint >= 10000, midpoint >= 500, midpoint >= 50, midpoint > 0],
+        [3, 2, 1, 0], default=-1,
+    )
+    unit = np.where(unit == -1, guessed, unit)
+    unit = np.where(np.isnan(midpoint), -1, unit)
+    return salary_min, salary_max, midpoint, unit
+
+
+def normalize_salaries(salaries):
+    """Parse a Series of salary strings.
+
+    Returns a DataFrame on the same index with ``salary_min``,
+    ``salary_max``, ``salary_numeric`` (midpoint in the stated unit),
+    ``salary_annual_eur`` and a categorical ``salary_unit``.
+
+    Salary strings repeat a lot, so only the distinct values are parsed and
+    the results are broadcast back with their dictionary codes.
+    """
+    text = pa.array(np.asarray(salaries.astype("string"), dtype=object), type=pa.string(), from_pandas=True)
+    encoded = pc.dictionary_encode(pc.utf8_lower(text))
+    codes = pc.fill_null(encoded.indices, -1).to_numpy().astype(np.int64)
+    salary_min, salary_max, midpoint, unit = _normalize_distinct(encoded.dictionary)
+
+    # Code -1 (missing salary) picks the trailing NaN / "no unit" slot
+    def take(values, fill):
+        return np.append(values, fill)[codes]
+
+    unit_codes = take(unit, -1)
+    factors = np.array([ANNUAL_FACTORS[u] for u in UNITS] + [np.nan])
+    result = pd.DataFrame({
+        "salary_min": take(salary_min, np.nan),
+        "salary_max": take(salary_max, np.nan),
+        "salary_numeric": take(midpoint, np.nan),
+        "salary_unit": pd.Categorical.from_codes(unit_codes, categories=UNITS),
+        "salary_annual_eur": take(midpoint, np.nan) * factors[unit_codes],
+    }, index=salaries.index)
+    return result
+
+
+def add_salary_columns(df, column="salary"):
+    """Return ``df`` with the normalized salary columns added or refreshed."""
+    if column not in df.columns:
+        return df
+    normalized = normalize_salaries(df[column])
+    return df.drop(columns=[c for c in normalized.columns if c in df.columns]).join(normalized)
+
+
+def backfill(store):
+    """Re-normalize the salary columns of every offer already in the history."""
+    return store.rewrite(add_salary_columns)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from jobsniffer.history import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Re-normalize salaries in a history store")
+    parser.add_argument("root", help="history store folder, e.g. jobsniffer/spiders/history")
+    args = parser.parse_args()
+    print(f"{backfill(HistoryStore(args.root))} offres re-normalisées")
@@ -0,0 +1,199 @@
+# Full-text index for the results filter
+#
+# Replaces the row-by-row `astype(str).str.contains` scan of the filter box.
+# Each indexed column is factorized first, so a value repeated on many rows
+# (a city, a company, a contract type) is tokenized once. Tokens are
+# accent-insensitive and lower-cased, kept in a sorted vocabulary so that a
+# prefix is a contiguous range of postings, and a trigram index over the
+# vocabulary finds the tokens a term appears in. Queries are a few numpy
+# operations over the matching postings.
+#
+#     data analy company:total contrat:cdi
+
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Query prefix -> (column, weight in the ranking)
+FIELDS = {
+    "title": ("job_title", 3.0),
+    "company": ("company_name", 2.0),
+    "location": ("location", 2.0),
+    "contract": ("contract_type", 2.0),
+    "qualifications": ("qualifications", 1.5),
+    "missions": ("missions", 1.0),
+}
+FIELD_ALIASES = {
+    "poste": "title",
+    "entreprise": "company",
+    "lieu": "location",
+    "ville": "location",
+    "contrat": "contract",
+}
+
+# Exact token, token starting with the term, token containing the term
+EXACT, PREFIX, INFIX = 3.0, 2.0, 1.0
+
+TOKEN = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Lower-case and strip accents: "Télétravail" -> "teletravail"."""
+    text = str(text).casefold()
+    if text.isascii():
+        return text
+    # Letters without an ASCII decomposition (œ, æ) are dropped, the same
+    # way for the indexed text and for the query
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+
+def _as_text(value):
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return " ".join(str(v) for v in value)
+    return value
+
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+
+def _gather(offsets, data, keys):
+    """Concatenate the CSR slices ``data[offsets[k]:offsets[k + 1]]`` of ``keys``."""
+    keys = np.asarray(keys, dtype=np.int64)
+    starts = offsets[keys]
+    lengths = offsets[keys + 1] - starts
+    ends = np.cumsum(lengths)
+    # Offset of each output element from its position in the output
+    return data[np.arange(ends[-1] if len(ends) else 0) + np.repeat(starts - ends + lengths, lengths)]
+
+
+def _csr(keys, values, size):
+    """Group ``values`` by ``keys`` (0 <= key < size) into a sorted CSR layout.
+
+    Negative keys (missing values) are left out.
+    """
+    present = keys >= 0
+    keys, values = keys[present], values[present]
+    order = np.argsort(keys, kind="stable")
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+class FieldIndex:
+    """Inverted index of one column: token -> distinct values -> rows."""
+
+    def __init__(self, column):
+        first = column.dropna().head(1)
+        if len(first) and isinstance(first.iloc[0], (list, tuple, np.ndarray)):
+            # qualifications: lists of tags
+            column = column.map(_as_text)
+        codes, uniques = pd.factorize(column)
+        # Rows of each distinct value
+        self.value_offsets, self.value_rows = _csr(codes, np.arange(len(codes), dtype=np.int64), len(uniques))
+
+        pairs = pd.Series([sorted(set(TOKEN.findall(normalize(u)))) for u in uniques.tolist()], dtype=object).explode().dropna()
+        token_codes, vocabulary = pd.factorize(pairs.to_numpy(dtype=object), sort=True)
+        self.vocabulary = np.asarray(vocabulary, dtype=object)
+        # Distinct values containing each token
+        self.token_offsets, self.token_values = _csr(token_codes, pairs.index.to_numpy(dtype=np.int64),
+                                                     len(self.vocabulary))
+        trigrams = {}
+        for token_id, token in enumerate(self.vocabulary):
+            for trigram in _trigrams(token):
+                trigrams.setdefault(trigram, []).append(token_id)
+        self.trigrams = {t: np.array(ids, dtype=np.int64) for t, ids in trigrams.items()}
+
+    def _tokens_rows(self, token_ids):
+        if isinstance(token_ids, range):
+            # A prefix range of the sorted vocabulary is one slice of postings
+            values = self.token_values[self.token_offsets[token_ids.start]:self.token_offsets[token_ids.stop]]
+        else:
+            values = _gather(self.token_offsets, self.token_values, token_ids)
+        if len(token_ids) > 1:
+            # A value holding several of the tokens must only count once
+            seen = np.zeros(len(self.value_offsets) - 1, dtype=bool)
+            seen[values] = True
+            values = np.flatnonzero(seen)
+        return _gather(self.value_offsets, self.value_rows, values)
+
+    def matches(self, term):
+        """Yield (rows, weight) for the tokens matching a normalized term."""
+        lo = np.searchsorted(self.vocabulary, term, side="left")
+        hi = np.searchsorted(self.vocabulary, term + "\uffff", side="left")
+        if lo < hi:
+            # The sorted vocabulary puts the exact token first, then the
+            # tokens it is a prefix of, as one contiguous range
+            if self.vocabulary[lo] == term:
+                yield self._tokens_rows([lo]), EXACT
+                lo += 1
+            if lo < hi:
+                yield self._tokens_rows(range(lo, hi)), PREFIX
+        if len(term) >= 3:
+            candidates = None
+            for trigram in _trigrams(term):
+                ids = self.trigrams.get(trigram)
+                if ids is None:
+                    return
+                candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+            infix = [t for t in candidates if not self.vocabulary[t].startswith(term) and term in self.vocabulary[t]]
+            if infix:
+                yield self._tokens_rows(infix), INFIX
+
+
+def parse_query(query):
+    """Split a query into (field or None, normalized term) pairs."""
+    terms = []
+    for part in query.split():
+        field = None
+        if ":" in part:
+            prefix, _, rest = part.partition(":")
+            prefix = FIELD_ALIASES.get(prefix.lower(), prefix.lower())
+            if prefix in FIELDS:
+                field, part = prefix, rest
+        for token in TOKEN.findall(normalize(part)):
+            terms.append((field, token))
+    return terms
+
+
+class SearchIndex:
+    """Ranked full-text search over the offers of a DataFrame.
+
+    Every term must match (AND); a bare term is looked up in every indexed
+    column, ``company:``, ``contract:``, ... restrict it to one. ``search``
+    returns row positions, best matches first, ties in the original order.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.fields = {name: FieldIndex(df[column]) for name, (column, _) in FIELDS.items()
+                       if column in df.columns}
+
+    def search(self, query, limit=None):
+        terms = parse_query(query)
+        if not terms:
+            return np.arange(self.size)
+        total = np.zeros(self.size, dtype=np.float32)
+        alive = np.ones(self.size, dtype=bool)
+        for field, term in terms:
+            scores = np.zeros(self.size, dtype=np.float32)
+            names = [field] if field else list(self.fields)
+            for name in names:
+                index = self.fields.get(name)
+                if index is None:
+                    continue
+                field_weight = FIELDS[name][1]
+                for rows, weight in index.matches(term):
+                    # rows are unique within one match
+                    scores[rows] = np.maximum(scores[rows], weight * field_weight)
+            alive &= scores > 0
+            total += scores
+        positions = np.flatnonzero(alive)
+        positions = positions[np.argsort(-total[positions], kind="stable")]
+        return positions[:limit] if limit is not None else positions
+
+    def filter(self, df, query):
+        """Rows of ``df`` (the indexed frame) matching ``query``, ranked."""
+        return df.iloc[self.search(query)]
@@ -0,0 +1,182 @@
+# Persistent index of offers already scraped
+#
+# Lets the spiders skip the detail page of an offer they already know: the
+# detail fields are kept in SQLite and merged with the fresh listing fields.
+# Ids are also kept in an in-memory set so that most lookups for new offers
+# never touch the database.
+#
+# Several crawls share the file (concurrent sources, job queue workers):
+# offers are buffered in memory and written in one short transaction every
+# commit_every offers and when the spider goes idle, and the database runs
+# in WAL mode so that readers never wait for a writer. A write that still
+# finds the database locked past the busy timeout leaves the offers
+# buffered for the next commit.
+
+import json
+import logging
+import sqlite3
+import time
+from urllib.parse import urlsplit, urlunsplit
+
+from itemadapter import ItemAdapter
+
+logger = logging.getLogger(__name__)
+
+UPSERT_OFFER = (
+    "INSERT INTO offers (key, first_seen, last_seen, data) VALUES (?, ?, ?, ?)"
+    " ON CONFLICT(key) DO UPDATE SET last_seen = excluded.last_seen, data = excluded.data"
+)
+
+
+def canonical_url(url):
+    """Drop the query string and fragment, which carry tracking parameters."""
+    if not url:
+        return None
+    parts = urlsplit(url)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path.rstrip("/"), "", ""))
+
+
+class SeenOfferIndex:
+    """On-disk map of job_id / canonical job_url to the last scraped item."""
+
+    def __init__(self, path, commit_every=100, timeout=30.0):
+        self.path = path
+        self.commit_every = commit_every
+        # Offers not written yet: key -> (last_seen, data)
+        self._pending = {}
+        self.db = sqlite3.connect(path, timeout=timeout)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS offers ("
+            " key TEXT PRIMARY KEY,"
+            " first_seen REAL NOT NULL,"
+            " last_seen REAL NOT NULL,"
+            " data TEXT NOT NULL)"
+        )
+        # Per saved search: high-water mark, offers seen on the last run and delta
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS queries ("
+            " query TEXT PRIMARY KEY,"
+            " high_water_id TEXT,"
+            " last_run REAL NOT NULL,"
+            " summary TEXT,"
+            " high_water_date TEXT)"
+        )
+        # Index files written before the publication date mark
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(queries)")}
+        if "high_water_date" not in columns:
+            self.db.execute("ALTER TABLE queries ADD COLUMN high_water_date TEXT")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS query_offers ("
+            " query TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " PRIMARY KEY (query, key))"
+        )
+        self.db.commit()
+        self._keys = {row[0] for row in self.db.execute("SELECT key FROM offers")}
+
+    @staticmethod
+    def _key_candidates(job_id, job_url):
+        keys = []
+        if job_id:
+            keys.append(f"id:{job_id}")
+        url = canonical_url(job_url)
+        if url:
+            keys.append(f"url:{url}")
+        return keys
+
+    @classmethod
+    def offer_key(cls, job_id, job_url):
+        """Key identifying an offer, preferring the job_id over the URL."""
+        keys = cls._key_candidates(job_id, job_url)
+        return keys[0] if keys else None
+
+    def __contains__(self, key):
+        job_id, job_url = key
+        return any(k in self._keys for k in self._key_candidates(job_id, job_url))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, job_id=None, job_url=None):
+        """Return the stored item dict, or None for an unknown offer."""
+        for key in self._key_candidates(job_id, job_url):
+            if key not in self._keys:
+                continue
+            if key in self._pending:
+                return json.loads(self._pending[key][1])
+            row = self.db.execute("SELECT data FROM offers WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                return json.loads(row[0])
+        return None
+
+    def add(self, item):
+        """Insert or refresh an offer from an item (or item-like dict)."""
+        item = ItemAdapter(item).asdict()
+        data = json.dumps(item, ensure_ascii=False, default=str)
+        now = time.time()
+        for key in self._key_candidates(item.get("job_id"), item.get("job_url")):
+            self._pending[key] = (now, data)
+            self._keys.add(key)
+        if len(self._pending) >= self.commit_every:
+            self.commit()
+
+    def query_state(self, query):
+        row = self.db.execute(
+            "SELECT high_water_id, high_water_date, last_run, summary FROM queries WHERE query = ?", (query,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"high_water_id": row[0], "high_water_date": row[1], "last_run": row[2],
+                "summary": json.loads(row[3]) if row[3] else None}
+
+    def query_offers(self, query):
+        return {row[0] for row in self.db.execute(
+            "SELECT key FROM query_offers WHERE query = ?", (query,))}
+
+    def save_query(self, query, high_water_id, run, keys, summary, replace=True, high_water_date=None):
+        """Persist the state of a saved search after a crawl.
+
+        With ``replace`` the offer set of the query becomes ``keys``,
+        otherwise ``keys`` are added to the offers recorded so far.
+        """
+        with self.db:
+            if replace:
+                self.db.execute("DELETE FROM query_offers WHERE query = ?", (query,))
+            self.db.executemany(
+                "INSERT OR IGNORE INTO query_offers (query, key) VALUES (?, ?)",
+                [(query, key) for key in keys],
+            )
+            self.db.execute(
+                "INSERT INTO queries (query, high_water_id, high_water_date, last_run, summary)"
+                " VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT(query) DO UPDATE SET high_water_id = excluded.high_water_id,"
+                " high_water_date = excluded.high_water_date,"
+                " last_run = excluded.last_run, summary = excluded.summary",
+                (query, high_water_id, high_water_date, run, json.dumps(summary)),
+            )
+
+    def commit(self):
+        """Write the buffered offers; True once none is left buffered."""
+        if not self._pending:
+            return True
+        rows = [(key, now, now, data) for key, (now, data) in self._pending.items()]
+        try:
+            with self.db:
+                self.db.executemany(UPSERT_OFFER, rows)
+        except sqlite3.OperationalError as exc:
+            if "locked" not in str(exc) and "busy" not in str(exc):
+                raise
+            logger.warning("%s is locked, %d offers kept for the next commit", self.path, len(rows))
+            return False
+        self._pending.clear()
+        return True
+
+    def close(self, attempts=3):
+        for _ in range(attempts):
+            if self.commit():
+                break
+        else:
+            raise sqlite3.OperationalError(f"{self.path} stayed locked, {len(self._pending)} offers not written")
+        self.db.close()
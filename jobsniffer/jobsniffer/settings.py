@@ -9,7 +9,15 @@
 
 BOT_NAME = "jobsniffer"
 
-SPIDER_MODULES = ["jobsniffer.spiders"]
+# The spider modules, not the whole jobsniffer.spiders package: the
+# Streamlit apps living next to them (main.py, front.py) open the history
+# store and the job queue at import, and the spider loader of every crawl
+# would import them. A new spider module is added here.
+SPIDER_MODULES = [
+    "jobsniffer.spiders.hellowork",
+    "jobsniffer.spiders.wttj",
+    "jobsniffer.spiders.indeed",
+]
 NEWSPIDER_MODULE = "jobsniffer.spiders"
 
 
@@ -20,7 +28,9 @@ NEWSPIDER_MODULE = "jobsniffer.spiders"
 ROBOTSTXT_OBEY = False
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
-#CONCURRENT_REQUESTS = 32
+# Per-domain concurrency is tuned by the adaptive middleware below, this is
+# only the overall cap
+CONCURRENT_REQUESTS = 32
 
 # Configure a delay for requests for the same website (default: 0)
 # See https://docs.scrapy.org/en/latest/topics/settings.html#download-delay
@@ -44,21 +54,93 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    "jobsniffer.middlewares.JobsnifferSpiderMiddleware": 543,
-#}
+# Closest to the spider, so that callback CPU time excludes the other
+# middlewares
+SPIDER_MIDDLEWARES = {
+    "jobsniffer.middlewares.JobsnifferSpiderMiddleware": 950,
+}
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    "jobsniffer.middlewares.JobsnifferDownloaderMiddleware": 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    # Responses go from high to low priorities. Below HttpCompression (590):
+    # sees decoded bodies; above Retry (550): sees the 429/503 responses
+    # before they are retried; above MetaRefresh (580, not shared with it so
+    # that the order does not depend on dict order): sees CAPTCHA and other
+    # interstitial pages before their meta refresh becomes a new request
+    "jobsniffer.middlewares.JobsnifferDownloaderMiddleware": 585,
+    "jobsniffer.middlewares.BrowserPoolMiddleware": 800,
+}
+
+# Per-domain adaptive concurrency (see JobsnifferDownloaderMiddleware): it
+# starts from CONCURRENT_REQUESTS_PER_DOMAIN, adds one slot per window of
+# healthy responses and backs off on 429/503/CAPTCHA or slow responses
+ADAPTIVE_CONCURRENCY_ENABLED = True
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 32
+ADAPTIVE_CONCURRENCY_WINDOW = 20
+ADAPTIVE_CONCURRENCY_LATENCY_TOLERANCE = 2.0
+ADAPTIVE_CONCURRENCY_BACKOFF = 0.5
+ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE = 0.1
+# Lower-case snippets identifying an anti-bot challenge page
+ADAPTIVE_CONCURRENCY_CAPTCHA_MARKERS = [
+    "captcha-delivery.com", "g-recaptcha", "h-captcha", "cf-challenge", 'id="captcha',
+]
+
+# Headless browser pool rendering SeleniumRequest (see BrowserPoolMiddleware)
+BROWSER_POOL_SIZE = 2
+# Rendered requests waiting for a free browser; when that many wait, the
+# engine pauses and leaves further requests in the scheduler
+BROWSER_POOL_QUEUE_SIZE = 16
+# Recycle a browser after this many pages or above this memory (needs psutil)
+BROWSER_POOL_MAX_PAGES = 50
+BROWSER_POOL_MAX_RSS_MB = 1024
+BROWSER_POOL_ARGUMENTS = ["--headless=new", "--disable-gpu", "--no-sandbox"]
+# Resources not worth downloading to read job cards
+BROWSER_POOL_BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.css",
+]
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "jobsniffer.metrics.CrawlMetrics": 500,
+    "jobsniffer.feed.JsonLinesFeed": 510,
+}
+
+# Live crawl metrics (see jobsniffer/metrics.py): JSON snapshot of each
+# running crawl (%(job)s is the crawl id, %(name)s the spider name), removed
+# when the crawl closes, refreshed every METRICS_INTERVAL seconds, and a
+# Prometheus text endpoint on http://METRICS_HOST:METRICS_PORT/metrics
+# (0 to disable; the app and bench_load turn it on)
+METRICS_ENABLED = True
+METRICS_INTERVAL = 1.0
+METRICS_FILE = "crawl_metrics/%(job)s.json"
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 0
+
+# Line-delimited JSON feed flushed after every item (see jobsniffer/feed.py),
+# e.g. "feeds/%(name)s.jsonl"; the stream_feed spider argument overrides it
+STREAM_FEED = None
+
+# Crawl job queue of the app (see jobsniffer/jobqueue.py): at most
+# JOB_QUEUE_WORKERS crawls run at once in the app process, 0 to leave the
+# queue to `python -m jobsniffer.jobqueue` worker processes
+JOB_QUEUE_DB = "jobs.sqlite"
+JOB_QUEUE_FEEDS = "feeds"
+JOB_QUEUE_WORKERS = 2
+# Each job crawls with its own JOBDIR under JOB_QUEUE_STATE: pending requests
+# in disk queues rather than in memory, seen requests and spider state kept
+# on disk, so a cancelled or interrupted job can be resumed where it stopped.
+# None keeps the crawl state in memory (jobs cannot be resumed)
+JOB_QUEUE_STATE = "crawl_state"
+# Identical searches (same source and normalized arguments) share one crawl
+# while it runs and reuse its results for RESULT_CACHE_TTL seconds; at most
+# RESULT_CACHE_SIZE results are kept, least recently used evicted first
+RESULT_CACHE_TTL = 900
+RESULT_CACHE_SIZE = 64
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -87,6 +169,17 @@ ROBOTSTXT_OBEY = False
 #HTTPCACHE_IGNORE_HTTP_CODES = []
 #HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
 
+# Persistent index of already scraped offers, used to skip their detail
+# pages on later crawls (set to None to always fetch details)
+SEEN_OFFERS_DB = "seen_offers.sqlite"
+# In incremental mode (`-a incremental=1`), stop paginating after this many
+# consecutive listing pages without any unseen offer
+INCREMENTAL_STOP_PAGES = 2
+
+# Read WTTJ listing pages from their embedded JSON state instead of
+# rendering them with Selenium (which stays as a fallback)
+WTTJ_USE_PAGE_STATE = True
+
 # Set settings whose default value is deprecated to a future-proof value
 TWISTED_REACTOR = "twisted.internet.asyncioreactor.AsyncioSelectorReactor"
 FEED_EXPORT_ENCODING = "utf-8"
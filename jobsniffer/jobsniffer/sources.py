@@ -0,0 +1,123 @@
+# Generic job-board spider
+#
+# A job board is described by a SourceAdapter (see extractors/base.py): its
+# search URL, the selectors of its listing cards and detail pages, and how
+# its listing pages are paginated. SourceSpider crawls any adapter the way
+# the spiders learned to:
+#
+# - listing pages addressed by number are all requested at once, so they
+#   download in parallel; incremental crawls walk them in order instead and
+#   stop once pages only bring known offers (incremental.py)
+# - offers already scraped are refreshed from the seen-offer index without
+#   fetching their detail page (seen.py)
+# - the listing fields ride to the detail page as the JobListing it
+#   completes, through cb_kwargs
+# - an offer repeated on several listing pages (sponsored offers) is
+#   followed once
+# - source/* stats count listing pages, cards, repeated cards and detail
+#   pages
+#
+# A new source is an adapter and a spider naming it, whose module is listed
+# in SPIDER_MODULES (settings.py):
+#
+#     class IndeedSpider(SourceSpider):
+#         name = "indeed"
+#         adapter = indeed.ADAPTER
+
+import scrapy
+
+from .extractors.base import PARALLEL
+from .incremental import SeenOffersMixin, is_true
+from .items import JobListing
+
+
+class SourceSpider(SeenOffersMixin, scrapy.Spider):
+    """Spider crawling the job board described by ``adapter``."""
+
+    adapter = None
+
+    def __init__(self, job_title=None, location=None, max_pages=5, base_url=None, incremental=False, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.job_title = job_title
+        self.location = location
+        self.max_pages = int(max_pages)
+        self.base_url = (base_url or self.adapter.base_url).rstrip('/')
+        self.incremental_requested = is_true(incremental)
+        # Offers followed by this crawl, by job id or URL
+        self.followed = set()
+
+    @property
+    def fan_out(self):
+        return self.adapter.pagination == PARALLEL and self.incremental is None
+
+    def search_url(self, page):
+        return self.adapter.search_url(self.base_url, self.job_title, self.location, page)
+
+    def listing_request(self, page):
+        return scrapy.Request(url=self.search_url(page), callback=self.parse, cb_kwargs={"page": page})
+
+    def start_requests(self):
+        for page in range(1, (self.max_pages if self.fan_out else 1) + 1):
+            yield self.listing_request(page)
+
+    def listing_cards(self, response):
+        """Listing fields of the cards of a listing page, job_url absolute."""
+        cards = []
+        for card in self.adapter.listing.extract_response(response):
+            if self.adapter.clean_card is not None:
+                card = self.adapter.clean_card(card)
+            if card is None or not card.get("job_url"):
+                continue
+            card["job_url"] = response.urljoin(card["job_url"])
+            cards.append(card)
+        return cards
+
+    def parse(self, response, page=1):
+        yield from self.follow_cards(response, self.listing_cards(response), page)
+
+    def follow_cards(self, response, cards, page):
+        """Yield known offers and detail requests, then the next listing page."""
+        stats = self.crawler.stats
+        stats.inc_value("source/listing_pages")
+        stats.inc_value("source/cards", len(cards))
+        new_offers = 0
+        for listing in cards:
+            job_url = listing.pop("job_url")
+            job_id = listing.get("job_id")
+            key = job_id or job_url
+            if key in self.followed:
+                stats.inc_value("source/repeated_cards")
+                continue
+            self.followed.add(key)
+
+            # Known offer: refresh the listing fields, keep the stored details
+            known = self.seen_offers.get(job_id, job_url) if self.seen_offers is not None else None
+            if self.incremental is not None and self.incremental.offer(job_id, job_url, listing, known):
+                new_offers += 1
+            if known is not None:
+                stats.inc_value("seen_offers/detail_skipped")
+                item = JobListing.from_dict(known)
+                item.update(listing)
+                self.seen_offers.add(item)
+                yield item
+                continue
+
+            # The listing fields ride along as the item the detail page completes
+            yield response.follow(job_url, callback=self.parse_job_details,
+                                  cb_kwargs={"item": JobListing.from_dict({**listing, "job_url": job_url})})
+
+        # In incremental mode, stop once pages only bring known offers
+        if self.incremental is not None and not self.incremental.page_done(new_offers):
+            return
+        if not self.fan_out and cards and page < self.max_pages:
+            yield self.listing_request(page + 1)
+
+    def parse_job_details(self, response, item):
+        self.crawler.stats.inc_value("source/detail_pages")
+        item.job_url = response.url
+        # Precompiled XPath, evaluated once each on the already parsed tree
+        item.update(self.adapter.detail.extract_response(response))
+        if self.seen_offers is not None:
+            self.crawler.stats.inc_value("seen_offers/detail_fetched")
+            self.seen_offers.add(item)
+        yield item
@@ -3,45 +3,33 @@ import subprocess
 import pandas as pd
 import os
 import sys
-import re
-import numpy as np
+
+# Rendre le package jobsniffer importable quand l'app est lancée depuis spiders/
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from jobsniffer.history import HistoryStore
+from jobsniffer.salary import add_salary_columns
 
 st.set_page_config(page_title="🔍 JOBSNIFFER 🔍", layout="centered")
 
 st.title("🔍 Scraper d'offres AKA JOBSNIFFER 🔍")
 
+# Historique HelloWork, partitionné par date
+@st.cache_resource
+def get_history_store():
+    store = HistoryStore("history_hellowork")
+    # Migrer l'ancien all_resultsHelloWork.csv une seule fois
+    if os.path.exists("all_resultsHelloWork.csv"):
+        store.import_csv("all_resultsHelloWork.csv")
+    return store
+
 # Champs pour les paramètres de scraping
 job_title = st.text_input("🔧 Intitulé du poste :", placeholder="Exemple : Data Analyst")
 location = st.text_input("📍 Localisation :", placeholder="Exemple : Paris")
 max_pages = st.slider("📄 Nombre de pages à scraper :", 1, 10, 3)
 
-# Fonction pour extraire et traiter les valeurs de salaire
-def extract_salary(salary_text):
-    if pd.isna(salary_text) or not isinstance(salary_text, str):
-        return None
-    
-    # Extraire les nombres de la chaîne en gérant les formats avec espace comme séparateur de milliers
-    numbers = re.findall(r'(\d+\s*\d*)', salary_text)
-    
-    if not numbers:
-        return None
-    
-    # Traiter les fourchettes salariales
-    values = []
-    for num in numbers:
-        # Enlever les espaces et convertir en nombre
-        cleaned_num = num.replace(' ', '')
-        if cleaned_num:
-            try:
-                values.append(float(cleaned_num))
-            except:
-                pass
-    
-    # Retourner la moyenne si c'est une fourchette, ou la valeur unique
-    if values:
-        return sum(values) / len(values)
-    return None
-
 if st.button("Lancer le scraping"):
     if not job_title or not location:
         st.warning("Merci de remplir les champs 'Intitulé du poste' et 'Localisation'.")
@@ -68,15 +56,10 @@ if st.button("Lancer le scraping"):
 
                 # Traiter les salaires
                 if 'salary' in data.columns:
-                    data['salary_numeric'] = data['salary'].apply(extract_salary)
+                    data = add_salary_columns(data)
 
-                # Store the resultsHelloWork in a CSV file
-                if os.path.exists("all_resultsHelloWork.csv"):
-                    existing_data = pd.read_csv("all_resultsHelloWork.csv")
-                    combined_data = pd.concat([existing_data, data])
-                    combined_data.to_csv("all_resultsHelloWork.csv", index=False)
-                else:
-                    data.to_csv("all_resultsHelloWork.csv", index=False)
+                # Store the resultsHelloWork in the history store
+                get_history_store().append(data.assign(source='HelloWork'))
 
                 # Afficher les données
                 st.subheader("📊 Résultats du scraping")
@@ -193,8 +176,8 @@ if st.button("Lancer le scraping"):
 
 # Ajouter un onglet pour comparer les résultats
 st.subheader("🔍 Comparaison des recherches")
-if os.path.exists("all_resultsHelloWork.csv"):
-    all_data = pd.read_csv("all_resultsHelloWork.csv")
+all_data = get_history_store().load(columns=['job_title', 'location', 'contract_type', 'salary_numeric'])
+if not all_data.empty:
     
     # Générer les options de comparaison
     job_titles = sorted(all_data['job_title'].unique().tolist()) if 'job_title' in all_data.columns else []
@@ -227,7 +210,7 @@ if os.path.exists("all_resultsHelloWork.csv"):
         elif compare_metric == "Salaire moyen" and 'salary_numeric' in filtered_data.columns:
             # Traiter les salaires si ce n'est pas déjà fait
             if 'salary_numeric' not in filtered_data.columns and 'salary' in filtered_data.columns:
-                filtered_data['salary_numeric'] = filtered_data['salary'].apply(extract_salary)
+                filtered_data = add_salary_columns(filtered_data)
                 
             # Grouper par région et calculer la moyenne
             salary_by_region = filtered_data.groupby('location')['salary_numeric'].mean().reset_index()
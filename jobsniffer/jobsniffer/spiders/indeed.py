@@ -1,10 +1,7 @@
-import scrapy
+from ..extractors import indeed
+from ..sources import SourceSpider
 
 
-class IndeedSpider(scrapy.Spider):
+class IndeedSpider(SourceSpider):
     name = "indeed"
-    allowed_domains = ["indeed.fr"]
-    start_urls = ["https://indeed.fr"]
-
-    def parse(self, response):
-        pass
+    adapter = indeed.ADAPTER
@@ -1,12 +1,28 @@
 import streamlit as st
-import subprocess
 import pandas as pd
 import os
 import sys
-import re
-import numpy as np
+import time
+import uuid
 import plotly.express as px
 
+# Rendre le package jobsniffer importable quand l'app est lancée depuis spiders/
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from jobsniffer.feed import JsonLinesTail
+from jobsniffer.history import HistoryCache, HistoryStore
+from jobsniffer.jobqueue import (CANCELLED, DONE, FAILED, FINISHED, INTERRUPTED, QUEUED, RUNNING, CrawlWorkerPool,
+                                  JobQueue)
+from jobsniffer.runner import CrawlService
+from scrapy.utils.project import get_project_settings
+from jobsniffer.dedup import add_duplicate_columns, offer_keys
+from jobsniffer.gazetteer import add_location_columns, get_gazetteer
+from jobsniffer.salary import add_salary_columns
+from jobsniffer.titles import add_title_family
+from jobsniffer.search import SearchIndex
+
 st.set_page_config(page_title="🔍 JOBSNIFFER 🔍", layout="centered")
 
 st.title("🔍 Scraper d'offres AKA JOBSNIFFER 🔍")
@@ -18,6 +34,200 @@ def ensure_numeric(df, column_name):
         df[column_name] = pd.to_numeric(df[column_name], errors='coerce')
     return df
 
+# Métriques live d'un crawl (jobsniffer/metrics.py) : une ligne par source
+# et une ligne par callback pour voir où passe le temps
+def metrics_tables(metrics_by_source):
+    overview, callbacks = [], []
+    for source, metrics in metrics_by_source.items():
+        if not metrics:
+            continue
+        overview.append({
+            'Source': source,
+            'Offres/s': metrics['items_per_s'],
+            'Requêtes': metrics['requests'],
+            'Téléchargé (Ko)': round(metrics['bytes_downloaded'] / 1024),
+            "File d'attente": metrics['queue_depth'],
+            'En cours': metrics['in_progress'],
+            'Doublons': metrics['duplicate_items'] + metrics['duplicate_requests'],
+            'Rejetées': metrics['items_dropped'],
+        })
+        for name, data in metrics['callbacks'].items():
+            callbacks.append({
+                'Source': source,
+                'Callback': name,
+                'Appels': data['calls'],
+                'CPU (ms/appel)': data['cpu_ms_per_call'],
+                'CPU total (s)': data['cpu_seconds'],
+                'Latence p50 (ms)': data['latency']['p50_ms'],
+                'Latence p99 (ms)': data['latency']['p99_ms'],
+            })
+    return pd.DataFrame(overview), pd.DataFrame(callbacks)
+
+# Moteur de crawl partagé entre les reruns et les sessions Streamlit
+@st.cache_resource
+def get_crawl_service():
+    service = CrawlService()
+    # Métriques Prometheus des crawls sur http://127.0.0.1:9410/metrics
+    service.settings.set("METRICS_PORT", 9410)
+    service.start()
+    return service
+
+# File de crawls partagée par toutes les sessions, servie par un pool de
+# JOB_QUEUE_WORKERS crawls simultanés au plus
+@st.cache_resource
+def get_job_queue():
+    settings = get_project_settings()
+    return JobQueue(settings.get("JOB_QUEUE_DB"), feed_dir=settings.get("JOB_QUEUE_FEEDS"),
+                    cache_ttl=settings.getint("RESULT_CACHE_TTL"), cache_size=settings.getint("RESULT_CACHE_SIZE"),
+                    state_dir=settings.get("JOB_QUEUE_STATE"))
+
+@st.cache_resource
+def get_worker_pool():
+    service = get_crawl_service()
+    pool = CrawlWorkerPool(get_job_queue(), service, workers=service.settings.getint("JOB_QUEUE_WORKERS"))
+    # 0 : la file est servie par des processus `python -m jobsniffer.jobqueue`
+    if pool.workers > 0:
+        pool.start()
+    return pool
+
+# Historique des offres, partitionné par date et par source. Département et
+# région sont calculés à l'ingestion (gazetteer), ils sont lus tels quels
+HISTORY_COLUMNS = ['job_title', 'title_family', 'location', 'departement', 'region', 'contract_type',
+                   'salary_annual_eur', 'source']
+
+@st.cache_resource
+def get_history_store():
+    store = HistoryStore("history")
+    # Migrer l'ancien all_results.csv une seule fois
+    if os.path.exists("all_results.csv"):
+        store.import_csv("all_results.csv")
+    # Construire le cube d'agrégats des historiques existants une seule fois
+    if not store.rollup.exists():
+        store.rollup.rebuild(store)
+    return store
+
+# Copie en mémoire de l'historique partagée entre reruns et sessions : seuls
+# les segments écrits depuis le dernier rerun sont relus
+@st.cache_resource
+def get_history_cache():
+    return HistoryCache(get_history_store(), columns=HISTORY_COLUMNS)
+
+# Cube d'agrégats (rollup) tenu à jour à chaque ajout dans l'historique : la
+# section comparaison lit ces lignes pré-agrégées et non les offres brutes, son
+# temps de rendu ne dépend donc pas de la taille de l'historique. Le paramètre
+# version sert de clé de cache.
+@st.cache_data(max_entries=4)
+def load_rollup(version):
+    rollup = get_history_store().load_rollup()
+    for column in ('location', 'departement', 'region', 'job_title', 'contract_type', 'source'):
+        rollup[column] = rollup[column].astype('category')
+    return rollup
+
+# Agrégats de la section comparaison, recalculés seulement quand l'historique
+# change (version) ou que la sélection change. Le paramètre _rollup n'est pas
+# haché par Streamlit, la version sert de clé.
+@st.cache_data(max_entries=16)
+def comparison_options(_rollup, version):
+    job_titles = sorted(_rollup['job_title'].dropna().unique().tolist())
+    # Régions puis départements présents dans l'historique, e.g. "Rhône (69)"
+    regions = sorted(_rollup['region'].dropna().unique().tolist())
+    departements = sorted(_rollup['departement'].dropna().unique().tolist())
+    areas = regions + [get_gazetteer().departement_label(name) for name in departements]
+    sources = sorted(_rollup['source'].dropna().unique().tolist())
+    return job_titles, areas, sources
+
+def area_filter(selection):
+    """Colonne et valeur d'une zone : "Rhône (69)" est un département, sinon une région."""
+    if selection.endswith(")") and " (" in selection:
+        return 'departement', selection.rsplit(" (", 1)[0]
+    return 'region', selection
+
+def filter_history(history, compare_type, selection):
+    if compare_type == "Par région" and selection != "Tous les postes":
+        return history[history['job_title'] == selection]
+    if compare_type == "Par intitulé de poste" and selection != "Toutes les régions":
+        # Égalité sur les codes des catégories département / région (gazetteer),
+        # "Paris 15e - 75" et "Paris - 75" sont tous deux dans Paris (75)
+        column, value = area_filter(selection)
+        return history[history[column] == value]
+    return history
+
+@st.cache_data(max_entries=128, ttl=3600)
+def comparison_table(_rollup, version, compare_type, selection, metric):
+    data = filter_history(_rollup, compare_type, selection)
+    group = 'location' if compare_type == "Par région" else 'job_title'
+    label = 'Région' if compare_type == "Par région" else 'Intitulé du poste'
+    if metric == "Nombre d'offres":
+        # Offres uniques : une offre publiée sur HelloWork et WTTJ, ou
+        # retrouvée par un scraping ultérieur, compte une seule fois
+        counts = data.groupby(group, observed=True)['unique_count'].sum().sort_values(ascending=False, kind='stable')
+        table = counts[counts > 0].reset_index()
+        table.columns = [label, 'Nombre d\'offres']
+    elif metric == "Salaire moyen":
+        # Moyenne pondérée des salaires annuels en euros : somme des salaires /
+        # nombre de salaires connus
+        sums = data.groupby(group, observed=True)[['salary_eur_sum', 'salary_eur_count']].sum()
+        table = (sums['salary_eur_sum'] / sums['salary_eur_count'].where(sums['salary_eur_count'] > 0)).reset_index()
+        table.columns = [label, 'Salaire moyen']
+        table = table.dropna()
+        if compare_type == "Par intitulé de poste":
+            table = table.sort_values(by='Salaire moyen', ascending=False)
+    else:
+        contract_by_group = data.groupby([group, 'contract_type'], observed=True)['unique_count'].sum().reset_index()
+        contract_by_group.columns = [label, 'Type de contrat', 'Nombre']
+        contract_by_group = contract_by_group.astype({label: str, 'Type de contrat': str})
+        # Pivoter pour obtenir une colonne par type de contrat
+        return contract_by_group.pivot(index=label, columns='Type de contrat', values='Nombre').fillna(0)
+    return table.astype({label: str})
+
+STATUS_LABELS = {
+    QUEUED: "en file d'attente ⏸️",
+    RUNNING: "en cours ⏳",
+    DONE: "terminé ✅",
+    FAILED: "échec ❌",
+    CANCELLED: "annulé ⏹️",
+}
+
+# Identifiant de la session, pour répartir équitablement le pool entre utilisateurs
+def session_user():
+    if 'user_id' not in st.session_state:
+        st.session_state['user_id'] = uuid.uuid4().hex
+    return st.session_state['user_id']
+
+# Suivi des crawls de la session : rafraîchi toutes les secondes sans bloquer
+# la session, seules les nouvelles lignes des flux JSON Lines sont lues. Toute
+# la page est relancée quand tous les crawls sont terminés.
+@st.fragment(run_every=1.0)
+def scrape_progress(scrape):
+    queue = get_job_queue()
+    rows = {source: queue.get(job_id, session_user()) for source, job_id in scrape['jobs'].items()}
+    if all(row['status'] in FINISHED for row in rows.values()):
+        st.rerun()
+    live_frames = []
+    for source, row in rows.items():
+        tail = scrape['feeds'].setdefault(source, JsonLinesTail(row['feed']))
+        tail.poll()
+        st.progress(row['progress'], text=f"{source} : {tail.rows} offres ({STATUS_LABELS[row['status']]})")
+        if tail.rows:
+            live_frames.append(tail.frame().assign(source=source))
+    if st.button("⏹️ Annuler le scraping"):
+        # Un crawl partagé avec une recherche identique continue pour elle
+        for job_id in scrape['jobs'].values():
+            queue.cancel(job_id, session_user())
+    if live_frames:
+        live_data = pd.concat(live_frames).reset_index(drop=True)
+        st.metric("Offres récupérées", len(live_data))
+        st.dataframe(live_data, use_container_width=True)
+    with st.expander("📈 Métriques du crawl", expanded=True):
+        overview, callbacks = metrics_tables({source: row['metrics'] for source, row in rows.items()})
+        if not overview.empty:
+            st.dataframe(overview, use_container_width=True, hide_index=True)
+        if not callbacks.empty:
+            st.dataframe(callbacks, use_container_width=True, hide_index=True)
+        counts = queue.counts()
+        st.caption(f"Pool partagé : {counts.get(RUNNING, 0)} crawls en cours, "
+                   f"{counts.get(QUEUED, 0)} en file d'attente")
+
 # Champs pour les paramètres de scraping
 job_title = st.text_input("🔧 Intitulé du poste :", placeholder="Exemple : Data Analyst")
 location = st.text_input("📍 Localisation :", placeholder="Exemple : Paris")
@@ -25,138 +235,162 @@ max_pages = st.slider("📄 Nombre de pages à scraper :", 1, 10, 3)
 
 # Sélection des sources
 st.write("### 🌐 Sources de données")
-col1, col2 = st.columns(2)
+col1, col2, col3 = st.columns(3)
 with col1:
     scrape_hellowork = st.checkbox("HelloWork", value=True)
 with col2:
     scrape_wttj = st.checkbox("Welcome to the Jungle", value=False)
+with col3:
+    scrape_indeed = st.checkbox("Indeed", value=False)
 
-# Fonction pour extraire et traiter les valeurs de salaire
-def extract_salary(salary_text):
-    if pd.isna(salary_text) or not isinstance(salary_text, str):
-        return None
-    
-    # Extraire les nombres de la chaîne en gérant les formats avec espace comme séparateur de milliers
-    numbers = re.findall(r'(\d+\s*\d*)', salary_text)
-    
-    if not numbers:
-        return None
-    
-    # Traiter les fourchettes salariales
-    values = []
-    for num in numbers:
-        # Enlever les espaces et convertir en nombre
-        cleaned_num = num.replace(' ', '')
-        if cleaned_num:
-            try:
-                values.append(float(cleaned_num))
-            except:
-                pass
-    
-    # Retourner la moyenne si c'est une fourchette, ou la valeur unique
-    if values:
-        return sum(values) / len(values)
-    return None
+# Mode incrémental : s'arrêter dès que les pages ne contiennent plus que des offres connues
+incremental = st.checkbox("Mode incrémental (recherche déjà lancée)", value=False)
 
 if st.button("Lancer le scraping"):
     if not job_title or not location:
         st.warning("Merci de remplir les champs 'Intitulé du poste' et 'Localisation'.")
-    elif not scrape_hellowork and not scrape_wttj:
+    elif not scrape_hellowork and not scrape_wttj and not scrape_indeed:
         st.warning("Veuillez sélectionner au moins une source de données.")
     else:
-        # Dictionnaire pour stocker les résultats de chaque source
-        all_results = {}
-        
-        # Scraper HelloWork si sélectionné
-        if scrape_hellowork:
-            with st.spinner("Scraping HelloWork en cours... ⏳"):
-                # Supprimer le fichier précédent s'il existe
-                if os.path.exists("results_hellowork.json"):
-                    os.remove("results_hellowork.json")
-
-                # Lancer le processus Scrapy pour HelloWork
-                result_hw = subprocess.run([
-                    sys.executable, "-m", "scrapy", "crawl", "hellowork",
-                    "-a", f"job_title={job_title}",
-                    "-a", f"location={location}",
-                    "-a", f"max_pages={max_pages}",
-                    "-o", "results_hellowork.json"
-                ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-                # Vérification du résultat du scraping
-                if result_hw.returncode == 0 and os.path.exists("results_hellowork.json"):
-                    with open("results_hellowork.json", encoding="utf-8") as f:
-                        data_hw = pd.read_json(f)
-                        data_hw['source'] = 'HelloWork'
-                        all_results['HelloWork'] = data_hw
-                        st.success(f"HelloWork: {len(data_hw)} offres trouvées")
-                else:
-                    st.error("Une erreur est survenue pendant le scraping de HelloWork.")
-                    with st.expander("Détails de l'erreur"):
-                        st.code(result_hw.stderr)
-        
-        # Scraper Welcome to the Jungle si sélectionné
-        if scrape_wttj:
-            with st.spinner("Scraping Welcome to the Jungle en cours... ⏳"):
-                # Supprimer le fichier précédent s'il existe
-                if os.path.exists("results_wttj.json"):
-                    os.remove("results_wttj.json")
-
-                # Lancer le processus Scrapy pour WTTJ
-                result_wttj = subprocess.run([
-                    sys.executable, "-m", "scrapy", "crawl", "wttj",
-                    "-a", f"job_title={job_title}",
-                    "-a", f"location={location}",
-                    "-a", f"max_pages={max_pages}",
-                    "-o", "results_wttj.json"
-                ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-                # Vérification du résultat du scraping
-        if result_wttj.returncode == 0 and os.path.exists("results_wttj.json"):
-                    with open("results_wttj.json", encoding="utf-8") as f:
-                        data_wttj = pd.read_json(f)
-                        data_wttj['source'] = 'WTTJ'
-                        all_results['WTTJ'] = data_wttj
-                        st.success(f"WTTJ: {len(data_wttj)} offres trouvées")
-        else:
-                    st.error("Une erreur est survenue pendant le scraping de Welcome to the Jungle.")
-                    with st.expander("Détails de l'erreur"):
-                        st.code(result_wttj.stderr)
-        
+        # Mettre les sources sélectionnées en file : elles démarrent dès qu'un
+        # worker du pool partagé est libre, la session ne fait que les suivre
+        get_worker_pool()
+        queue = get_job_queue()
+        jobs = {}
+        for source, spider, selected in (('HelloWork', "hellowork", scrape_hellowork), ('WTTJ', "wttj", scrape_wttj),
+                                         ('Indeed', "indeed", scrape_indeed)):
+            if selected:
+                jobs[source] = queue.submit(session_user(), spider, job_title=job_title, location=location,
+                                            max_pages=max_pages, incremental=incremental)
+        st.session_state['scrape'] = {'jobs': jobs, 'job_title': job_title, 'location': location, 'feeds': {}}
+
+# Efficacité du cache des recherches partagé entre sessions
+cache_stats = get_job_queue().cache_stats()
+if cache_stats['hits']:
+    st.caption(f"Cache des recherches : {cache_stats['hit_rate']:.0%} des recherches servies sans nouveau crawl, "
+               f"{cache_stats['saved_seconds']:.0f} s de crawl évitées")
+
+scrape = st.session_state.get('scrape')
+if scrape is not None:
+    queue = get_job_queue()
+    rows = {source: queue.get(job_id, session_user()) for source, job_id in scrape['jobs'].items()}
+    if not all(row['status'] in FINISHED for row in rows.values()):
+        scrape_progress(scrape)
+    else:
+        search_title, search_location = scrape['job_title'], scrape['location']
+        labels = {'HelloWork': "HelloWork", 'WTTJ': "Welcome to the Jungle", 'Indeed': "Indeed"}
+        if 'results' not in scrape:
+            # Lire une seule fois la fin des flux JSON Lines, le flux est fermé
+            # à la fin du crawl
+            scrape['results'] = {}
+            for source, row in rows.items():
+                if row['status'] == FAILED and row['error'] != INTERRUPTED:
+                    continue
+                tail = scrape['feeds'].setdefault(source, JsonLinesTail(row['feed']))
+                tail.poll()
+                data = tail.frame().copy()
+                data['source'] = source
+                scrape['results'][source] = data
+
+        # Dictionnaire des résultats de chaque source
+        all_results = scrape['results']
+        for source, row in rows.items():
+            stats = row['stats']
+            if row['status'] == FAILED and row['error'] == INTERRUPTED:
+                st.warning(f"{source} : scraping interrompu (arrêt du serveur), "
+                           f"{len(all_results[source])} offres récupérées avant l'arrêt")
+                continue
+            if row['status'] == FAILED:
+                st.error(f"Une erreur est survenue pendant le scraping de {labels[source]}.")
+                with st.expander("Détails de l'erreur"):
+                    st.code(row['error'] or "")
+                continue
+            data = all_results[source]
+            if row['user'] != session_user():
+                # Crawl partagé avec une recherche identique (en cours ou récente)
+                age = (time.time() - row['finished_at']) / 60
+                st.info(f"{source} : résultats d'une recherche identique terminée il y a {age:.0f} min, "
+                        f"aucun nouveau crawl")
+            if row['status'] == CANCELLED:
+                st.warning(f"{source} : scraping annulé, {len(data)} offres récupérées avant l'arrêt")
+                continue
+            if 'incremental/new' in stats:
+                disappeared = stats.get('incremental/disappeared', 'n/a')
+                st.info(f"{source} : {stats['incremental/new']} nouvelles, "
+                        f"{stats['incremental/updated']} mises à jour, {disappeared} disparues")
+            skipped = stats.get('seen_offers/detail_skipped', 0)
+            if skipped:
+                st.success(f"{source}: {len(data)} offres trouvées ({skipped} déjà connues, pages détail évitées)")
+            else:
+                st.success(f"{source}: {len(data)} offres trouvées")
+
+        # Un crawl annulé ou interrompu reprend là où il s'est arrêté : même
+        # flux, requêtes en attente et pages déjà vues relues depuis le disque
+        resumable = [row['id'] for row in rows.values() if queue.resumable(row)]
+        if resumable and st.button("▶️ Reprendre le scraping"):
+            get_worker_pool()
+            for job_id in resumable:
+                queue.resume(job_id, session_user())
+            scrape.pop('results')
+            scrape.pop('combined', None)
+            st.rerun()
+
         # Combiner tous les résultats en un seul DataFrame
         if all_results:
-            combined_data = pd.concat(all_results.values()).reset_index(drop=True)
-            
-            # Traiter les salaires
-            if 'salary' in combined_data.columns:
-                combined_data['salary_numeric'] = combined_data['salary'].apply(extract_salary)
-                # S'assurer que salary_numeric est bien numérique
-                combined_data = ensure_numeric(combined_data, 'salary_numeric')
-            
-            # Créer une colonne de date de publication unifiée
-            if 'publication_date' in combined_data.columns:
-                try:
-                    combined_data['publication_date'] = pd.to_datetime(combined_data['publication_date'], errors='coerce')
-                except:
-                    pass
-            
-            # Enregistrer les résultats combinés
-            combined_filename = f"results_{job_title.replace(' ', '_')}_{location.replace(' ', '_')}.json"
-            combined_data.to_json(combined_filename, orient='records', indent=2)
-            
-            # Stocker dans all_results.csv pour comparaisons futures
-            if os.path.exists("all_results.csv"):
-                existing_data = pd.read_csv("all_results.csv")
-                # Assurer que les colonnes numériques sont correctement typées
-                if 'salary_numeric' in existing_data.columns:
-                    existing_data = ensure_numeric(existing_data, 'salary_numeric')
-                full_data = pd.concat([existing_data, combined_data])
-                full_data.to_csv("all_results.csv", index=False)
-            else:
-                combined_data.to_csv("all_results.csv", index=False)
+            combined_filename = f"results_{search_title.replace(' ', '_')}_{search_location.replace(' ', '_')}.json"
+            if 'combined' not in scrape:
+                combined_data = pd.concat(all_results.values()).reset_index(drop=True)
+
+                # Traiter les salaires
+                if 'salary' in combined_data.columns:
+                    # Fourchette, unité et salaire annuel en euros, en une passe vectorisée
+                    combined_data = add_salary_columns(combined_data)
+
+                # Ville, département et région normalisés (gazetteer hors ligne)
+                combined_data = add_location_columns(combined_data)
+
+                # Famille d'intitulés ("Data analyst (F/H) - CDI" -> "Data Analyst"),
+                # regroupée avec les intitulés déjà connus de l'historique
+                combined_data = add_title_family(combined_data, get_history_store().titles)
+
+                # Doublons entre sources et avec l'historique (MinHash / LSH sur
+                # l'entreprise et le texte de l'offre). Les offres déjà traitées
+                # de ces crawls (scraping repris, même recherche relue depuis une
+                # autre session) gardent leur statut et ne sont pas réenregistrées
+                keys = offer_keys(combined_data, combined_data['source'].map(scrape['jobs']))
+                ingested = keys.isin(list(get_history_store().duplicates.lookup(keys.tolist()))).to_numpy()
+                combined_data = add_duplicate_columns(combined_data, get_history_store().duplicates, keys=keys)
+
+                # Créer une colonne de date de publication unifiée
+                if 'publication_date' in combined_data.columns:
+                    try:
+                        combined_data['publication_date'] = pd.to_datetime(combined_data['publication_date'], errors='coerce')
+                    except:
+                        pass
+
+                # Enregistrer les résultats combinés
+                combined_data.to_json(combined_filename, orient='records', indent=2)
+
+                # Ajouter les nouvelles offres à l'historique pour comparaisons futures,
+                # une seule fois même si la page est relancée (filtre, comparaison...)
+                # ou le scraping repris : les premières offres de chaque flux y sont déjà
+                saved = scrape.setdefault('saved', {})
+                rank = combined_data.groupby('source').cumcount()
+                get_history_store().append(combined_data[(rank >= combined_data['source'].map(saved).fillna(0))
+                                                         & ~ingested])
+                scrape['saved'] = combined_data['source'].value_counts().to_dict()
+                scrape['combined'] = combined_data
+                # Index de recherche à reconstruire pour ces nouveaux résultats
+                scrape.pop('search_index', None)
+            combined_data = scrape['combined']
             
             # Afficher les résultats
             st.subheader(f"📊 Résultats du scraping ({len(combined_data)} offres)")
+            # Une offre présente sur plusieurs sources partage son dedup_cluster_id
+            unique_offers = combined_data['dedup_cluster_id'].nunique() + combined_data['dedup_cluster_id'].isna().sum()
+            if unique_offers < len(combined_data):
+                st.caption(f"{unique_offers} offres uniques, {len(combined_data) - unique_offers} publiées sur "
+                           f"plusieurs sources ou en double")
             
             # Afficher les statistiques par source si plusieurs sources ont été utilisées
             if len(all_results) > 1:
@@ -174,9 +408,18 @@ if st.button("Lancer le scraping"):
             
             with tab1:
                 # Add search filter
-                search_query = st.text_input("🔍 Filtrer les résultats:", "")
+                search_query = st.text_input(
+                    "🔍 Filtrer les résultats:", "",
+                    help="Préfixes acceptés, accents ignorés. Champs : poste:, entreprise:, lieu:, contrat:, "
+                         "qualifications:, missions: (ex. `data contrat:cdi lieu:paris`)"
+                )
                 if search_query:
-                    filtered_data = combined_data[combined_data.astype(str).apply(lambda row: row.str.contains(search_query, case=False).any(), axis=1)]
+                    # Index inversé sur titre, entreprise, lieu, contrat, missions et qualifications,
+                    # résultats classés par pertinence. Construit une seule fois par jeu de
+                    # résultats et gardé dans la session : chaque saisie n'évalue que la requête
+                    if 'search_index' not in scrape:
+                        scrape['search_index'] = SearchIndex(combined_data)
+                    filtered_data = scrape['search_index'].filter(combined_data, search_query)
                     st.dataframe(filtered_data, use_container_width=True)
                     st.info(f"{len(filtered_data)} offres correspondant aux critères sur {len(combined_data)} au total")
                 else:
@@ -186,6 +429,17 @@ if st.button("Lancer le scraping"):
                 if len(all_results) > 1:
                     # Afficher des statistiques comparatives entre les sources
                     st.write("#### Comparaison des plateformes de recrutement")
+
+                    # 0. Offres publiées sur plusieurs sources (même dedup_cluster_id)
+                    sources_per_cluster = combined_data.groupby('dedup_cluster_id')['source'].nunique()
+                    shared = combined_data['dedup_cluster_id'].map(sources_per_cluster).gt(1)
+                    overlap = pd.DataFrame({
+                        'Offres': combined_data.groupby('source').size(),
+                        'Aussi sur une autre source': shared.groupby(combined_data['source']).sum(),
+                    })
+                    overlap['Exclusives'] = overlap['Offres'] - overlap['Aussi sur une autre source']
+                    st.write("**Offres communes aux sources**")
+                    st.dataframe(overlap.rename_axis('Source'), use_container_width=True)
                     
                     # 1. Répartition des types de contrat par source
                     if 'contract_type' in combined_data.columns:
@@ -314,23 +568,19 @@ if st.button("Lancer le scraping"):
             st.download_button(
                 "⬇️ Télécharger les résultats en JSON",
                 data=open(combined_filename, "rb"),
-                file_name=f"jobsniffer_{job_title}_{location}.json"
+                file_name=f"jobsniffer_{search_title}_{search_location}.json"
             )
         else:
             st.error("Aucune donnée n'a été récupérée.")
 
 # Ajouter un onglet pour comparer les résultats
 st.subheader("🔍 Comparaison des recherches")
-if os.path.exists("all_results.csv"):
-    all_data = pd.read_csv("all_results.csv")
-    
-    # Assurer que les colonnes numériques sont correctement typées
-    all_data = ensure_numeric(all_data, 'salary_numeric')
-    
+# Cube d'agrégats relu seulement quand un ajout l'a modifié
+version = get_history_store().rollup.version()
+rollup = load_rollup(version)
+if not rollup.empty:
     # Générer les options de comparaison
-    job_titles = sorted(all_data['job_title'].unique().tolist()) if 'job_title' in all_data.columns else []
-    locations = sorted(all_data['location'].unique().tolist()) if 'location' in all_data.columns else []
-    sources = sorted(all_data['source'].dropna().unique().tolist()) if 'source' in all_data.columns else []
+    job_titles, areas, sources = comparison_options(rollup, version)
     
     # Type de comparaison
     compare_options = ["Par région", "Par intitulé de poste"]
@@ -347,98 +597,76 @@ if os.path.exists("all_results.csv"):
         with col2:
             compare_metric = st.selectbox("Métrique", ["Nombre d'offres", "Salaire moyen", "Types de contrat"])
         
-        # Filtrer les données
-        if compare_job != "Tous les postes":
-            filtered_data = all_data[all_data['job_title'] == compare_job]
-        else:
-            filtered_data = all_data
-        
-        # Effectuer les comparaisons
+        # Effectuer les comparaisons (agrégats mis en cache)
+        result = comparison_table(rollup, version, compare_type, compare_job, compare_metric)
         if compare_metric == "Nombre d'offres":
-            region_counts = filtered_data['location'].value_counts().reset_index()
-            region_counts.columns = ['Région', 'Nombre d\'offres']
-            st.bar_chart(region_counts.set_index('Région'))
-            st.dataframe(region_counts, hide_index=True, use_container_width=True)
+            st.bar_chart(result.set_index('Région'))
+            st.dataframe(result, hide_index=True, use_container_width=True)
             
-        elif compare_metric == "Salaire moyen" and 'salary_numeric' in filtered_data.columns:
-            # S'assurer que salary_numeric est numérique
-            filtered_data = ensure_numeric(filtered_data, 'salary_numeric')
-                
-            # Grouper par région et calculer la moyenne
-            salary_by_region = filtered_data.groupby('location')['salary_numeric'].mean().reset_index()
-            salary_by_region.columns = ['Région', 'Salaire moyen']
-            salary_by_region = salary_by_region.dropna()
-            
-            if not salary_by_region.empty:
-                st.bar_chart(salary_by_region.set_index('Région'))
-                st.dataframe(salary_by_region, hide_index=True, use_container_width=True)
+        elif compare_metric == "Salaire moyen":
+            if not result.empty:
+                st.bar_chart(result.set_index('Région'))
+                st.dataframe(result, hide_index=True, use_container_width=True)
             else:
                 st.write("Pas de données salariales disponibles pour cette comparaison.")
                 
         elif compare_metric == "Types de contrat":
-            contract_by_region = filtered_data.groupby(['location', 'contract_type']).size().reset_index()
-            contract_by_region.columns = ['Région', 'Type de contrat', 'Nombre']
-            
-            # Pivoter pour obtenir une colonne par type de contrat
-            pivot_data = contract_by_region.pivot(index='Région', columns='Type de contrat', values='Nombre').fillna(0)
-            
             # Afficher la table
             st.write("**Répartition des types de contrat par région**")
-            st.dataframe(pivot_data, use_container_width=True)
+            st.dataframe(result, use_container_width=True)
             
             # Créer un graphique empilé
-            st.bar_chart(pivot_data)
+            st.bar_chart(result)
     
     elif compare_type == "Par intitulé de poste":
         with col1:
-            compare_location = st.selectbox("Région à comparer", ["Toutes les régions"] + locations)
+            compare_location = st.selectbox("Région à comparer", ["Toutes les régions"] + areas)
         with col2:
             compare_metric = st.selectbox("Métrique", ["Nombre d'offres", "Salaire moyen", "Types de contrat"], key="metric_by_job")
         
-        # Filtrer les données
-        if compare_location != "Toutes les régions":
-            # Permet une recherche partielle dans les locations (e.g. "Paris" trouvera "Paris - 75")
-            filtered_data = all_data[all_data['location'].str.contains(compare_location, case=False, na=False)]
-        else:
-            filtered_data = all_data
-        
-        # Effectuer les comparaisons
+        # Effectuer les comparaisons (agrégats mis en cache)
+        result = comparison_table(rollup, version, compare_type, compare_location, compare_metric)
         if compare_metric == "Nombre d'offres":
-            job_counts = filtered_data['job_title'].value_counts().reset_index()
-            job_counts.columns = ['Intitulé du poste', 'Nombre d\'offres']
-            
             # Afficher le graphique et la table
-            st.bar_chart(job_counts.set_index('Intitulé du poste'))
-            st.dataframe(job_counts, hide_index=True, use_container_width=True)
-            
-        elif compare_metric == "Salaire moyen" and 'salary_numeric' in filtered_data.columns:
-            # S'assurer que salary_numeric est numérique
-            filtered_data = ensure_numeric(filtered_data, 'salary_numeric')
+            st.bar_chart(result.set_index('Intitulé du poste'))
+            st.dataframe(result, hide_index=True, use_container_width=True)
             
-            # Grouper par poste et calculer la moyenne
-            salary_by_job = filtered_data.groupby('job_title')['salary_numeric'].mean().reset_index()
-            salary_by_job.columns = ['Intitulé du poste', 'Salaire moyen']
-            salary_by_job = salary_by_job.dropna()
-            
-            if not salary_by_job.empty:
-                salary_by_job = salary_by_job.sort_values(by='Salaire moyen', ascending=False)
-                st.bar_chart(salary_by_job.set_index('Intitulé du poste'))
-                st.dataframe(salary_by_job, hide_index=True, use_container_width=True)
+        elif compare_metric == "Salaire moyen":
+            if not result.empty:
+                st.bar_chart(result.set_index('Intitulé du poste'))
+                st.dataframe(result, hide_index=True, use_container_width=True)
                 
                 # Ajouter une visualisation supplémentaire - Box plot si possible
                 st.write("**Distribution des salaires par poste**")
                 try:
-                    
+                    # Seule vue qui a besoin des offres brutes : l'historique en
+                    # cache, mis à jour avec les seuls nouveaux segments
+                    all_data = get_history_cache().refresh()
+                    filtered_data = filter_history(all_data, compare_type, compare_location)
+                    # Salaires annuels en euros, comme le tableau (cube d'agrégats)
+                    salaries = filtered_data.dropna(subset=['salary_annual_eur'])
+                    # Même regroupement que le tableau : la famille d'intitulés,
+                    # l'intitulé brut pour les offres antérieures aux familles
+                    family = salaries['title_family'].astype(object)
+                    salaries = pd.DataFrame({
+                        'job_title': family.where(family.notna(), salaries['job_title'].astype(object)).astype(str),
+                        'salary_annual_eur': salaries['salary_annual_eur'],
+                    })
                     fig = px.box(
-                        filtered_data.dropna(subset=['salary_numeric']), 
+                        salaries, 
                         x='job_title', 
-                        y='salary_numeric',
+                        y='salary_annual_eur',
                         title="Distribution des salaires par poste",
-                        labels={"job_title": "Intitulé du poste", "salary_numeric": "Salaire"}
+                        labels={"job_title": "Intitulé du poste", "salary_annual_eur": "Salaire annuel (€)"}
                     )
                     st.plotly_chart(fig, use_container_width=True)
                 except Exception as e:
                     st.write("Erreur lors de la génération du box plot:", str(e))
+        
+        elif compare_metric == "Types de contrat":
+            st.write("**Répartition des types de contrat par poste**")
+            st.dataframe(result, use_container_width=True)
+            st.bar_chart(result)
                     
     elif compare_type == "Par source":
         # Code pour comparer par source
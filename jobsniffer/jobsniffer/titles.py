@@ -0,0 +1,226 @@
+# Job title families
+#
+# The job boards decorate the same job in many ways: "Data Analyst H/F",
+# "Data analyst (F/H) - CDI", "Data Analyst Confirmé - Paris". Grouping on the
+# raw job_title gives tens of thousands of groups for a few hundred jobs.
+#
+# add_title_family derives a categorical title_family column at ingest:
+#
+#   1. canonical_titles strips gender markers, contract types, seniority,
+#      parenthesized remarks and punctuation, once per distinct title;
+#   2. TitleFamilies clusters the canonical titles with MinHash / LSH over
+#      their word stems (see minhash.py), so that variants in spelling, word
+#      order or filler words ("Analyste Data", "Data Analysts") share a
+#      family.
+#
+# The families are kept in SQLite next to the history, so that each ingest
+# only clusters the titles never seen before against the known ones, and a
+# title keeps its family from one scrape to the next. A family is named after
+# the most frequent cleaned title it started with.
+
+import sqlite3
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .minhash import MinHasher, band_keys, candidate_pairs, connected_components, hash_shingles, similarity
+from .search import normalize
+
+NUM_PERM = 128
+BANDS = 32
+# Estimated Jaccard similarity of the words above which two titles are linked
+THRESHOLD = 0.85
+
+# Patterns applied to the cleaned (display) title, case-insensitively
+PARENTHESES = r"\([^)]*\)|\[[^\]]*\]"
+# "H/F", "F/H", "H/F/X", "M/W/D"
+GENDER_MARKER = r"\b[hfmwxd]\s*/\s*[hfmwxd](?:\s*/\s*[hfmwxd])?\b"
+CONTRACT = (r"\b(?:cdi|cdd|stage|stagiaire|alternance|alternant|apprentissage|apprenti"
+            r"|free[\s-]?lance|int[ée]rim|temps (?:plein|partiel)|\d+\s*mois)\b")
+SENIORITY = (r"\b(?:junior|senior|jr|sr|d[ée]butant|confirm[ée]|exp[ée]riment[ée]"
+             r"|s[ée]nior)(?:e|s|es)?\b")
+# Separators left dangling once the words around them are gone
+PUNCTUATION = r"[\s\-–—_/|,;:.!·•*]+"
+# Words that do not tell jobs apart
+STOP_WORDS = {"a", "au", "aux", "d", "de", "des", "du", "en", "et", "l", "la", "le", "les", "pour", "sur"}
+
+
+def canonical_titles(titles):
+    """(cleaned, canonical) Series for a Series of distinct titles.
+
+    ``cleaned`` keeps the case and accents and is what families are named
+    after; ``canonical`` is its lower-case, accent-free form that is hashed.
+    Both are None when nothing is left of the title.
+    """
+    cleaned = titles.astype(object).where(titles.notna(), "").astype(str)
+    for pattern in (PARENTHESES, GENDER_MARKER, CONTRACT, SENIORITY):
+        cleaned = cleaned.str.replace(pattern, " ", regex=True, case=False)
+    cleaned = cleaned.str.replace(PUNCTUATION, " ", regex=True).str.strip().to_numpy(dtype=object)
+    cleaned[cleaned == ""] = None
+    cleaned = pd.Series(cleaned, index=titles.index, dtype=object)
+    canonical = cleaned.map(normalize, na_action="ignore").astype(object)
+    return cleaned, canonical.where(canonical.notna(), None)
+
+
+def title_shingles(canonical):
+    """Hashed word stems of a canonical title.
+
+    Words rather than character n-grams: a specialization ("Data Analyst
+    BI") is a small edit of the generic title but a different job. Plural
+    and feminine endings are dropped ("analyste", "analystes" -> "analyst").
+    """
+    stems = set()
+    for word in canonical.replace("'", " ").split():
+        if word in STOP_WORDS:
+            continue
+        stem = word[:-1] if len(word) > 3 and word.endswith("s") else word
+        while len(stem) > 3 and stem.endswith("e"):
+            stem = stem[:-1]
+        stems.add(stem)
+    return hash_shingles(stems)
+
+
+class TitleFamilies:
+    """Registry of canonical titles and their family, in SQLite.
+
+    ``path`` may be ":memory:" for a throwaway registry (benchmarks, one-off
+    clustering). The signatures of the known titles are held in memory to
+    match new titles against them.
+    """
+
+    def __init__(self, path=":memory:", num_perm=NUM_PERM, bands=BANDS, threshold=THRESHOLD):
+        self.path = path
+        self.bands = bands
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS families ("
+            " id INTEGER PRIMARY KEY,"
+            " label TEXT NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS titles ("
+            " canonical TEXT PRIMARY KEY,"
+            " family INTEGER NOT NULL,"
+            " signature BLOB NOT NULL)"
+        )
+        self.db.commit()
+        self.labels = dict(self.db.execute("SELECT id, label FROM families"))
+        rows = self.db.execute("SELECT canonical, family, signature FROM titles ORDER BY rowid").fetchall()
+        self.index = {canonical: position for position, (canonical, _, _) in enumerate(rows)}
+        self.families = np.array([family for _, family, _ in rows], dtype=np.int64)
+        self.signatures = np.frombuffer(b"".join(signature for _, _, signature in rows),
+                                        dtype=np.uint32).reshape(len(rows), num_perm).copy()
+
+    def __len__(self):
+        return len(self.index)
+
+    def assign(self, cleaned, canonical, counts=None):
+        """Family label of each (cleaned, canonical) distinct title.
+
+        Unknown canonical titles are clustered among themselves and against
+        the known ones: a title close to a known title joins its family, the
+        others form new families named after their most frequent cleaned
+        title (``counts`` gives the offers per title).
+        """
+        cleaned = list(cleaned)
+        canonical = list(canonical)
+        counts = np.ones(len(canonical), dtype=np.int64) if counts is None else np.asarray(counts)
+        with self._lock:
+            new = {}
+            for position, key in enumerate(canonical):
+                if key is not None and key not in self.index:
+                    new.setdefault(key, []).append(position)
+            if new:
+                self._add(new, cleaned, counts)
+            return [None if key is None else self.labels[self.families[self.index[key]]] for key in canonical]
+
+    def _add(self, new, cleaned, counts):
+        keys = list(new)
+        signatures = self.hasher.signatures([title_shingles(key) for key in keys])
+        known = len(self.families)
+        everything = np.concatenate([self.signatures, signatures])
+        left, right = candidate_pairs(band_keys(everything, self.bands))
+        # Known titles already have their family: only links to new titles count
+        keep = (left >= known) | (right >= known)
+        left, right = left[keep], right[keep]
+        keep = similarity(everything, left, right) >= self.threshold
+        components = connected_components(len(everything), left[keep], right[keep])
+
+        # A component is labelled by its smallest member: a known title when
+        # it has one, whose family the new titles join. The others are new.
+        family_of = {}
+        weights = {}
+        for offset, key in enumerate(keys):
+            component = components[known + offset]
+            if component < known:
+                family_of[component] = self.families[component]
+                continue
+            for position in new[key]:
+                if cleaned[position] is not None:
+                    label_weights = weights.setdefault(component, {})
+                    label_weights[cleaned[position]] = label_weights.get(cleaned[position], 0) + counts[position]
+        next_id = max(self.labels, default=0) + 1
+        for component, label_weights in weights.items():
+            # Most frequent cleaned title, then the shortest, then the accented one
+            label = min(label_weights, key=lambda text: (-label_weights[text], len(text), text.isascii(), text))
+            family_of[component] = next_id
+            self.labels[next_id] = label
+            self.db.execute("INSERT INTO families (id, label) VALUES (?, ?)", (next_id, label))
+            next_id += 1
+
+        families = np.array([family_of[components[known + offset]] for offset in range(len(keys))], dtype=np.int64)
+        self.db.executemany(
+            "INSERT INTO titles (canonical, family, signature) VALUES (?, ?, ?)",
+            [(key, int(family), signature.tobytes()) for key, family, signature in zip(keys, families, signatures)],
+        )
+        self.db.commit()
+        for offset, key in enumerate(keys):
+            self.index[key] = known + offset
+        self.families = np.concatenate([self.families, families])
+        self.signatures = everything
+
+    def close(self):
+        self.db.close()
+
+
+def add_title_family(df, families=None):
+    """Add the title_family categorical derived from job_title.
+
+    ``families`` is the registry to match against and extend (a throwaway
+    in-memory one by default). Each distinct title is cleaned and looked up
+    once.
+    """
+    df = df.copy()
+    families = families if families is not None else TitleFamilies()
+    if "job_title" not in df.columns:
+        df["job_title"] = None
+    codes, uniques = pd.factorize(df["job_title"])
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    cleaned, canonical = canonical_titles(pd.Series(uniques, dtype=object))
+    labels = families.assign(cleaned.tolist(), canonical.tolist(), counts)
+    categories = sorted({label for label in labels if label is not None})
+    lookup = {label: code for code, label in enumerate(categories)}
+    distinct = np.array([lookup.get(label, -1) for label in labels] + [-1], dtype=np.int32)
+    df["title_family"] = pd.Categorical.from_codes(distinct[codes], categories=categories)
+    return df
+
+
+def backfill(store):
+    """Compute the title family of every offer already in the history."""
+    return store.rewrite(lambda df: add_title_family(df, store.titles))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from jobsniffer.history import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Add title_family to a history store")
+    parser.add_argument("root", help="history store folder, e.g. jobsniffer/spiders/history")
+    args = parser.parse_args()
+    store = HistoryStore(args.root)
+    print(f"{backfill(store)} offres, {len(store.titles)} intitulés distincts")